@@ -7,9 +7,21 @@ import FloatingOrb from "@/components/FloatingOrb";
 const Index = () => {
   const [companies, setCompanies] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
+  const [progress, setProgress] = useState<any>(null);
+
+  //adds companies we dont have yet (the cached ones can come again from the live search)
+  const addCompanies = (found: any[]) => {
+    if (found.length === 0) return;
+    setCompanies((prev) => {
+      const seen = new Set(prev.map((c: any) => c.Link));
+      const fresh = found.filter((c) => c.Link && !seen.has(c.Link) && seen.add(c.Link));
+      return fresh.length ? [...prev, ...fresh] : prev;
+    });
+  };
 
   const handleSearch = async (city: string, industry: string) => {
     const API_URL = "https://internscout-backend.onrender.com/api/search";
+    setProgress(null);
     
     const response = await fetch(API_URL, {
       method: "POST",
@@ -19,7 +31,9 @@ const Index = () => {
       body: JSON.stringify({ 
         city: city,
         domains: industry ? industry.split(',').map(i => i.trim()) : ["software", "web development"],
-        intents: ["company", "agency"]
+        intents: ["company", "agency"],
+        //also send cached results and progress (lines with an "event" key)
+        events: true
       }),
     });
 
@@ -52,17 +66,25 @@ const Index = () => {
       //keep the last piece in buffer (in case it's cut off)
       buffer = lines.pop() || "";
 
+      //the server sends several lines at once - add them all in one update
+      const found: any[] = [];
       for (const line of lines) {
         if (line.trim()) {
           try {
-            const newCompany = JSON.parse(line);
-            //add to existing list immediately
-            setCompanies((prev) => [...prev, newCompany]);
+            const item = JSON.parse(line);
+            if (item.event === "cached") {
+              found.push(...item.companies);
+            } else if (item.event === "progress" || item.event === "done") {
+              setProgress(item);
+            } else if (!item.event) {
+              found.push(item);
+            }
           } catch (e) {
             console.error("Error parsing JSON line", e);
           }
         }
       }
+      addCompanies(found);
     }
 
 
@@ -135,9 +157,15 @@ const Index = () => {
         {/* Results Section */}
         {companies.length > 0 && (
           <section className="container mx-auto px-4 py-8">
-            <h2 className="text-2xl font-bold mb-6 text-center">
+            <h2 className="text-2xl font-bold mb-2 text-center">
               Found {companies.length} Companies
             </h2>
+            {progress && (
+              <p className="text-sm text-muted-foreground mb-6 text-center">
+                {progress.event === "done" ? "Done: " : ""}
+                {progress.queries_done}/{progress.queries_total} searches, {progress.pages_fetched} sites checked
+              </p>
+            )}
             <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6 max-w-6xl mx-auto">
               {companies.map((company: any, i: number) => (
                 <div
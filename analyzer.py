@@ -0,0 +1,295 @@
+from html.parser import HTMLParser
+from html.entities import html5
+from urllib.parse import urlparse, urljoin
+import html
+from matchers import LISTICLE_WORDS, SIGNALS, CAREER_KEYWORDS
+import metrics
+
+
+#How many characters of text to carry over so a signal split between
+#two strings (eg "about" + " us") is still found
+SIGNAL_TAIL = SIGNALS.longest - 1
+
+#Tree rules copied from BeautifulSoup's html.parser builder so the
+#results match the soup version exactly
+EMPTY_ELEMENTS = {
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed',
+    'frame', 'hr', 'image', 'img', 'input', 'isindex', 'keygen', 'link',
+    'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer', 'track', 'wbr'
+}
+#text inside these is not part of get_text()
+STRING_CONTAINERS = {'rt', 'rp', 'style', 'script', 'template'}
+#whitespace-only text inside these is kept as is
+PRESERVE_WHITESPACE = {'textarea', 'pre'}
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+
+#Raised inside the parser once the verdict cant change anymore
+class Decided(Exception):
+    pass
+
+
+#One pass over the html that collects everything validate_page_content and
+#find_careers_link need: the <title>, signal words, external links and the
+#careers link candidates. Stops as soon as the page is certain to be rejected.
+class PageAnalyzer(HTMLParser):
+    def __init__(self, url):
+        #charrefs are decoded the same way BeautifulSoup does it (see handle_charref)
+        super().__init__(convert_charrefs=False)
+        self.url = url
+        self.netloc = urlparse(url).netloc
+
+        #open tags: [name, title node or None, anchor or None]
+        self.stack = [["[document]", None, None]]
+        self.already_closed_empty = []
+        self.preserve_depth = 0
+        #string container tags that are open (innermost last)
+        self.containers = []
+        self.pending = []
+
+        #first <title> as a tiny tree - {"children": [...]} with strings as str
+        self.title_node = None
+        self.title_done = False
+        self.title_result = None
+
+        self.signals_found = set()
+        self.text_tail = ""
+
+        self.external = 0
+        #every <a href> in order: {"href", "parts", "matched"}
+        self.anchors = []
+        self.open_anchors = []
+
+        self.verdict = None
+
+    ### Tree building (mirrors bs4.BeautifulSoup) ###
+
+    def end_data(self, kind="text"):
+        if not self.pending: return
+        data = "".join(self.pending)
+        self.pending = []
+
+        #whitespace-only strings are squashed to one space or newline
+        if not self.preserve_depth:
+            if all(c in ASCII_SPACES for c in data):
+                data = "\n" if "\n" in data else " "
+
+        #strings inside <script>, <style> etc get a different type and get_text skips them
+        if kind == "text" and self.containers:
+            kind = "container"
+        self.add_string(data, kind)
+
+    def add_string(self, data, kind):
+        #the <title> keeps every kind of string (they all count as children)
+        if self.title_node is not None and not self.title_done:
+            self.current_title_parent()["children"].append(data)
+
+        if kind not in ("text", "cdata"):
+            return
+
+        lowered = data.lower()
+        window = self.text_tail + lowered
+        if len(self.signals_found) < len(SIGNALS.words):
+            self.signals_found |= SIGNALS.found(window, skip=self.signals_found)
+        self.text_tail = window[-SIGNAL_TAIL:]
+
+        for anchor in self.open_anchors:
+            anchor["parts"].append(data)
+
+        self.check_decided()
+
+    def current_title_parent(self):
+        for entry in reversed(self.stack):
+            if entry[1] is not None:
+                return entry[1]
+
+    def push(self, name, attrs):
+        self.end_data()
+
+        node = None
+        if name == "title" and self.title_node is None:
+            node = self.title_node = {"children": []}
+        elif self.title_node is not None and not self.title_done:
+            node = {"children": []}
+            self.current_title_parent()["children"].append(node)
+
+        anchor = None
+        if name == "a":
+            #last duplicate attribute wins, valueless attributes are ""
+            href = None
+            for key, value in attrs:
+                if key == "href":
+                    href = value if value is not None else ""
+            if href is not None:
+                anchor = {"href": href, "parts": [], "matched": None}
+                self.anchors.append(anchor)
+                self.open_anchors.append(anchor)
+                if 'http' in href and self.netloc not in href:
+                    self.external += 1
+
+        self.stack.append([name, node, anchor])
+        if name in PRESERVE_WHITESPACE: self.preserve_depth += 1
+        if name in STRING_CONTAINERS: self.containers.append(name)
+
+        if anchor is not None:
+            self.check_decided()
+
+    def pop_to(self, name):
+        self.end_data()
+        if not any(entry[0] == name for entry in self.stack[1:]):
+            return
+
+        while len(self.stack) > 1:
+            entry = self.stack.pop()
+            self.closed(entry)
+            if entry[0] == name:
+                break
+
+    def closed(self, entry):
+        name, node, anchor = entry
+        if name in PRESERVE_WHITESPACE: self.preserve_depth -= 1
+        if name in STRING_CONTAINERS: self.containers.pop()
+
+        if anchor is not None:
+            #tags close innermost first, so this is always the last open anchor
+            self.open_anchors.pop()
+            self.finish_anchor(anchor)
+
+        if node is self.title_node and node is not None:
+            self.title_done = True
+            self.title_result = self.title_verdict()
+            self.check_decided()
+
+    def finish_anchor(self, anchor):
+        text = "".join(anchor["parts"]).lower()
+        anchor["matched"] = CAREER_KEYWORDS.any(text)
+        anchor["parts"] = None
+
+    ### HTMLParser events (mirrors bs4's BeautifulSoupHTMLParser) ###
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self.push(tag, attrs)
+        if tag in EMPTY_ELEMENTS and handle_empty_element:
+            self.pop_to(tag)
+            self.already_closed_empty.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.pop_to(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.already_closed_empty:
+            self.already_closed_empty.remove(tag)
+        else:
+            self.pop_to(tag)
+
+    def handle_data(self, data):
+        self.pending.append(data)
+
+    #&#65; / &#x41; - html.unescape follows the HTML5 rules, like BeautifulSoup
+    #(windows-1252 for &#128;-&#159;, U+FFFD for references that arent characters)
+    def handle_charref(self, name):
+        self.handle_data(html.unescape(f"&#{name};"))
+
+    #&amp; - an unknown name is kept as the literal text "&name", like BeautifulSoup
+    def handle_entityref(self, name):
+        self.handle_data(html5.get(f"{name};", f"&{name}"))
+
+    def handle_comment(self, data):
+        self.special_string(data, "comment")
+
+    def handle_decl(self, decl):
+        self.special_string(decl[len("DOCTYPE "):], "doctype")
+
+    def unknown_decl(self, data):
+        if data.upper().startswith("CDATA["):
+            self.special_string(data[len("CDATA["):], "cdata")
+        else:
+            self.special_string(data, "declaration")
+
+    def handle_pi(self, data):
+        self.special_string(data, "pi")
+
+    def special_string(self, data, kind):
+        self.end_data()
+        self.pending.append(data)
+        self.end_data(kind)
+
+    ### Verdict ###
+
+    #.string of the first <title> (None if it has more than one child)
+    def title_string(self):
+        node = self.title_node
+        while True:
+            if len(node["children"]) != 1:
+                return None
+            child = node["children"][0]
+            if isinstance(child, str):
+                return child
+            node = child
+
+    #Same checks, same order and same reasons as validate_page_content
+    def title_verdict(self):
+        if self.title_node is None:
+            title = ""
+        else:
+            title = self.title_string()
+            if title is None:
+                return False, "Validation Error"
+            title = title.lower()
+        if LISTICLE_WORDS.any(title):
+            return False, "Likely a listicle"
+        return None
+
+    def check_decided(self):
+        if not self.title_done:
+            return
+        verdict = self.title_result
+        if verdict is None and len(self.signals_found) >= 2 and self.external > 50:
+            verdict = (False, "Too many external links")
+        if verdict is not None:
+            self.verdict = verdict
+            raise Decided()
+
+    def finish(self):
+        self.end_data()
+        while len(self.stack) > 1:
+            self.closed(self.stack.pop())
+
+        verdict = self.title_verdict()
+        if verdict is not None: return verdict
+        if len(self.signals_found) < 2:
+            return False, "Not enough business content"
+        if self.external > 50:
+            return False, "Too many external links"
+        return True, "Valid"
+
+    def careers_link(self):
+        try:
+            for anchor in self.anchors:
+                if anchor["matched"]:
+                    return urljoin(self.url, anchor["href"])
+            return None
+        except:
+            return None
+
+
+#Parses a page once and returns (is_valid, reason, careers link)
+#Gives the same answers as validate_page_content + find_careers_link on a soup
+#(timed as parse / validate / careers - a page rejected early is all parse)
+def analyze_page(url, html):
+    analyzer = PageAnalyzer(url)
+    try:
+        with metrics.timer("parse", url=url):
+            analyzer.feed(html)
+            analyzer.close()
+        with metrics.timer("validate", url=url):
+            is_valid, reason = analyzer.finish()
+    except Decided:
+        is_valid, reason = analyzer.verdict
+
+    careers = None
+    if is_valid:
+        with metrics.timer("careers", url=url):
+            careers = analyzer.careers_link()
+    return is_valid, reason, careers
@@ -1,46 +1,45 @@
-from flask import Flask, request, Response, stream_with_context
+from flask import Flask, request, Response, stream_with_context, jsonify
 from flask_cors import CORS
-import json
-import requests
-import scraper
-import time
-import random
+import threading
+import metrics
+import streaming
+import lazy
+import os
 import logging
-from datetime import datetime
 
-app = Flask(__name__)
-#allows frontend to talk to this backend
-CORS(app)
-
-
-KEYWORD_CACHE = {}
-#This uses ConceptNet to get related terms to the given term (allows for more complex searches)
-def get_related_terms(term):
-    term = term.lower().strip()
-    if term in KEYWORD_CACHE: return KEYWORD_CACHE[term]
+#The scraper and everything under it (ddgs, bs4, requests, tldextract) loads on
+#first use, or in the background right after the worker starts (see warm_worker)
+scraper = lazy.module("scraper")
+keywords = lazy.module("keywords")
+careers = lazy.module("careers")
+jobs = lazy.module("jobs")
+
+#Set to 0 to skip warming up and load everything on the first search instead
+WARM_START = os.environ.get("WARM_START", "1") == "1"
+
+#Loads the scraper and makes its clients and connections on a background thread
+#so the first search doesnt pay for it (the health check is served meanwhile)
+warm_thread = None
+
+def warm_worker():
+    global warm_thread
+    def warm():
+        try:
+            keywords.load_synonyms()
+            scraper.warm()
+        except Exception as e:
+            print(f"Warm up failed: {type(e).__name__}: {e}")
+    warm_thread = threading.Thread(target=warm, daemon=True)
+    warm_thread.start()
+
+#Under gunicorn, gunicorn.conf.py warms each worker after it forks instead, so no
+#thread ever runs in the master (a fork in the middle of an import can deadlock the child)
+if WARM_START and not os.environ.get("WARM_IN_WORKER_HOOK"):
+    warm_worker()
 
-    print(f"Asking ConceptNet about '{term}'...")
-    related = set([term]) #always include original
-
-    try:
-        url = f"http://api.conceptnet.io/c/en/{term.replace(' ', '_')}?limit=20"
-        resp = requests.get(url, timeout=2).json()
-        
-        for edge in resp.get('edges', []):
-            try:
-                if edge['end']['language'] != 'en' or edge['start']['language'] != 'en': continue
-                if edge['weight'] < 1.0: continue
-                
-                label = edge['end']['label']
-                if len(label.split()) <= 3: # Keep it short
-                    related.add(label.lower())
-            except: continue
-    except Exception as e:
-        print(f"ConceptNet error: {e}")
-    
-    final = list(related)[:6] # Limit to 6 terms
-    KEYWORD_CACHE[term] = final
-    return final
+app = Flask(__name__)
+#allows frontend to talk to this backend (and read the job id and status of a search)
+CORS(app, expose_headers=["X-Job-Id", "X-Job-Status"])
 
 
 
@@ -53,6 +52,60 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+#Cache hit/miss counts for this worker
+@app.route('/api/cache')
+def cache_stats():
+    return jsonify({
+        "search": scraper.SEARCH_CACHE.stats(),
+        "companies": scraper.COMPANY_INDEX.stats(),
+        "pages": scraper.PAGE_CACHE.stats(),
+        "keywords": keywords.KEYWORD_CACHE.stats(),
+        "careers": careers.CAREERS_CACHE.stats(),
+        "leads": scraper.LEADS.stats()
+    })
+
+
+#Connection pool usage and rate limiter state for this worker
+@app.route('/api/pool')
+def pool_stats():
+    stats = scraper.fetcher.pool_stats()
+    stats["limits"] = {
+        "hosts": scraper.HOST_LIMITER.snapshot(),
+        "proxy": scraper.PROXY_LIMITER.snapshot(),
+        "search": scraper.SEARCH_LIMITER.snapshot()
+    }
+    stats["proxies"] = scraper.PROXY_POOL.stats()
+    return jsonify(stats)
+
+
+#Companies earlier searches accepted, straight from the leads store (no scraping)
+#?city=Troy, NY&keyword=software&keyword=web development&type=Homepage&q=acme&max_age=86400&limit=100&offset=0
+#"stale" lists the keywords worth a fresh /api/search in that city (never scraped or not lately)
+@app.route('/api/leads')
+def leads():
+    city = request.args.get('city')
+    wanted = [k.strip() for arg in request.args.getlist('keyword') for k in arg.split(',') if k.strip()]
+    found, total = scraper.LEADS.find(
+        city=city,
+        keywords=wanted,
+        lead_type=request.args.get('type'),
+        text=request.args.get('q'),
+        max_age=request.args.get('max_age', type=float),
+        limit=max(request.args.get('limit', 100, type=int), 0),
+        offset=max(request.args.get('offset', 0, type=int), 0)
+    )
+    reply = {"leads": found, "total": total}
+    if city:
+        reply["last_seen"], reply["stale"] = scraper.LEADS.coverage(city, wanted)
+    return jsonify(reply)
+
+
+#Stage timings and error counts for this worker, in Prometheus text format
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 #User "searches" which sends POST info
 @app.route('/api/search', methods=['POST'])
 def search_companies():
@@ -70,32 +123,75 @@ def search_companies():
         #print(log_message)
         #logger.info(log_message)
 
-        #raw_domains = data.get('domains', ["software"])
-    
-    #expand Keywords using ConceptNet
-        #final_keywords = set()
-        #for d in raw_domains:
-            #final_keywords.update(get_related_terms(d))
-            #time.sleep(random.uniform(1.0, 1.5))
-    
-        #search_terms = list(final_keywords)
-    
+    #expand Keywords (see EXPAND_KEYWORDS in streaming.py)
+    search_terms = streaming.get_search_terms(data)
+
     #universal Intents (Works for 95% of businesses)
         #intents = ["company", "agency", "firm", "services", "studio", "group"]
-
-    search_terms = data.get('domains', ["software"])
     
     intents = ["company", "agency"]
 
     print(f"Received request for {city}...")
 
-    def generate():
-        #loop through the scrapers yields
-        for company in scraper.scrape(city, search_terms, intents):
-            #send one JSON object per line
-            yield json.dumps(company) + "\n"
-        
-    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    #runs off this thread, shared with anyone running the same search right now
+    try:
+        max_results, deadline = scraper.search_limits(data)
+        job = jobs.submit(city, search_terms, intents, max_results=max_results, deadline=deadline)
+    except jobs.QueueFull as e:
+        return jsonify({"error": f"Too many searches running, try again soon ({e})"}), 503
+
+    #one JSON object per line, batched and compressed (see streaming.py)
+    events = streaming.wants_events(data, request.args)
+    cached = streaming.cached_companies(scraper.LEADS, city, search_terms) if events else None
+    encoder = streaming.Encoder(streaming.negotiate(request.headers.get('Accept-Encoding')))
+    body = streaming.job_body(job, encoder, events=events, cached=cached)
+
+    #the job id lets a client that drops resume from /api/jobs/<id>/stream?cursor=N
+    headers = {"X-Job-Id": job.id, **encoder.headers()}
+    return Response(stream_with_context(body), mimetype='application/x-ndjson', headers=headers)
+
+
+#Starts a search in the background and returns its id right away
+#Results can then be streamed or polled with a cursor, so reconnecting picks up where it left off
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    data = request.json or {}
+    city = data.get('city', 'Troy, NY')
+    search_terms = streaming.get_search_terms(data)
+    intents = ["company", "agency"]
+
+    try:
+        max_results, deadline = scraper.search_limits(data)
+        job = jobs.submit(city, search_terms, intents, detached=True, max_results=max_results, deadline=deadline)
+    except jobs.QueueFull as e:
+        return jsonify({"error": f"Too many searches running, try again soon ({e})"}), 503
+
+    return jsonify({"job_id": job.id, "status": job.status}), 202
+
+
+#Results found so far after ?cursor=N (the cursor to send next time is in the reply)
+@app.route('/api/jobs/<job_id>')
+def poll_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    cursor = request.args.get('cursor', 0, type=int)
+    return jsonify(job.poll(max(cursor, 0)))
+
+
+#Same NDJSON stream as /api/search, starting after ?cursor=N results
+@app.route('/api/jobs/<job_id>/stream')
+def stream_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    cursor = request.args.get('cursor', 0, type=int)
+
+    encoder = streaming.Encoder(streaming.negotiate(request.headers.get('Accept-Encoding')))
+    body = streaming.job_body(job, encoder, max(cursor, 0), events=streaming.wants_events({}, request.args))
+    #a job that was cancelled before this resume only has part of its results
+    headers = {"X-Job-Status": job.status, **encoder.headers()}
+    return Response(stream_with_context(body), mimetype='application/x-ndjson', headers=headers)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,172 @@
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+import contextlib
+import asyncio
+import os
+import metrics
+import streaming
+import lazy
+
+#Loaded on first use or by warm_up at startup, so / answers before ddgs / bs4 are in
+async_scraper = lazy.module("async_scraper")
+scraper = lazy.module("scraper")
+
+#Set to 0 to skip warming up and load everything on the first search instead
+WARM_START = os.environ.get("WARM_START", "1") == "1"
+
+
+#Async version of the search API - same /api/search request and NDJSON stream as app.py,
+#but an open stream costs no thread while it waits on the network
+#Run with: uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+#Seconds without a result before we send a blank line to keep proxies from
+#closing the connection (the frontend skips blank lines)
+HEARTBEAT = float(os.environ.get("HEARTBEAT_SECONDS", "15"))
+
+
+async def home(request):
+    return PlainTextResponse("Scraper API is running!")
+
+
+#Same Prometheus text as app.py's /metrics
+async def prometheus_metrics(request):
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+#Reads the scrape on its own task so we can batch results and send heartbeats while waiting
+#Same framing as app.py (see streaming.py): batches, compression, and with events
+#the cached burst, progress events and a done event
+async def ndjson(companies, progress, encoder, events=False, cached=None):
+    queue = asyncio.Queue()
+    done = object()
+    loop = asyncio.get_running_loop()
+
+    async def produce():
+        try:
+            async for company in companies:
+                await queue.put(company)
+        finally:
+            await queue.put(done)
+
+    producer = asyncio.create_task(produce())
+    try:
+        if events and cached:
+            yield encoder.encode(streaming.lines([streaming.event("cached", companies=cached)]))
+        first = True
+        finished = False
+        version = None
+        last_sent = loop.time()
+        while not finished:
+            batch = []
+            try:
+                company = await asyncio.wait_for(queue.get(), timeout=streaming.PROGRESS_SECONDS if events else HEARTBEAT)
+            except asyncio.TimeoutError:
+                company = None
+
+            if company is done:
+                finished = True
+            elif company is not None:
+                batch.append(company)
+                #after the first result, hold this one a moment for any found right after it
+                until = loop.time() + (0 if first else streaming.STREAM_BATCH_MS / 1000)
+                first = False
+                while len(batch) < streaming.STREAM_BATCH_SIZE:
+                    if not queue.empty():
+                        company = queue.get_nowait()
+                    else:
+                        try:
+                            company = await asyncio.wait_for(queue.get(), timeout=until - loop.time())
+                        except asyncio.TimeoutError:
+                            break
+                    if company is done:
+                        finished = True
+                        break
+                    batch.append(company)
+
+            if events:
+                counts, latest = progress.snapshot()
+                if latest != version:
+                    version = latest
+                    batch.append(streaming.event("progress", **counts))
+            if batch:
+                yield encoder.encode(streaming.lines(batch))
+                last_sent = loop.time()
+            elif loop.time() - last_sent >= HEARTBEAT:
+                #a blank line (the frontend skips blank lines)
+                yield encoder.encode("\n")
+                last_sent = loop.time()
+
+        if events:
+            counts, _ = progress.snapshot()
+            yield encoder.encode(streaming.lines([streaming.event("done", status="done", **counts)]))
+        tail = encoder.finish()
+        if tail:
+            yield tail
+    finally:
+        #client disconnected - cancelling the producer stops the scrape too
+        producer.cancel()
+
+
+#User "searches" which sends POST info
+async def search_companies(request):
+    data = await request.json()
+    #Defaults if nothing is provided (software -- troy)
+    city = data.get('city', 'Troy, NY')
+    #expanded like app.py does (a ConceptNet lookup can block, so off the loop)
+    search_terms = await asyncio.to_thread(streaming.get_search_terms, data)
+    intents = ["company", "agency"]
+
+    print(f"Received request for {city}...")
+    max_results, deadline = scraper.search_limits(data)
+    progress = metrics.Progress()
+    companies = async_scraper.scrape(city, search_terms, intents, max_results, deadline, progress,
+                                     clients=async_scraper.worker_clients())
+
+    events = streaming.wants_events(data, request.query_params)
+    cached = None
+    if events:
+        #on the scraper's sqlite thread, not the default executor every stream shares
+        cached = await async_scraper.run_in(
+            async_scraper.store_pool, streaming.cached_companies, scraper.LEADS, city, search_terms
+        )
+    encoder = streaming.Encoder(streaming.negotiate(request.headers.get('accept-encoding')))
+    body = ndjson(companies, progress, encoder, events, cached)
+    return StreamingResponse(body, media_type='application/x-ndjson', headers=encoder.headers())
+
+
+#Each uvicorn worker loads the scraper and makes its clients on a thread after it starts
+#(not awaited - the server takes requests meanwhile)
+#The httpx clients every search shares are closed when the worker shuts down
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    async def warm():
+        try:
+            await asyncio.to_thread(async_scraper.load)
+            await asyncio.to_thread(scraper.warm)
+        except Exception as e:
+            print(f"Warm up failed: {type(e).__name__}: {e}")
+
+    warming = asyncio.create_task(warm()) if WARM_START else None
+    try:
+        yield
+    finally:
+        if warming is not None:
+            warming.cancel()
+        #(nothing to close if no search ever loaded the scraper)
+        if async_scraper.loaded is not None:
+            await async_scraper.close_worker_clients()
+
+
+app = Starlette(
+    lifespan=lifespan,
+    routes=[
+        Route('/', home),
+        Route('/metrics', prometheus_metrics),
+        Route('/api/search', search_companies, methods=['POST']),
+    ],
+    #allows frontend to talk to this backend
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])]
+)
@@ -0,0 +1,334 @@
+import asyncio
+import contextvars
+import functools
+import time
+import requests
+import httpx
+import os
+from concurrent.futures import ThreadPoolExecutor
+import careers as careers_finder
+import fetcher
+import memory
+import metrics
+import proxies
+import scraper
+from scraper import COMPANY_INDEX, PAGE_CACHE, BLOCKLIST
+
+
+#asyncio version of scraper.scrape - same searches, caches and checks, but pages
+#are fetched with httpx on the event loop so one process can serve many streams.
+#DDGS is still sync so searches run on threads, and parsing runs on threads
+#too so a big page doesnt stall every other stream.
+
+#How many pages one search fetches at the same time (cheap here - no thread per fetch)
+ASYNC_FETCH_WORKERS = int(os.environ.get("ASYNC_FETCH_WORKERS", "32"))
+
+#Threads for the blocking steps, shared by every stream in the worker. Each step has
+#its own pool so slow searches or careers probes cant starve parsing (or the
+#default executor the server itself uses); limiter waits are awaited, not slept on a thread
+SEARCH_THREADS = int(os.environ.get("ASYNC_SEARCH_THREADS", "4"))
+DISCOVER_THREADS = int(os.environ.get("ASYNC_DISCOVER_THREADS", "8"))
+PARSE_THREADS = int(os.environ.get("ASYNC_PARSE_THREADS", str(os.cpu_count() or 2)))
+search_pool = ThreadPoolExecutor(max_workers=SEARCH_THREADS, thread_name_prefix="search")
+discover_pool = ThreadPoolExecutor(max_workers=DISCOVER_THREADS, thread_name_prefix="discover")
+parse_pool = ThreadPoolExecutor(max_workers=PARSE_THREADS, thread_name_prefix="parse")
+#sqlite writes (one at a time anyway) and the leads search for the cached burst -
+#the cache reads are quick indexed lookups and run on the loop
+store_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store")
+
+#Marks the end of the result queue
+DONE = object()
+
+
+#One httpx client per proxy (None = direct), made the first time a page goes through it
+#They follow redirects like the requests session does (http -> https, apex -> www, /about -> /about/)
+class Clients:
+    def __init__(self):
+        self.clients = {}
+        self.limits = httpx.Limits(max_connections=fetcher.POOL_HOSTS,
+                                   max_keepalive_connections=fetcher.POOL_PER_HOST * 4)
+
+    def get(self, proxy):
+        if proxy not in self.clients:
+            self.clients[proxy] = httpx.AsyncClient(
+                proxy=proxy, headers=fetcher.HEADERS, timeout=10, limits=self.limits, follow_redirects=True
+            )
+        return self.clients[proxy]
+
+    async def close(self):
+        clients, self.clients = self.clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+#The server's clients, shared by every search in the worker so connections stay
+#open between searches (made on its event loop, closed when it shuts down)
+WORKER_CLIENTS = None
+
+def worker_clients():
+    global WORKER_CLIENTS
+    if WORKER_CLIENTS is None:
+        WORKER_CLIENTS = Clients()
+    return WORKER_CLIENTS
+
+async def close_worker_clients():
+    global WORKER_CLIENTS
+    clients, WORKER_CLIENTS = WORKER_CLIENTS, None
+    if clients is not None:
+        await clients.close()
+
+
+#Runs fn on one of the pools above (with the current trace, like asyncio.to_thread)
+async def run_in(pool, fn, *args):
+    call = functools.partial(contextvars.copy_context().run, fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(pool, call)
+
+#Async scraper.run_search - same cache, backends and retries, but the wait for a
+#backend's slot is awaited and only the DDGS call itself takes a search thread
+async def run_search(query, region="us-en", timelimit=None, retries=scraper.SEARCH_RETRIES):
+    cached = scraper.cached_search(query, region, timelimit)
+    if cached is not None:
+        return cached
+
+    for attempt in range(retries + 1):
+        backend = scraper.SEARCH_LIMITER.pick(scraper.SEARCH_BACKENDS)
+        with metrics.timer("throttle"):
+            await asyncio.sleep(scraper.SEARCH_LIMITER.reserve(backend))
+        results = await run_in(search_pool, scraper.search_once, scraper.SEARCH_CLIENTS, query, backend,
+                               region, timelimit, attempt, retries)
+        if results is not None:
+            return results
+    return []
+
+#Streams a page with the same byte budget, deadline and content-type check as fetcher.fetch_page
+#Redirects are followed like requests does (the client is made with follow_redirects)
+#Returns (status, headers, content, html text, note, url the redirects ended at)
+async def fetch_page(client, url, headers, max_bytes=fetcher.MAX_PAGE_BYTES,
+                     deadline=fetcher.PAGE_DEADLINE, policy=fetcher.OVERSIZE_POLICY):
+    async def read():
+        async with client.stream("GET", url, headers=headers) as resp:
+            final_url = str(resp.url)
+            if resp.status_code != 200:
+                return resp.status_code, resp.headers, b"", None, None, final_url
+
+            skip = fetcher.skip_reason(resp.headers, max_bytes, policy)
+            if skip:
+                return resp.status_code, resp.headers, b"", None, skip, final_url
+
+            body = bytearray()
+            note = None
+            async for chunk in resp.aiter_bytes():
+                body.extend(chunk)
+                if len(body) > max_bytes:
+                    if policy == "reject":
+                        return resp.status_code, resp.headers, b"", None, f"Page too large (over {max_bytes} bytes)", final_url
+                    del body[max_bytes:]
+                    note = f"Truncated at {max_bytes} bytes"
+                    break
+
+            #same charset rules as requests (resp.encoding) so both versions read pages alike
+            content = bytes(body)
+            encoding = requests.utils.get_encoding_from_headers(resp.headers)
+            return resp.status_code, resp.headers, content, fetcher.decode(content, encoding), note, final_url
+
+    #the deadline covers the whole read, not just each socket wait
+    return await asyncio.wait_for(read(), timeout=deadline)
+
+#Async scraper.fetch_verdict - returns (is_valid, reason, careers link)
+#client_for(proxy) gives the httpx client that goes through that proxy
+async def fetch_verdict(client_for, url):
+    pool = scraper.PROXY_POOL
+    previous = PAGE_CACHE.get(url)
+    headers = PAGE_CACHE.conditional_headers(previous)
+
+    #the host asked us to stay away for a while - skip it (not indexed, so the next search tries again)
+    if scraper.host_paused(url):
+        return metrics.fetch_error("HOST_PAUSED", scraper.HostPaused(url))
+
+    proxy = None
+    for attempt in range(2):
+        proxy = pool.choose("page", exclude=proxy)
+
+        #wait for our turn on this host (and the proxy)
+        with metrics.timer("throttle"):
+            await asyncio.sleep(scraper.fetch_delay(url, proxy))
+
+        started = time.monotonic()
+        try:
+            with metrics.timer("fetch", url=url, proxy=proxies.redact(proxy)):
+                status, resp_headers, content, html, note, final_url = await fetch_page(client_for(proxy), url, headers)
+        except httpx.ProxyError as e:
+            pool.failure(proxy)
+            scraper.fetch_feedback(url, proxy, error="PROXY_ERROR")
+            if attempt == 0 and proxy:
+                print(f"   Proxy {proxies.redact(proxy)} failed for {url}, trying another")
+                continue
+            return metrics.fetch_error("PROXY_ERROR", e)
+        except httpx.ConnectTimeout as e:
+            pool.failure(proxy)
+            return metrics.fetch_error("TIMEOUT", e)
+        except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+            pool.failure(proxy, hard=False)
+            return metrics.fetch_error("TIMEOUT", e)
+        except httpx.TransportError as e:
+            pool.failure(proxy, hard=False)
+            return metrics.fetch_error("CONNECTION_ERROR", e)
+        except asyncio.CancelledError:
+            #stream closed early - dont leave the proxy looking busy
+            pool.release(proxy)
+            raise
+        except Exception as e:
+            pool.release(proxy)
+            return metrics.fetch_error(f"ERROR: {type(e).__name__}", e)
+
+        pool.success(proxy, time.monotonic() - started)
+        scraper.fetch_feedback(url, proxy, status, resp_headers)
+        try:
+            is_valid, reason, careers = await run_in(
+                parse_pool, scraper.judge_page, url, previous, status, resp_headers, content, html, note, final_url
+            )
+        except Exception as e:
+            return metrics.fetch_error(f"ERROR: {type(e).__name__}", e)
+
+        #let the page go before waiting on careers probes
+        del content, html
+        if is_valid and not careers:
+            careers = await run_in(discover_pool, careers_finder.discover, final_url, proxy)
+        return is_valid, reason, careers
+
+#Async scraper.check_company - uses the company index when we can
+#Returns (company data or None, reason)
+async def check_company(client_for, url, title, source, city=None):
+    domain = scraper.normalize_domain(url)
+    entry, state, key = scraper.indexed(domain, url) if domain else (None, None, None)
+
+    if state:
+        #serve what we know now, refresh it later (on the sync refresh pool) if it is getting old
+        if state == "stale":
+            scraper.schedule_refresh(domain, key, entry["url"], entry["title"])
+        is_valid, reason, careers = entry["valid"], entry["reason"], entry["careers"]
+        url = entry["url"]
+        reason = f"{reason} (cached)"
+    else:
+        is_valid, reason, careers = await fetch_verdict(client_for, url)
+        if is_valid is not None and domain:
+            key = scraper.index_key(domain, url, is_valid)
+            await run_in(store_pool, COMPANY_INDEX.put, key, url, title, is_valid, reason, careers)
+
+    metrics.record_verdict(is_valid, reason, cached=bool(state))
+    if not is_valid:
+        return None, reason
+    data = scraper.company_data(title, url, careers, source)
+    await run_in(store_pool, scraper.save_lead, city, domain, data)
+    return data, reason
+
+#Does a search for each keyword given and yields companies as they are accepted
+#Same ranking, early stop and progress counts as scraper.scrape
+#clients is a Clients to fetch through (default: ones made for this search and closed after it)
+async def scrape(city, domains, intents, max_results=None, deadline=None, progress=None, clients=None):
+    print(f"Searching for overlaps in {city}...")
+    started = time.monotonic()
+
+    #Proxies from webshare (see proxies.py)
+    if not scraper.PROXY_POOL.can_search():
+        print("ERROR: no proxies found (set PROXY_URLS, PROXY_FILE or PROXY_URL)!")
+        yield {}
+        return
+
+    #Stage timings for this search (written to TRACE_DIR if that is set)
+    trace = metrics.Trace(city=city, domains=domains, intents=intents)
+    #worker memory high-water mark while this search runs
+    watermark = memory.Watermark()
+    results = asyncio.Queue()
+    tasks = set()
+    #searches in flight for this stream (search_pool caps them for the whole worker)
+    search_slots = asyncio.Semaphore(scraper.SEARCH_WORKERS)
+    #urls waiting to be fetched, best score first and one per company
+    candidates = scraper.CandidateQueue()
+    fetching = 0
+    accepted = 0
+    stopping = False
+    progress = progress or metrics.Progress()
+
+    own_clients = clients is None
+    clients = clients or Clients()
+
+    #Every search and fetch is a task - when the last one finishes the queue gets DONE
+    def spawn(coro):
+        task = asyncio.create_task(trace.arun(coro))
+        tasks.add(task)
+        task.add_done_callback(finished)
+
+    def finished(task):
+        tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"Task error: {type(task.exception()).__name__}: {task.exception()}")
+        if not tasks:
+            results.put_nowait(DONE)
+
+    #Starts the best waiting urls while there are free fetch slots
+    def start_fetches():
+        nonlocal fetching
+        while candidates and fetching < ASYNC_FETCH_WORKERS and not stopping:
+            url, title, source = candidates.pop()
+            fetching += 1
+            spawn(check(url, title, source))
+
+    async def check(url, title, source):
+        nonlocal fetching
+        try:
+            data, reason = await check_company(clients.get, url, title, source, city)
+        finally:
+            fetching -= 1
+            #queue the next one before this task counts as finished
+            start_fetches()
+        print(f"   Fetched: {title[:30]}... {reason}")
+        progress.checked(bool(data), reason)
+        if data:
+            await results.put(data)
+
+    async def search(query, source):
+        async with search_slots:
+            found = await run_search(query)
+        progress.searched()
+        print(f"   → Got {len(found)} raw results for '{query}'")
+
+        for result in found:
+            url = result['href']
+            title = result['title']
+
+            if BLOCKLIST.blocks(url): continue
+            candidates.push(url, title, source)
+        start_fetches()
+
+    try:
+        plan = scraper.plan_queries(city, domains, intents)
+        progress.planned(len(plan))
+        for query, source in plan:
+            print(f"Checking keyword: '{query}'")
+            spawn(search(query, source))
+
+        while tasks or not results.empty():
+            timeout = None
+            if deadline is not None:
+                timeout = deadline - (time.monotonic() - started)
+            try:
+                company = await asyncio.wait_for(results.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                print(f"Deadline of {deadline}s reached, stopping with {accepted} companies")
+                break
+            watermark.sample()
+            if company is DONE:
+                break
+            yield company
+            accepted += 1
+            if max_results and accepted >= max_results:
+                print(f"Got {accepted} companies, stopping early")
+                break
+    finally:
+        #client went away (or we are done) - stop everything still running
+        stopping = True
+        for task in list(tasks):
+            task.cancel()
+        if own_clients:
+            await clients.close()
+        trace.write(accepted=accepted, duplicates=candidates.duplicates, **metrics.record_memory(watermark))
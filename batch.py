@@ -0,0 +1,325 @@
+#Runs many searches without the Flask app - one per city in a file - and writes
+#every company found to one CSV / JSONL / Parquet output as each city finishes
+#
+#Usage:
+#  python batch.py cities.csv --out leads.csv
+#  python batch.py metros.txt --domains software,"web development" --out leads.jsonl --workers 8
+#  python batch.py cities.jsonl --out leads.parquet        (needs pyarrow - writes a folder of parts)
+#  --intents company,agency   intents for rows that dont list their own
+#  --expand                   expands the domains like EXPAND_KEYWORDS does in the app
+#  --max-results N / --deadline S   per city limits (same as the API)
+#  --fresh                    ignores the checkpoint and starts the output over
+#                             (needed to write over an output that has no checkpoint)
+#  --verbose                  keeps the scraper's own progress prints
+#
+#Input (any of):
+#  cities.txt     one city per line (domains and intents come from the flags)
+#  cities.csv     columns city, domains, intents (lists separated by ;)
+#  cities.jsonl   {"city": "Troy, NY", "domains": ["software"], "intents": ["company"]}
+#Rows for the same city and intents are merged into one search.
+#
+#Every worker process shares the sqlite caches (CACHE_DB), so a company found in
+#one metro is not fetched again for the next. Finished cities are listed in
+#<out>.checkpoint - rerunning the same command skips them, so a killed nightly
+#run picks up where it stopped.
+import io
+import sys
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import jobs
+import limiter
+import keywords
+import scraper
+
+
+#How many cities run at the same time (one process each)
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "4"))
+
+#Columns of the output, in order
+FIELDS = ["City", "Company Name", "Link", "Type", "Source Keyword"]
+
+DEFAULT_DOMAINS = ["software"]
+DEFAULT_INTENTS = ["company", "agency"]
+
+
+### Input ###
+
+def split_list(value):
+    if isinstance(value, list):
+        return [v.strip() for v in value if v and v.strip()]
+    return [v.strip() for v in (value or "").replace(";", ",").split(",") if v.strip()]
+
+#Reads the cities file into a list of searches (city, domains, intents)
+def read_cities(path, domains, intents):
+    rows = []
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(f):
+                row = {k.strip().lower(): v for k, v in row.items() if k}
+                rows.append((row.get("city"), split_list(row.get("domains")), split_list(row.get("intents"))))
+        elif path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if not line.strip(): continue
+                row = json.loads(line)
+                rows.append((row.get("city"), split_list(row.get("domains")), split_list(row.get("intents"))))
+        else:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    rows.append((line, [], []))
+
+    #one search per city and intents, with every domain listed for it
+    merged = {}
+    for city, row_domains, row_intents in rows:
+        city = (city or "").strip()
+        if not city: continue
+        row_intents = row_intents or intents
+        key = (city.lower(), tuple(sorted(i.lower() for i in row_intents)))
+        if key not in merged:
+            merged[key] = {"city": city, "domains": [], "intents": row_intents}
+        for domain in row_domains or domains:
+            if domain not in merged[key]["domains"]:
+                merged[key]["domains"].append(domain)
+    return list(merged.values())
+
+
+### Output ###
+
+#Appends rows to a CSV or JSONL file
+#Resuming cuts the file back to where the last finished city ended, so rows of a
+#city that was half written when the run died are not kept twice
+#size is the output size from the checkpoint (anything after it is a cut off city),
+#or None to start a new output
+class FileWriter:
+    def __init__(self, path, kind, size=None):
+        self.path = path
+        self.kind = kind
+        if size is None:
+            self.f = open(path, 'wb')
+            size = 0
+        else:
+            self.f = open(path, 'a+b')
+            self.f.truncate(size)
+            self.f.seek(size)
+        if kind == "csv" and size == 0:
+            self.write_text(self.csv_text([], header=True))
+
+    def write_text(self, text):
+        self.f.write(text.encode('utf-8'))
+
+    def csv_text(self, rows, header=False):
+        text = io.StringIO()
+        writer = csv.DictWriter(text, fieldnames=FIELDS, extrasaction='ignore')
+        if header:
+            writer.writeheader()
+        writer.writerows(rows)
+        return text.getvalue()
+
+    def write(self, rows, key):
+        if self.kind == "csv":
+            self.write_text(self.csv_text(rows))
+        else:
+            self.write_text("".join(json.dumps(row) + "\n" for row in rows))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+#Writes one Parquet file per city into a folder (readable as one dataset by
+#pandas / pyarrow) - parts of cities that never finished are removed on resume
+class ParquetWriter:
+    def __init__(self, path, done_keys):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            sys.exit("Parquet output needs pyarrow (pip install pyarrow)")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.schema = pyarrow.schema([(name, pyarrow.string()) for name in FIELDS])
+        os.makedirs(path, exist_ok=True)
+        keep = {self.part_name(key) for key in done_keys}
+        for name in os.listdir(path):
+            if name.endswith(".parquet") and name not in keep:
+                os.remove(os.path.join(path, name))
+
+    def part_name(self, key):
+        return f"part-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}.parquet"
+
+    def write(self, rows, key):
+        table = self.pa.Table.from_pylist([{f: row.get(f) for f in FIELDS} for row in rows], schema=self.schema)
+        final = os.path.join(self.path, self.part_name(key))
+        #written under a temporary name so a half written part is never picked up
+        self.pq.write_table(table, final + ".tmp")
+        os.replace(final + ".tmp", final)
+        return 0
+
+    def close(self):
+        pass
+
+#True if there is already output at path (a file with bytes in it, or a folder of parts)
+def has_output(path):
+    if os.path.isdir(path):
+        return any(name.endswith(".parquet") for name in os.listdir(path))
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+def output_kind(path):
+    if path.endswith(".parquet"):
+        return "parquet"
+    if path.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "csv"
+
+
+### Checkpoint ###
+
+#One JSON line per finished city: its key, row count and the output size after it
+class Checkpoint:
+    def __init__(self, path, fresh=False):
+        self.path = path
+        self.done = {}
+        self.size = 0
+        if fresh and os.path.exists(path):
+            os.remove(path)
+        #True once a finished city was read back - only then is the output resumed
+        self.loaded = False
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        #the last line may be cut off if we died while writing it
+                        continue
+                    self.done[entry["key"]] = entry
+                    self.size = entry.get("size", 0)
+                    self.loaded = True
+        self.f = open(path, 'a', encoding='utf-8')
+        #start on a fresh line after a cut off one
+        if self.f.tell() and not line.endswith("\n"):
+            self.f.write("\n")
+
+    def mark(self, entry):
+        self.done[entry["key"]] = entry
+        self.size = entry["size"]
+        self.f.write(json.dumps(entry) + "\n")
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        self.f.close()
+
+def search_id(search, max_results, deadline):
+    return json.dumps(jobs.search_key(search["city"], search["domains"], search["intents"], max_results, deadline))
+
+
+### Workers ###
+
+#Runs in each worker process before its first city
+#The workers split the search budget between them - DDGS sees one client, not N
+def init_worker(workers, verbose):
+    share = max(1, workers)
+    scraper.SEARCH_LIMITER = limiter.AdaptiveLimiter(
+        "search backend", limiter.SEARCH_RATE / share, limiter.SEARCH_RATE_MIN / share,
+        limiter.SEARCH_RATE_MAX / share, burst=max(1, limiter.SEARCH_BURST // share)
+    )
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+#Scrapes one city - returns (rows, seconds, error or None)
+def run_city(search, max_results, deadline):
+    started = time.monotonic()
+    rows = []
+    try:
+        for company in scraper.scrape(search["city"], search["domains"], search["intents"], max_results, deadline):
+            if company:
+                rows.append({"City": search["city"], **company})
+    except Exception as e:
+        return rows, time.monotonic() - started, f"{type(e).__name__}: {e}"
+    return rows, time.monotonic() - started, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape many cities into one CSV / JSONL / Parquet file")
+    parser.add_argument("cities", help="file of cities (.txt, .csv or .jsonl)")
+    parser.add_argument("--out", required=True, help="output .csv, .jsonl or .parquet")
+    parser.add_argument("--domains", default=",".join(DEFAULT_DOMAINS))
+    parser.add_argument("--intents", default=",".join(DEFAULT_INTENTS))
+    parser.add_argument("--expand", action="store_true")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--max-results", type=int, default=None)
+    parser.add_argument("--deadline", type=float, default=None)
+    parser.add_argument("--fresh", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if not scraper.PROXY_POOL.can_search():
+        sys.exit("No proxies found (set PROXY_URLS, PROXY_FILE or PROXY_URL)")
+
+    searches = read_cities(args.cities, split_list(args.domains), split_list(args.intents))
+    if args.expand:
+        for search in searches:
+            search["domains"] = keywords.expand(search["domains"])
+
+    kind = output_kind(args.out)
+    checkpoint = Checkpoint(args.out + ".checkpoint", fresh=args.fresh)
+    #without a checkpoint we cant tell which rows are whole - dont write over someone's file
+    if not checkpoint.loaded and not args.fresh and has_output(args.out):
+        checkpoint.close()
+        if os.path.getsize(checkpoint.path) == 0:
+            os.remove(checkpoint.path)
+        sys.exit(f"{args.out} already exists and has no checkpoint - use --fresh to start it over, or another --out")
+    if kind == "parquet":
+        writer = ParquetWriter(args.out, checkpoint.done)
+    else:
+        writer = FileWriter(args.out, kind, checkpoint.size if checkpoint.loaded else None)
+
+    todo = [s for s in searches if search_id(s, args.max_results, args.deadline) not in checkpoint.done]
+    print(f"{len(searches)} cities, {len(searches) - len(todo)} already done, {len(todo)} to go")
+
+    started = time.monotonic()
+    finished = failed = total_rows = 0
+    pool = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.workers, args.verbose))
+    try:
+        futures = {pool.submit(run_city, s, args.max_results, args.deadline): s for s in todo}
+        for future in as_completed(futures):
+            search = futures[future]
+            try:
+                rows, seconds, error = future.result()
+            except Exception as e:
+                rows, seconds, error = [], 0, f"{type(e).__name__}: {e}"
+
+            #failed cities are not checkpointed, so the next run tries them again
+            if error:
+                failed += 1
+                print(f"[{finished + failed}/{len(todo)}] {search['city']}: FAILED ({error})")
+                continue
+
+            key = search_id(search, args.max_results, args.deadline)
+            size = writer.write(rows, key)
+            checkpoint.mark({"key": key, "city": search["city"], "rows": len(rows), "seconds": round(seconds, 1), "size": size})
+            finished += 1
+            total_rows += len(rows)
+            print(f"[{finished + failed}/{len(todo)}] {search['city']}: {len(rows)} companies ({seconds:.0f}s)")
+    except KeyboardInterrupt:
+        print("Stopped - run the same command again to resume")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        writer.close()
+        checkpoint.close()
+
+    print(f"Done: {finished} cities, {total_rows} companies, {failed} failed in {time.monotonic() - started:.0f}s -> {args.out}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#Compares the soup based page checks with the one-pass analyzer
+#Usage: python benchmarks/bench_analyzer.py [page.html | folder ...]
+#With no arguments it uses a few generated pages
+import sys
+import os
+import time
+import glob
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from scraper import validate_page_content, find_careers_link
+from analyzer import analyze_page
+
+
+#Builds a fake company homepage with the given number of sections and links
+def make_page(title, sections, links, external=0):
+    parts = [f"<html><head><title>{title}</title><style>body {{ color: red; }}</style></head><body>"]
+    parts.append("<nav>" + "".join(f'<a href="/page{i}">Page {i}</a>' for i in range(links)) + "</nav>")
+    for i in range(sections):
+        parts.append(f"<section><h2>Section {i}</h2><p>We offer services and solutions to our clients. "
+                     f"Read more <b>about us</b> &amp; our products.</p></section>")
+    parts.append("".join(f'<a href="https://other{i}.com/">Partner {i}</a>' for i in range(external)))
+    parts.append('<footer><a href="/contact">Contact</a> <a href="/careers">Careers</a></footer>')
+    parts.append("<script>window.dataLayer = [];</script></body></html>")
+    return "".join(parts)
+
+GENERATED = {
+    "small homepage": make_page("Acme Software", 5, 10),
+    "large homepage": make_page("Acme Software | Custom Dev", 2000, 300),
+    "listicle": make_page("Top 10 Software Companies in Troy", 500, 50),
+    "directory": make_page("Software Companies", 200, 20, external=400),
+    "thin page": "<html><head><title>Coming soon</title></head><body><p>Hello</p></body></html>",
+    #character references have to decode the same in both (numeric, hex, windows-1252, unknown names)
+    "entities": make_page("Acme &amp; Sons &#8211; Software&#150; &#x26; &foo &copy 2024", 20, 10)
+        .replace(">Careers<", ">Car&#101;ers &nbsp;<"),
+    "listicle entities": make_page("Top&#32;10 Software Companies &amp;&#x20;Agencies", 300, 40),
+}
+
+#The old way - build a soup, then walk it for each check
+def soup_path(url, html):
+    soup = BeautifulSoup(html, 'html.parser')
+    is_valid, reason = validate_page_content(url, soup)
+    careers = find_careers_link(url, soup) if is_valid else None
+    return is_valid, reason, careers
+
+#Runs fn over the page until about `budget` seconds have passed
+def time_it(fn, url, html, budget=1.0):
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        result = fn(url, html)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed > budget: break
+    return result, elapsed / runs
+
+def load_pages(args):
+    pages = {}
+    for arg in args:
+        paths = glob.glob(os.path.join(arg, "**", "*.html"), recursive=True) if os.path.isdir(arg) else [arg]
+        for path in paths:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                pages[os.path.relpath(path)] = f.read()
+    return pages
+
+def main():
+    pages = load_pages(sys.argv[1:]) or GENERATED
+    url = "https://www.acme-software.com/"
+
+    print(f"{'page':40} {'KB':>7} {'soup ms':>9} {'fast ms':>9} {'speedup':>8}  verdict")
+    mismatches = 0
+    total_soup = total_fast = 0
+    for name, html in pages.items():
+        expected, soup_time = time_it(soup_path, url, html)
+        got, fast_time = time_it(analyze_page, url, html)
+        total_soup += soup_time
+        total_fast += fast_time
+
+        same = expected == got
+        if not same: mismatches += 1
+        verdict = expected[1] if same else f"MISMATCH soup={expected} fast={got}"
+        print(f"{name[:40]:40} {len(html) / 1024:7.1f} {soup_time * 1000:9.2f} {fast_time * 1000:9.2f} "
+              f"{soup_time / fast_time:7.1f}x  {verdict}")
+
+    print(f"\nTotal: soup {total_soup * 1000:.2f} ms, fast {total_fast * 1000:.2f} ms "
+          f"({total_soup / total_fast:.1f}x), {mismatches} mismatches")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#Checks that the whole-page deadline holds against servers that drip a page out slowly
+#(a byte every so often, so the socket read timeout never fires), with no network:
+#a local server plays each kind of slow site and fetcher.fetch_page has to give up
+#with DeadlineExceeded close to the deadline, not when the server is done
+#
+#Cases:
+#  length     Content-Length page dripped one byte at a time
+#  chunked    chunked page, one tiny chunk at a time
+#  close      no length, ends when the server closes
+#  fast       a normal page (must still come back whole)
+#
+#Usage:
+#  python benchmarks/bench_deadline.py
+#  --deadline X    page deadline in seconds (default 2)
+#  --drip X        seconds between bytes (default 0.2)
+#  --slack X       how far past the deadline a fetch may end (default 1)
+import sys
+import os
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fetcher
+
+
+PAGE = b"<html><body>" + b"x" * 2000 + b"</body></html>"
+
+#The slow sites - how long a drip runs if nothing stops it
+DRIP_SECONDS = 20
+
+
+class DripHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    drip = 0.2
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        case = self.path.strip("/")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        if case in ("length", "fast"):
+            self.send_header("Content-Length", str(len(PAGE)))
+        elif case == "chunked":
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Connection", "close")
+        self.end_headers()
+
+        try:
+            if case == "fast":
+                self.wfile.write(PAGE)
+                return
+            stop = time.monotonic() + DRIP_SECONDS
+            for i in range(len(PAGE)):
+                if time.monotonic() > stop: break
+                byte = PAGE[i:i + 1]
+                self.wfile.write(b"1\r\n" + byte + b"\r\n" if case == "chunked" else byte)
+                self.wfile.flush()
+                time.sleep(self.drip)
+        except OSError:
+            #the client gave up - what we want
+            pass
+        self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whole-page deadline against slow-drip servers")
+    parser.add_argument("--deadline", type=float, default=2)
+    parser.add_argument("--drip", type=float, default=0.2)
+    parser.add_argument("--slack", type=float, default=1)
+    args = parser.parse_args()
+
+    DripHandler.drip = args.drip
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DripHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"deadline {args.deadline}s, a byte every {args.drip}s")
+    print(f"{'case':8} {'took s':>7} {'outcome':20}")
+    failed = False
+    for case in ("length", "chunked", "close", "fast"):
+        started = time.monotonic()
+        try:
+            resp, text, note = fetcher.fetch_page(f"{base}/{case}", deadline=args.deadline, timeout=10)
+            outcome = f"{len(text or '')} chars"
+            ok = case == "fast" and text is not None and len(text) == len(PAGE)
+        except fetcher.DeadlineExceeded:
+            outcome = "DeadlineExceeded"
+            ok = case != "fast"
+        except Exception as e:
+            outcome = type(e).__name__
+            ok = False
+        took = time.monotonic() - started
+        if case != "fast" and took > args.deadline + args.slack:
+            ok = False
+        failed = failed or not ok
+        print(f"{case:8} {took:7.2f} {outcome:20} {'' if ok else 'FAIL'}")
+
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
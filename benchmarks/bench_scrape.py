@@ -0,0 +1,532 @@
+#Runs scraper.scrape end to end with no network - search results come from a
+#fixture store through a fake DDGS, pages from a local HTTP proxy stand-in
+#Reports latency, pages/s, thread cpu and peak memory per stage, and checks that
+#every page still gets the same accept/reject verdict as the baseline
+#
+#Usage:
+#  python benchmarks/bench_scrape.py                      generated fixtures
+#  python benchmarks/bench_scrape.py --fixtures DIR       recorded fixtures
+#  python benchmarks/bench_scrape.py --record DIR --city "Troy, NY" --domains software,web
+#       (records live DDGS results and pages - needs PROXY_URL)
+#  --update-baseline   saves the current verdicts as the new baseline
+#  --runs N            repeats the end-to-end run (fresh caches each time)
+#  --latency X         scales the recorded page/search delays (0 = no waiting)
+#  --async             runs async_scraper.scrape instead
+import sys
+import os
+import re
+import json
+import time
+import glob
+import random
+import asyncio
+import hashlib
+import atexit
+import shutil
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+#Caches and traces go to a scratch folder, set before the scraper modules are imported
+WORK = tempfile.mkdtemp(prefix="bench_scrape_")
+atexit.register(shutil.rmtree, WORK, ignore_errors=True)
+os.environ["CACHE_DB"] = os.path.join(WORK, "warmup.db")
+os.environ["TRACE_DIR"] = os.path.join(WORK, "traces")
+
+import scraper
+import fetcher
+import memory
+import metrics
+import proxies
+import async_scraper
+import careers
+from cache import SearchCache, CompanyIndex, PageCache, CareersCache, LeadStore
+from analyzer import PageAnalyzer, Decided
+
+
+STAGES = ["search", "throttle", "fetch", "parse", "validate", "careers"]
+
+
+#The fixture store is a folder:
+#  searches.json  {query: {"results": [...], "delay": seconds}}
+#  pages.json     {url: {"file": "pages/<sha1>.html", "status": 200, "headers": {...}, "delay": seconds}}
+#  pages/         raw page bodies
+#  baseline.json  {"pages": {url: [accepted, reason, careers]}, "accepted": [links]}
+class FixtureStore:
+    def __init__(self, path):
+        self.path = path
+        self.searches = self.load("searches.json", {})
+        self.pages = self.load("pages.json", {})
+        self.baseline = self.load("baseline.json", None)
+        #pages are served over plain http, so look them up without the scheme
+        self.by_key = {page_key(url): url for url in self.pages}
+
+    def load(self, name, default):
+        path = os.path.join(self.path, name)
+        if not os.path.exists(path): return default
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, name, data):
+        with open(os.path.join(self.path, name), 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+
+    def add_page(self, url, status, headers, body, delay):
+        os.makedirs(os.path.join(self.path, "pages"), exist_ok=True)
+        name = f"pages/{hashlib.sha1(url.encode()).hexdigest()}.html"
+        with open(os.path.join(self.path, name), 'wb') as f:
+            f.write(body)
+        self.pages[url] = {"file": name, "status": status, "headers": headers, "delay": delay}
+        self.by_key[page_key(url)] = url
+
+    def body(self, url):
+        with open(os.path.join(self.path, self.pages[url]["file"]), 'rb') as f:
+            return f.read()
+
+
+#http://x.com/a and https://x.com/a are the same fixture
+def page_key(url):
+    return re.sub(r'^https?://', '', url or '')
+
+#Every url the scraper sees is plain http so the stand-in proxy can answer it
+def to_http(url):
+    return re.sub(r'^https://', 'http://', url)
+
+
+### Generated fixtures ###
+
+#careers is the careers link's href (None = no careers link)
+def make_page(title, sections, links, external=0, careers="/careers"):
+    parts = [f"<html><head><title>{title}</title></head><body>"]
+    parts.append("<nav>" + "".join(f'<a href="/page{i}">Page {i}</a>' for i in range(links)) + "</nav>")
+    for i in range(sections):
+        parts.append(f"<section><h2>Section {i}</h2><p>We offer services and solutions to our clients. "
+                     f"Read more <b>about us</b> &amp; our products.</p></section>")
+    parts.append("".join(f'<a href="https://other{i}.com/">Partner {i}</a>' for i in range(external)))
+    parts.append('<footer><a href="/contact">Contact</a>')
+    if careers:
+        parts.append(f' <a href="{careers}">Careers</a>')
+    parts.append("</footer></body></html>")
+    return "".join(parts)
+
+#A fixed mix of company sites, listicles, directories and junk for the default search
+def generate(path, city="Troy, NY", domains=("software", "web development"), intents=("company", "agency"), companies=60):
+    rng = random.Random(42)
+    store = FixtureStore(path)
+    kinds = ["company"] * 6 + ["no careers", "listicle", "directory", "thin", "pdf", "missing", "moved"]
+
+    sites = []
+    for i in range(companies):
+        kind = rng.choice(kinds)
+        name = f"Acme{i}"
+        url = f"https://www.{name.lower()}.com/"
+        headers = {"Content-Type": "text/html; charset=utf-8"}
+        status = 200
+        if kind == "company":
+            body = make_page(f"{name} Software", rng.randint(5, 400), rng.randint(5, 80))
+        elif kind == "no careers":
+            body = make_page(f"{name} Studio", rng.randint(5, 200), rng.randint(5, 40), careers=None)
+        elif kind == "listicle":
+            body = make_page(f"Top 10 Software Companies in {city}", 300, 40)
+        elif kind == "directory":
+            body = make_page(f"{name} Partners", 100, 20, external=200)
+        elif kind == "thin":
+            body = "<html><head><title>Coming soon</title></head><body><p>Hello</p></body></html>"
+        elif kind == "pdf":
+            url = f"https://www.{name.lower()}.com/brochure.pdf"
+            headers = {"Content-Type": "application/pdf"}
+            body = "%PDF-1.4 not really"
+        elif kind == "moved":
+            #redirects to a page whose careers link is relative to where it ended up
+            moved = f"http://www.{name.lower()}.com/about/"
+            body = make_page(f"{name} Labs", rng.randint(5, 200), rng.randint(5, 40), careers="jobs/")
+            store.add_page(moved, 200, headers, body.encode(), 0.05)
+            url = f"https://www.{name.lower()}.com/about"
+            status, headers, body = 301, {"Location": moved}, ""
+        else:
+            status, body = 404, "Not found"
+        store.add_page(url, status, headers, body.encode(), round(rng.uniform(0.05, 0.4), 3))
+        sites.append((url, name))
+
+    #every query returns a slice of the sites (so later queries repeat some)
+    for q, (query, _) in enumerate(scraper.plan_queries(city, domains, intents)):
+        picks = rng.sample(sites, min(25, len(sites)))
+        results = [{"href": url, "title": f"{name} | {city}", "body": ""} for url, name in picks]
+        store.searches[query] = {"results": results, "delay": round(rng.uniform(0.3, 1.0), 3)}
+
+    store.save("searches.json", store.searches)
+    store.save("pages.json", store.pages)
+    return store
+
+
+### Recording live fixtures ###
+
+def record(path, city, domains, intents):
+    if not scraper.PROXY_POOL.proxies:
+        sys.exit("PROXY_URL (or PROXY_URLS / PROXY_FILE) is needed to record fixtures")
+    os.makedirs(path, exist_ok=True)
+    store = FixtureStore(path)
+
+    for query, _ in scraper.plan_queries(city, domains, intents):
+        started = time.perf_counter()
+        results = scraper.run_search(scraper.SEARCH_CLIENTS, query)
+        store.searches[query] = {"results": results, "delay": round(time.perf_counter() - started, 3)}
+        print(f"{query}: {len(results)} results")
+
+        for result in results:
+            url = result['href']
+            if url in store.pages or scraper.BLOCKLIST.blocks(url): continue
+            proxy = scraper.PROXY_POOL.choose("page")
+            started = time.perf_counter()
+            try:
+                resp, html, note = fetcher.fetch_page(url, timeout=10, proxies=proxies.as_requests(proxy))
+            except Exception as e:
+                scraper.PROXY_POOL.failure(proxy, hard=False)
+                print(f"   skipped {url}: {type(e).__name__}")
+                continue
+            scraper.PROXY_POOL.success(proxy, time.perf_counter() - started)
+            headers = {k: v for k, v in resp.headers.items() if k.lower() in ("content-type", "content-length")}
+            store.add_page(url, resp.status_code, headers, resp.content or b"", round(time.perf_counter() - started, 3))
+            print(f"   {resp.status_code} {url}")
+
+    store.save("searches.json", store.searches)
+    store.save("pages.json", store.pages)
+    print(f"Recorded {len(store.searches)} searches and {len(store.pages)} pages to {path}")
+
+
+### Replay ###
+
+#HTTP proxy that answers every request from the fixture store
+def start_stand_in(store, latency):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = store.by_key.get(page_key(self.path))
+            if url is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            page = store.pages[url]
+            if latency:
+                time.sleep(page.get("delay", 0) * latency)
+            body = store.body(url)
+            self.send_response(page["status"])
+            for key, value in page["headers"].items():
+                if key.lower() != "content-length":
+                    self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+#Stands in for ddgs.DDGS - answers from the fixture store
+def fake_ddgs(store, latency):
+    class FakeDDGS:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def text(self, query, **kwargs):
+            entry = store.searches.get(query)
+            if entry is None:
+                print(f"   no fixture for '{query}'")
+                return []
+            if latency:
+                time.sleep(entry.get("delay", 0) * latency)
+            return [dict(r, href=to_http(r['href'])) for r in entry["results"]]
+    return FakeDDGS
+
+#Fresh caches for every run so nothing is served from an earlier one
+#(and no slowed down hosts, pauses or proxy scores either, so runs time the same work)
+def reset_caches(run):
+    #careers probes the last run left in the background would hold this run's probe slots
+    careers.PROBE_POOL.shutdown(wait=True)
+    careers.PROBE_POOL = ThreadPoolExecutor(max_workers=careers.CAREERS_WORKERS)
+    path = os.path.join(WORK, f"run{run}.db")
+    scraper.SEARCH_CACHE = SearchCache(path)
+    scraper.COMPANY_INDEX = async_scraper.COMPANY_INDEX = CompanyIndex(path)
+    scraper.PAGE_CACHE = async_scraper.PAGE_CACHE = PageCache(path)
+    careers.CAREERS_CACHE = CareersCache(path)
+    scraper.LEADS = LeadStore(path)
+    for limiter in (scraper.HOST_LIMITER, scraper.PROXY_LIMITER, scraper.SEARCH_LIMITER):
+        limiter.reset()
+    scraper.forbidden = memory.LRU(scraper.forbidden.max_entries)
+    pool = scraper.PROXY_POOL
+    scraper.PROXY_POOL = proxies.ProxyPool(list(pool.proxies), direct=pool.direct)
+    for metric in metrics.METRICS:
+        metric.values.clear()
+
+def latest_trace():
+    paths = sorted(glob.glob(os.path.join(os.environ["TRACE_DIR"], "*.json")), key=os.path.getmtime)
+    with open(paths[-1], encoding='utf-8') as f:
+        return json.load(f)
+
+#One full scrape - returns (accepted links, seconds, seconds to first result, trace, peak rss bytes,
+#verdicts) where verdicts is what the pipeline decided for every url it checked:
+#{url: [accepted, reason, careers]}
+#(no tracemalloc here - it slows parsing down several times)
+def run_once(city, domains, intents, use_async):
+    started = time.perf_counter()
+    first = None
+    links = []
+    verdicts = {}
+
+    def got(company):
+        nonlocal first
+        if first is None:
+            first = time.perf_counter() - started
+        links.append(page_key(company["Link"]))
+
+    def checked(url, data, reason):
+        careers = data["Link"] if data and data["Type"] == "Direct Career Page" else None
+        verdicts[page_key(url)] = [bool(data), reason, page_key(careers) or None]
+
+    #listen in on check_company (both versions look it up by name on every call)
+    sync_check, async_check = scraper.check_company, async_scraper.check_company
+
+    def check_company(url, title, source, city=None):
+        data, reason = sync_check(url, title, source, city)
+        checked(url, data, reason)
+        return data, reason
+
+    async def check_company_async(client_for, url, title, source, city=None):
+        data, reason = await async_check(client_for, url, title, source, city)
+        checked(url, data, reason)
+        return data, reason
+
+    scraper.check_company, async_scraper.check_company = check_company, check_company_async
+    try:
+        if use_async:
+            async def go():
+                async for company in async_scraper.scrape(city, domains, intents):
+                    got(company)
+            asyncio.run(go())
+        else:
+            for company in scraper.scrape(city, domains, intents):
+                got(company)
+    finally:
+        scraper.check_company, async_scraper.check_company = sync_check, async_check
+
+    elapsed = time.perf_counter() - started
+    return links, elapsed, first, latest_trace(), memory.peak_rss(), verdicts
+
+#Checks every stored page one at a time, the way the pipeline does, for the peak
+#memory of each stage (verdicts are checked on the pipeline's own, see run_once)
+#Returns ({url: [valid, reason, careers]}, {stage: [cpu seconds, peak bytes]})
+def verdicts_and_memory(store, proxies):
+    verdicts = {}
+    stages = {"fetch": [0.0, 0], "parse": [0.0, 0], "validate": [0.0, 0], "careers": [0.0, 0]}
+
+    #cpu time and the most memory the step allocated on top of what was already held
+    def measure(stage, fn):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        cpu = time.process_time()
+        try:
+            return fn()
+        finally:
+            stages[stage][0] += time.process_time() - cpu
+            stages[stage][1] = max(stages[stage][1], tracemalloc.get_traced_memory()[1] - before)
+
+    tracemalloc.start()
+    for url in store.pages:
+        resp, html, note = measure("fetch", lambda: fetcher.fetch_page(to_http(url), timeout=10, proxies=proxies))
+        if resp.status_code != 200:
+            verdicts[url] = [None, f"HTTP {resp.status_code}", None]
+            continue
+        if html is None:
+            verdicts[url] = [False, note, None]
+            continue
+
+        #analyze_page split into its three steps
+        analyzer = PageAnalyzer(to_http(url))
+        try:
+            def parse():
+                analyzer.feed(html)
+                analyzer.close()
+            measure("parse", parse)
+            is_valid, reason = measure("validate", analyzer.finish)
+        except Decided:
+            is_valid, reason = analyzer.verdict
+        careers = measure("careers", analyzer.careers_link) if is_valid else None
+        verdicts[url] = [is_valid, "ACCEPTED" if is_valid else reason, page_key(careers) or None]
+    tracemalloc.stop()
+    return verdicts, stages
+
+def percentile(values, p):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def report_stages(trace, memory):
+    #timings and cpu from the last run's trace, peak memory from checking the pages one by one
+    #(cpu is the cpu of the thread each span ran on - async runs have none, their spans
+    #share the event loop thread)
+    print(f"\n{'stage':10} {'count':>6} {'total s':>9} {'mean ms':>9} {'p95 ms':>9} {'thread cpu':>10} {'peak KB':>9}")
+    for stage in STAGES:
+        spans = [s for s in trace["spans"] if s["stage"] == stage]
+        seconds = [s["seconds"] for s in spans]
+        cpu = [s["thread_cpu"] for s in spans if "thread_cpu" in s]
+        cpu = f"{sum(cpu):10.3f}" if cpu else f"{'-':>10}"
+        peak = memory.get(stage, [0, 0])[1] / 1024
+        mean = sum(seconds) / len(seconds) * 1000 if seconds else 0
+        print(f"{stage:10} {len(spans):6} {sum(seconds):9.3f} {mean:9.2f} {percentile(seconds, 0.95) * 1000:9.2f} "
+              f"{cpu} {peak:9.1f}")
+
+#Lists every page whose verdict differs from the baseline
+#(baselines saved before the pipeline verdicts have valid = None / False / True in place of accepted)
+def compare(baseline, verdicts):
+    changed = []
+    for url, expected in baseline.items():
+        got = verdicts.get(page_key(url))
+        if got is None: continue
+        #careers links are compared without the scheme (pages are served over http)
+        expected = [bool(expected[0]), expected[1], page_key(expected[2]) or None]
+        if got != expected:
+            changed.append((url, expected, got))
+    return changed
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end scrape benchmark")
+    parser.add_argument("--fixtures", help="fixture folder (default: generated)")
+    parser.add_argument("--record", help="record live fixtures into this folder")
+    parser.add_argument("--city", default="Troy, NY")
+    parser.add_argument("--domains", default="software,web development")
+    parser.add_argument("--intents", default="company,agency")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--async", dest="use_async", action="store_true")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    domains = [d.strip() for d in args.domains.split(",") if d.strip()]
+    intents = [i.strip() for i in args.intents.split(",") if i.strip()]
+
+    if args.record:
+        record(args.record, args.city, domains, intents)
+        return
+
+    if args.fixtures:
+        store = FixtureStore(args.fixtures)
+    else:
+        store = generate(os.path.join(WORK, "fixtures"), args.city, domains, intents)
+    print(f"Fixtures: {len(store.searches)} searches, {len(store.pages)} pages ({store.path})")
+
+    server = start_stand_in(store, args.latency)
+    proxy = f"http://127.0.0.1:{server.server_port}"
+    os.environ["PROXY_URL"] = proxy
+    #every request goes through the stand-in, never direct
+    scraper.PROXY_POOL = proxies.ProxyPool([proxy], direct="none")
+    scraper.DDGS = fake_ddgs(store, args.latency)
+
+    #keep the scraper's own progress prints out of the report
+    real_stdout = sys.stdout
+    results = []
+    for run in range(args.runs):
+        reset_caches(run)
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            results.append(run_once(args.city, domains, intents, args.use_async))
+        finally:
+            sys.stdout.close()
+            sys.stdout = real_stdout
+
+        links, elapsed, first, trace, peak, _ = results[-1]
+        pages = sum(1 for s in trace["spans"] if s["stage"] == "fetch")
+        print(f"run {run + 1}: {len(links)} accepted, {pages} pages in {elapsed:.2f}s "
+              f"({pages / elapsed:.1f} pages/s), first result {first or 0:.2f}s, peak rss {peak / 1024 / 1024:.1f} MB")
+
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        _, memory = verdicts_and_memory(store, {'http': proxy, 'https': proxy})
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+    report_stages(results[-1][3], memory)
+
+    problems = 0
+    #the same fixtures should always get the same verdicts from the pipeline
+    accepted = [sorted(r[0]) for r in results]
+    verdicts = results[0][5]
+    for run, r in enumerate(results[1:], 2):
+        changed = sorted(url for url in set(verdicts) | set(r[5]) if verdicts.get(url) != r[5].get(url))
+        for url in changed:
+            print(f"UNSTABLE {url}: run 1={verdicts.get(url)} run {run}={r[5].get(url)}")
+        problems += len(changed)
+    if any(a != accepted[0] for a in accepted):
+        print("\nUNSTABLE: runs accepted different companies")
+        problems += 1
+
+    if store.baseline and not args.update_baseline:
+        changed = compare(store.baseline["pages"], verdicts)
+        for url, expected, got in changed:
+            print(f"CHANGED {url}: baseline={expected} now={got}")
+        problems += len(changed)
+        if sorted(store.baseline["accepted"]) != accepted[0]:
+            print("CHANGED: accepted companies differ from the baseline")
+            problems += 1
+        print(f"\nVerdicts: {len(verdicts) - len(changed)}/{len(verdicts)} match the baseline (pipeline)")
+    elif args.fixtures:
+        store.save("baseline.json", {"pages": verdicts, "accepted": accepted[0]})
+        print(f"\nBaseline saved to {os.path.join(store.path, 'baseline.json')}")
+    else:
+        #generated fixtures know what each page should get
+        problems += check_generated(store, verdicts)
+
+    sys.exit(1 if problems else 0)
+
+#What the pipeline should decide for a generated page: [accepted, reason, careers]
+def expected_verdict(store, url):
+    page = store.pages[url]
+    if page["status"] in (301, 302) and page_key(page["headers"]["Location"]) in store.by_key:
+        url = store.by_key[page_key(page["headers"]["Location"])]
+        page = store.pages[url]
+    body = store.body(url).decode('utf-8', errors='replace')
+    if page["status"] != 200:
+        return [False, f"HTTP {page['status']}", None]
+    if "application/pdf" in page["headers"].get("Content-Type", ""):
+        return [False, "Not a web page (application/pdf)", None]
+    if "Top 10" in body:
+        return [False, "Likely a listicle", None]
+    if "Coming soon" in body:
+        return [False, "Not enough business content", None]
+    if "Partner 0" in body:
+        return [False, "Too many external links", None]
+    link = re.search(r'<a href="([^"]*)">Careers</a>', body)
+    return [True, "ACCEPTED", page_key(urljoin(url, link.group(1))) if link else None]
+
+#Checks the pipeline's verdicts against what each kind of generated page should get
+#(every url the searches returned has to have been checked)
+def check_generated(store, verdicts):
+    problems = 0
+    wanted = {page_key(r["href"]): store.by_key[page_key(r["href"])]
+              for entry in store.searches.values() for r in entry["results"]}
+    for key, url in sorted(wanted.items()):
+        expected = expected_verdict(store, url)
+        got = verdicts.get(key)
+        if got != expected:
+            print(f"CHANGED {url}: expected {expected} now {got}")
+            problems += 1
+    print(f"\nVerdicts: {len(wanted) - problems}/{len(wanted)} as expected (pipeline)")
+    return problems
+
+if __name__ == "__main__":
+    main()
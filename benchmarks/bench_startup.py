@@ -0,0 +1,167 @@
+#Measures how fast a fresh API worker gets going - every run is a new python process:
+#  import     import app (Flask and our own modules, not the scraper)
+#  health     import + the first GET /
+#  warm       how long the background warm up took (WARM_START=1 only)
+#  first      first POST /api/search -> its first NDJSON result
+#  search     first POST /api/search -> the end of the stream
+#Searches and pages are offline (same fixtures and stand-in proxy as bench_scrape.py),
+#and every run starts with empty caches
+#
+#Usage:
+#  python benchmarks/bench_startup.py                 5 runs warm, 5 runs cold
+#  --runs N              runs per mode
+#  --max-health-ms X     fail if the median import + health check takes longer
+#  --max-first-ms X      fail if the median first result after warm up takes longer
+#Always fails if the health check alone pulled in a heavy module (see HEAVY)
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#Modules that must not be loaded before the first search
+HEAVY = ["ddgs", "bs4", "requests", "tldextract", "httpx", "scraper"]
+
+CITY = "Troy, NY"
+DOMAINS = ["software", "web development"]
+INTENTS = ["company", "agency"]
+
+
+### One fresh worker (runs in its own process) ###
+
+def child():
+    started = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    import app
+    imported = time.perf_counter()
+
+    client = app.app.test_client()
+    client.get('/')
+    healthy = time.perf_counter()
+    #what the health check needed (with warm up on the background thread may have loaded more by now)
+    heavy = [name for name in HEAVY if name in sys.modules]
+
+    warm = None
+    if app.warm_thread is not None:
+        app.warm_thread.join()
+        warm = time.perf_counter() - healthy
+
+    #answer searches from the fixtures (patched on the class, so clients made by the warm up use it too -
+    #ddgs.DDGS is only a stand-in that loads ddgs.ddgs.DDGS on first use)
+    import ddgs.ddgs
+    with open(os.path.join(os.environ["FIXTURES"], "searches.json"), encoding='utf-8') as f:
+        searches = json.load(f)
+
+    def text(self, query, **kwargs):
+        entry = searches.get(query, {"results": []})
+        return [dict(r, href=r['href'].replace("https://", "http://", 1)) for r in entry["results"]]
+    ddgs.ddgs.DDGS.text = text
+
+    asked = time.perf_counter()
+    resp = client.post('/api/search', json={"city": CITY, "domains": DOMAINS}, buffered=False)
+    first = None
+    results = 0
+    for chunk in resp.response:
+        for line in chunk.decode('utf-8').splitlines():
+            if not line.strip(): continue
+            results += 1
+            if first is None:
+                first = time.perf_counter() - asked
+    done = time.perf_counter() - asked
+
+    print(json.dumps({
+        "import": imported - started,
+        "health": healthy - started,
+        "warm": warm,
+        "first": first,
+        "search": done,
+        "results": results,
+        "heavy": heavy
+    }))
+
+
+### Driver ###
+
+def run_child(fixtures, proxy, warm, work, run):
+    env = dict(os.environ)
+    env.update({
+        "FIXTURES": fixtures,
+        "PROXY_URL": proxy,
+        "CACHE_DB": os.path.join(work, f"{'warm' if warm else 'cold'}{run}.db"),
+        "WARM_START": "1" if warm else "0",
+        "PYTHONDONTWRITEBYTECODE": "1"
+    })
+    env.pop("TRACE_DIR", None)
+    env.pop("WARM_IN_WORKER_HOOK", None)
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        env=env, cwd=work, capture_output=True, text=True, timeout=120
+    )
+    if out.returncode != 0:
+        sys.exit(f"worker failed:\n{out.stderr[-2000:]}")
+    #the scraper's own progress prints come first, our numbers are the last line
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def median_ms(runs, key):
+    values = [r[key] for r in runs if r[key] is not None]
+    return statistics.median(values) * 1000 if values else None
+
+def main():
+    if "--child" in sys.argv:
+        child()
+        return
+
+    parser = argparse.ArgumentParser(description="Cold start and first search latency of the API worker")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-health-ms", type=float, default=None)
+    parser.add_argument("--max-first-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    #the fixtures and stand-in proxy from the scrape benchmark (this process only)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import bench_scrape
+    work = tempfile.mkdtemp(prefix="bench_startup_", dir=bench_scrape.WORK)
+    store = bench_scrape.generate(os.path.join(work, "fixtures"), CITY, DOMAINS, INTENTS)
+    server = bench_scrape.start_stand_in(store, 0)
+    proxy = f"http://127.0.0.1:{server.server_port}"
+
+    results = {}
+    for warm in (True, False):
+        mode = "warm" if warm else "cold"
+        results[mode] = [run_child(store.path, proxy, warm, work, run) for run in range(args.runs)]
+
+    print(f"{args.runs} runs per mode, medians in ms")
+    print(f"{'mode':6} {'import':>8} {'health':>8} {'warm':>8} {'first':>8} {'search':>8} {'results':>8}")
+    for mode, runs in results.items():
+        cells = [median_ms(runs, key) for key in ("import", "health", "warm", "first", "search")]
+        cells = [f"{c:8.1f}" if c is not None else f"{'-':>8}" for c in cells]
+        print(f"{mode:6} {' '.join(cells)} {statistics.median(r['results'] for r in runs):8.0f}")
+
+    failed = False
+    #only cold runs say what the health check loads (warm ones load it all on purpose)
+    heavy = sorted({name for r in results["cold"] for name in r["heavy"]})
+    if heavy:
+        print(f"FAIL: the health check loaded {', '.join(heavy)}")
+        failed = True
+    health = median_ms(results["warm"], "health")
+    if args.max_health_ms and health > args.max_health_ms:
+        print(f"FAIL: health check took {health:.1f} ms (limit {args.max_health_ms})")
+        failed = True
+    first = median_ms(results["warm"], "first")
+    if args.max_first_ms and (first is None or first > args.max_first_ms):
+        print(f"FAIL: first result took {first} ms after warm up (limit {args.max_first_ms})")
+        failed = True
+    if any(r["results"] == 0 for runs in results.values() for r in runs):
+        print("FAIL: a search returned nothing")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#Compares ways of sending /api/search results to the client, with no network
+#(same fixtures, stand-in proxy and fake DDGS as bench_scrape.py, through the Flask app)
+#For each mode: time to the first company, time to the end of the stream, how many
+#flushes the client gets and how many bytes go over the wire (vs uncompressed)
+#
+#Modes:
+#  per line       no batching or compression (close to how the stream used to work)
+#  batched        companies found together share a flush (STREAM_BATCH_SIZE / STREAM_BATCH_MS)
+#  gzip / br      batched and compressed (br only if the brotli module is installed)
+#  events         batched + gzip with progress events
+#  events cached  the same with the leads store already holding this search (cached burst first)
+#
+#Usage:
+#  python benchmarks/bench_stream.py
+#  --runs N        runs per mode (fresh caches every run), medians are shown
+#  --latency X     scales the recorded page/search delays (0 = no waiting)
+#  --max-first-ms X  fail if batching made the first company slower than this
+import sys
+import os
+import json
+import time
+import zlib
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+#no background warm up - the fake DDGS has to be in place before any search client is made
+os.environ["WARM_START"] = "0"
+import bench_scrape
+import proxies
+import scraper
+import streaming
+import app
+
+
+CITY = "Troy, NY"
+DOMAINS = ["software", "web development"]
+INTENTS = ["company", "agency"]
+
+#name, batch size, batch ms, encoding, events, cached leads
+MODES = [
+    ("per line", 1, 0, None, False, False),
+    ("batched", streaming.STREAM_BATCH_SIZE, streaming.STREAM_BATCH_MS, None, False, False),
+    ("gzip", streaming.STREAM_BATCH_SIZE, streaming.STREAM_BATCH_MS, "gzip", False, False),
+    ("br", streaming.STREAM_BATCH_SIZE, streaming.STREAM_BATCH_MS, "br", False, False),
+    ("events", streaming.STREAM_BATCH_SIZE, streaming.STREAM_BATCH_MS, "gzip", True, False),
+    ("events cached", streaming.STREAM_BATCH_SIZE, streaming.STREAM_BATCH_MS, "gzip", True, True),
+]
+
+
+#Undoes the Content-Encoding chunk by chunk, like a browser does
+def decoder(encoding):
+    if encoding == "gzip":
+        return zlib.decompressobj(31).decompress
+    if encoding == "br":
+        return streaming.brotli.Decompressor().process
+    return lambda chunk: chunk
+
+#One /api/search, read the way the frontend reads it
+def run_once(client, encoding, events):
+    started = time.perf_counter()
+    body = {"city": CITY, "domains": DOMAINS, "events": events}
+    resp = client.post('/api/search', json=body, headers={"Accept-Encoding": encoding or "identity"}, buffered=False)
+    if resp.headers.get("Content-Encoding") != encoding:
+        sys.exit(f"asked for {encoding}, got {resp.headers.get('Content-Encoding')}")
+    decode = decoder(encoding)
+
+    first = None
+    flushes = 0
+    wire = 0
+    raw = 0
+    links = set()
+    buffer = ""
+    for chunk in resp.response:
+        if not chunk: continue
+        flushes += 1
+        wire += len(chunk)
+        text = decode(chunk).decode('utf-8')
+        raw += len(text.encode('utf-8'))
+        buffer += text
+        lines = buffer.split("\n")
+        buffer = lines.pop()
+        for line in lines:
+            if not line.strip(): continue
+            item = json.loads(line)
+            found = item["companies"] if item.get("event") == "cached" else ([item] if "event" not in item else [])
+            for company in found:
+                links.add(company["Link"])
+                if first is None:
+                    first = time.perf_counter() - started
+    return {
+        "first": first,
+        "total": time.perf_counter() - started,
+        "flushes": flushes,
+        "wire": wire,
+        "raw": raw,
+        "companies": len(links)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first result and bytes on the wire of the search stream")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--max-first-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    store = bench_scrape.generate(os.path.join(bench_scrape.WORK, "fixtures"), CITY, DOMAINS, INTENTS)
+    server = bench_scrape.start_stand_in(store, args.latency)
+    proxy = f"http://127.0.0.1:{server.server_port}"
+    scraper.PROXY_POOL = proxies.ProxyPool([proxy], direct="none")
+    scraper.DDGS = bench_scrape.fake_ddgs(store, args.latency)
+    client = app.app.test_client()
+
+    real_stdout = sys.stdout
+    #a leads store that already holds this search, for the cached burst
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        bench_scrape.reset_caches("leads")
+        run_once(client, None, False)
+        filled = scraper.LEADS
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    print(f"{args.runs} runs per mode, medians")
+    print(f"{'mode':14} {'first ms':>9} {'total s':>8} {'flushes':>8} {'wire B':>8} {'raw B':>8} {'ratio':>6} {'found':>6}")
+    results = {}
+    saved = streaming.STREAM_BATCH_SIZE, streaming.STREAM_BATCH_MS
+    for name, size, batch_ms, encoding, events, cached in MODES:
+        if encoding == "br" and streaming.brotli is None:
+            print(f"{name:14} skipped (no brotli module)")
+            continue
+        streaming.STREAM_BATCH_SIZE, streaming.STREAM_BATCH_MS = size, batch_ms
+        runs = []
+        for run in range(args.runs):
+            bench_scrape.reset_caches(f"{name.replace(' ', '_')}{run}")
+            if cached:
+                scraper.LEADS = filled
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                runs.append(run_once(client, encoding, events))
+            finally:
+                sys.stdout.close()
+                sys.stdout = real_stdout
+        streaming.STREAM_BATCH_SIZE, streaming.STREAM_BATCH_MS = saved
+
+        median = {key: statistics.median(r[key] for r in runs) for key in runs[0] if key != "first"}
+        median["first"] = statistics.median(r["first"] for r in runs if r["first"] is not None) if any(r["first"] for r in runs) else None
+        results[name] = median
+        first = f"{median['first'] * 1000:9.1f}" if median["first"] is not None else f"{'-':>9}"
+        print(f"{name:14} {first} {median['total']:8.2f} {median['flushes']:8.0f} {median['wire']:8.0f} "
+              f"{median['raw']:8.0f} {median['wire'] / max(median['raw'], 1):6.2f} {median['companies']:6.0f}")
+
+    problems = 0
+    found = {r["companies"] for name, r in results.items() if name != "events cached"}
+    if len(found) > 1:
+        print("DIFFERENT: modes found different numbers of companies")
+        problems += 1
+    batched = results.get("batched", {}).get("first")
+    if args.max_first_ms and (batched is None or batched * 1000 > args.max_first_ms):
+        print(f"FAIL: first company took {batched} s batched (limit {args.max_first_ms} ms)")
+        problems += 1
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
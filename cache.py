@@ -0,0 +1,678 @@
+import sqlite3
+import json
+import time
+import threading
+import os
+import hashlib
+
+
+#Where the scraper caches live on disk (shared by every worker process)
+CACHE_DB = os.environ.get(
+    "CACHE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "scraper_cache.db")
+)
+
+#How long search results stay fresh (seconds) and how many queries are kept
+SEARCH_CACHE_TTL = int(os.environ.get("SEARCH_CACHE_TTL", str(24 * 60 * 60)))
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "5000"))
+
+#Company verdicts younger than COMPANY_FRESH are used as is, ones up to
+#COMPANY_MAX_AGE are still served but refreshed in the background,
+#anything older is fetched again before it is used
+COMPANY_FRESH = int(os.environ.get("COMPANY_FRESH", str(7 * 24 * 60 * 60)))
+COMPANY_MAX_AGE = int(os.environ.get("COMPANY_MAX_AGE", str(30 * 24 * 60 * 60)))
+
+#How long ConceptNet expansions are kept (seconds) and how many terms
+KEYWORD_CACHE_TTL = int(os.environ.get("KEYWORD_CACHE_TTL", str(30 * 24 * 60 * 60)))
+KEYWORD_CACHE_SIZE = int(os.environ.get("KEYWORD_CACHE_SIZE", "2000"))
+
+#How long a careers page lookup is kept per domain (seconds) - also when none was found
+CAREERS_CACHE_TTL = int(os.environ.get("CAREERS_CACHE_TTL", str(7 * 24 * 60 * 60)))
+
+#Leads last seen longer ago than this count as stale (worth scraping that area again)
+LEADS_FRESH = int(os.environ.get("LEADS_FRESH", str(7 * 24 * 60 * 60)))
+#Most leads one query returns
+LEADS_MAX_LIMIT = 1000
+
+
+#Base for the caches - opens one sqlite connection per process
+#(a connection made before gunicorn forks is never reused by the children)
+class SqliteStore:
+    SCHEMA = ""
+
+    def __init__(self, path=CACHE_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+
+    def db(self):
+        if self.conn is None or self.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            #WAL lets readers in other workers keep going while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self.conn = conn
+            self.pid = os.getpid()
+        return self.conn
+
+
+#Caches DDGS results so repeat searches dont go through the proxy again
+#Keyed by (query, region, timelimit), expires after ttl and drops the
+#least recently used queries once there are more than max_entries
+class SearchCache(SqliteStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS search_cache (
+            query TEXT NOT NULL,
+            region TEXT NOT NULL,
+            timelimit TEXT NOT NULL,
+            results TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (query, region, timelimit)
+        );
+        CREATE INDEX IF NOT EXISTS search_cache_last_used ON search_cache (last_used);
+    """
+
+    def __init__(self, path=CACHE_DB, ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_SIZE):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query, region="us-en", timelimit=None):
+        key = (query, region, timelimit or "")
+        now = time.time()
+        try:
+            with self.lock:
+                conn = self.db()
+                row = conn.execute(
+                    "SELECT results, created_at FROM search_cache WHERE query=? AND region=? AND timelimit=?",
+                    key
+                ).fetchone()
+
+                #missing or expired
+                if row is None or now - row[1] > self.ttl:
+                    self.misses += 1
+                    return None
+
+                conn.execute(
+                    "UPDATE search_cache SET last_used=? WHERE query=? AND region=? AND timelimit=?",
+                    (now,) + key
+                )
+                conn.commit()
+                self.hits += 1
+                return json.loads(row[0])
+        except sqlite3.Error as e:
+            #a broken cache should never break the search
+            print(f"Search cache error: {e}")
+            self.misses += 1
+            return None
+
+    def put(self, query, results, region="us-en", timelimit=None):
+        now = time.time()
+        try:
+            with self.lock:
+                conn = self.db()
+                conn.execute(
+                    "INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    (query, region, timelimit or "", json.dumps(results), now, now)
+                )
+                self.evict(conn, now)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Search cache error: {e}")
+
+    #Removes expired queries, then the least recently used ones over the limit
+    def evict(self, conn, now):
+        conn.execute("DELETE FROM search_cache WHERE created_at < ?", (now - self.ttl,))
+        conn.execute(
+            """DELETE FROM search_cache WHERE rowid IN (
+                SELECT rowid FROM search_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_entries,)
+        )
+
+    def stats(self):
+        try:
+            with self.lock:
+                entries = self.db().execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl
+        }
+
+
+#Remembers the verdict for every company site we have checked, keyed by domain
+#(or by page url for a rejected page that isnt the homepage, see scraper.index_key),
+#so any later search (any city, any keyword) can skip fetching the page again
+class CompanyIndex(SqliteStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS companies (
+            domain TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            title TEXT,
+            valid INTEGER NOT NULL,
+            reason TEXT,
+            careers TEXT,
+            fetched_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path=CACHE_DB, fresh=COMPANY_FRESH, max_age=COMPANY_MAX_AGE):
+        super().__init__(path)
+        self.fresh = fresh
+        self.max_age = max_age
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+
+    #Returns (entry, state) where state is "fresh", "stale" or None (fetch it again)
+    def get(self, domain):
+        try:
+            with self.lock:
+                row = self.db().execute(
+                    "SELECT url, title, valid, reason, careers, fetched_at FROM companies WHERE domain=?",
+                    (domain,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Company index error: {e}")
+            row = None
+
+        if row is None:
+            self.misses += 1
+            return None, None
+
+        entry = {
+            "domain": domain,
+            "url": row[0],
+            "title": row[1],
+            "valid": bool(row[2]),
+            "reason": row[3],
+            "careers": row[4],
+            "fetched_at": row[5]
+        }
+        age = time.time() - entry["fetched_at"]
+        if age > self.max_age:
+            self.misses += 1
+            return entry, None
+        if age > self.fresh:
+            self.stale += 1
+            return entry, "stale"
+        self.hits += 1
+        return entry, "fresh"
+
+    def put(self, domain, url, title, valid, reason, careers):
+        try:
+            with self.lock:
+                conn = self.db()
+                conn.execute(
+                    "INSERT OR REPLACE INTO companies VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (domain, url, title, int(valid), reason, careers, time.time())
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Company index error: {e}")
+
+    def stats(self):
+        try:
+            with self.lock:
+                entries = self.db().execute("SELECT COUNT(*) FROM companies").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale,
+            "misses": self.misses,
+            "entries": entries,
+            "fresh_seconds": self.fresh,
+            "max_age_seconds": self.max_age
+        }
+
+
+#Remembers the ETag / Last-Modified and a hash of every page we parsed,
+#so refetches can be conditional and unchanged pages skip parsing
+class PageCache(SqliteStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            body_hash TEXT NOT NULL,
+            valid INTEGER NOT NULL,
+            reason TEXT,
+            careers TEXT,
+            checked_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path=CACHE_DB):
+        super().__init__(path)
+        self.not_modified = 0
+        self.unchanged = 0
+        self.changed = 0
+
+    def get(self, url):
+        try:
+            with self.lock:
+                row = self.db().execute(
+                    "SELECT etag, last_modified, body_hash, valid, reason, careers FROM pages WHERE url=?",
+                    (url,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Page cache error: {e}")
+            return None
+
+        if row is None: return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "body_hash": row[2],
+            "valid": bool(row[3]),
+            "reason": row[4],
+            "careers": row[5]
+        }
+
+    #Headers to send so the server can answer 304 Not Modified
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry and entry["etag"]:
+            headers['If-None-Match'] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers['If-Modified-Since'] = entry["last_modified"]
+        return headers
+
+    def put(self, url, etag, last_modified, body_hash, valid, reason, careers):
+        try:
+            with self.lock:
+                conn = self.db()
+                conn.execute(
+                    "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, etag, last_modified, body_hash, int(valid), reason, careers, time.time())
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Page cache error: {e}")
+
+    def stats(self):
+        return {
+            "not_modified": self.not_modified,
+            "unchanged_body": self.unchanged,
+            "changed": self.changed
+        }
+
+
+#Keeps ConceptNet expansions across restarts and shares them between workers
+#Expires after ttl and drops the least recently used terms over max_entries
+class KeywordCache(SqliteStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS keyword_cache (
+            term TEXT PRIMARY KEY,
+            related TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS keyword_cache_last_used ON keyword_cache (last_used);
+    """
+
+    def __init__(self, path=CACHE_DB, ttl=KEYWORD_CACHE_TTL, max_entries=KEYWORD_CACHE_SIZE):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    #Looks up every term in one query - returns {term: related terms} for the ones we have
+    def get_many(self, terms):
+        terms = list(terms)
+        if not terms: return {}
+        now = time.time()
+        found = {}
+        try:
+            with self.lock:
+                conn = self.db()
+                marks = ",".join("?" * len(terms))
+                rows = conn.execute(
+                    f"SELECT term, related FROM keyword_cache WHERE term IN ({marks}) AND created_at >= ?",
+                    terms + [now - self.ttl]
+                ).fetchall()
+                found = {term: json.loads(related) for term, related in rows}
+
+                if found:
+                    conn.execute(
+                        f"UPDATE keyword_cache SET last_used=? WHERE term IN ({','.join('?' * len(found))})",
+                        [now] + list(found)
+                    )
+                    conn.commit()
+        except sqlite3.Error as e:
+            print(f"Keyword cache error: {e}")
+
+        self.hits += len(found)
+        self.misses += len(set(terms)) - len(found)
+        return found
+
+    def put(self, term, related):
+        now = time.time()
+        try:
+            with self.lock:
+                conn = self.db()
+                conn.execute(
+                    "INSERT OR REPLACE INTO keyword_cache VALUES (?, ?, ?, ?)",
+                    (term, json.dumps(related), now, now)
+                )
+                conn.execute("DELETE FROM keyword_cache WHERE created_at < ?", (now - self.ttl,))
+                conn.execute(
+                    """DELETE FROM keyword_cache WHERE rowid IN (
+                        SELECT rowid FROM keyword_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_entries,)
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Keyword cache error: {e}")
+
+    def stats(self):
+        try:
+            with self.lock:
+                entries = self.db().execute("SELECT COUNT(*) FROM keyword_cache").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl
+        }
+
+
+#Careers pages found by careers.discover, one per registrable domain
+#"none found" is remembered too, so a company without one isnt probed every search
+class CareersCache(SqliteStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS careers_cache (
+            domain TEXT PRIMARY KEY,
+            link TEXT,
+            source TEXT NOT NULL,
+            checked_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path=CACHE_DB, ttl=CAREERS_CACHE_TTL):
+        super().__init__(path)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    #Returns (link or None, source) or None if this domain wasnt looked at recently
+    def get(self, domain):
+        try:
+            with self.lock:
+                row = self.db().execute(
+                    "SELECT link, source FROM careers_cache WHERE domain=? AND checked_at >= ?",
+                    (domain, time.time() - self.ttl)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Careers cache error: {e}")
+            row = None
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0], row[1]
+
+    def put(self, domain, link, source):
+        now = time.time()
+        try:
+            with self.lock:
+                conn = self.db()
+                conn.execute("INSERT OR REPLACE INTO careers_cache VALUES (?, ?, ?, ?)", (domain, link, source, now))
+                conn.execute("DELETE FROM careers_cache WHERE checked_at < ?", (now - self.ttl,))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Careers cache error: {e}")
+
+    def stats(self):
+        try:
+            with self.lock:
+                entries, found = self.db().execute(
+                    "SELECT COUNT(*), COUNT(link) FROM careers_cache"
+                ).fetchone()
+        except sqlite3.Error:
+            entries = found = None
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": entries,
+            "found": found,
+            "ttl_seconds": self.ttl
+        }
+
+
+#Every company a search accepted, per city and domain keyword, so they can be
+#looked up later without scraping again (GET /api/leads)
+#Seeing a company again only moves its last_seen forward (and updates its link)
+#One row per company, city and keyword - the intents that found it are merged, and a
+#careers page one of them found is kept over a later homepage-only result
+class LeadStore(SqliteStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS leads (
+            id INTEGER PRIMARY KEY,
+            city_key TEXT NOT NULL,
+            city TEXT NOT NULL,
+            keyword TEXT NOT NULL,
+            intent TEXT,
+            domain TEXT NOT NULL,
+            name TEXT NOT NULL,
+            link TEXT NOT NULL,
+            type TEXT NOT NULL,
+            source TEXT NOT NULL,
+            first_seen REAL NOT NULL,
+            last_seen REAL NOT NULL,
+            UNIQUE (city_key, keyword, domain)
+        );
+        CREATE INDEX IF NOT EXISTS leads_city ON leads (city_key, last_seen);
+        CREATE INDEX IF NOT EXISTS leads_keyword ON leads (keyword, city_key, last_seen);
+        CREATE INDEX IF NOT EXISTS leads_type ON leads (type, city_key, last_seen);
+        CREATE INDEX IF NOT EXISTS leads_last_seen ON leads (last_seen);
+    """
+
+    #Full text search over names, links and keywords (kept in step by triggers)
+    #Only where sqlite was built with FTS5 - text queries fall back to LIKE otherwise
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS leads_fts USING fts5(
+            name, link, source, content='leads', content_rowid='id'
+        );
+        CREATE TRIGGER IF NOT EXISTS leads_fts_insert AFTER INSERT ON leads BEGIN
+            INSERT INTO leads_fts (rowid, name, link, source) VALUES (new.id, new.name, new.link, new.source);
+        END;
+        CREATE TRIGGER IF NOT EXISTS leads_fts_delete AFTER DELETE ON leads BEGIN
+            INSERT INTO leads_fts (leads_fts, rowid, name, link, source) VALUES ('delete', old.id, old.name, old.link, old.source);
+        END;
+        CREATE TRIGGER IF NOT EXISTS leads_fts_update AFTER UPDATE OF name, link, source ON leads BEGIN
+            INSERT INTO leads_fts (leads_fts, rowid, name, link, source) VALUES ('delete', old.id, old.name, old.link, old.source);
+            INSERT INTO leads_fts (rowid, name, link, source) VALUES (new.id, new.name, new.link, new.source);
+        END;
+    """
+
+    #What a company without a careers page is saved as (see scraper.company_data)
+    HOMEPAGE = "Homepage"
+
+    def __init__(self, path=CACHE_DB, fresh=LEADS_FRESH):
+        super().__init__(path)
+        self.fresh = fresh
+        self.fts = None
+        self.migrated_pid = None
+        self.saved = 0
+
+    def db(self):
+        conn = super().db()
+        if self.fts is None:
+            try:
+                conn.executescript(self.FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError as e:
+                print(f"Leads store: no full text search ({e})")
+                self.fts = False
+        if self.migrated_pid != os.getpid():
+            self.migrate(conn)
+            self.migrated_pid = os.getpid()
+        return conn
+
+    #Keywords used to be saved as typed ("Software" and "software" were two rows) -
+    #folds old rows like new ones are, keeping the row already folded when both exist
+    def migrate(self, conn):
+        conn.create_function("keyword_key", 1, keyword_key, deterministic=True)
+        try:
+            conn.execute("UPDATE OR IGNORE leads SET keyword = keyword_key(keyword) WHERE keyword != keyword_key(keyword)")
+            conn.execute("DELETE FROM leads WHERE keyword != keyword_key(keyword)")
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Leads store migration error: {e}")
+
+    #Saves one accepted company (data is what the search sent to the frontend)
+    def put(self, city, keyword, intent, domain, data):
+        now = time.time()
+        try:
+            with self.lock:
+                conn = self.db()
+                conn.execute(
+                    """INSERT INTO leads (city_key, city, keyword, intent, domain, name, link, type, source, first_seen, last_seen)
+                    VALUES (:city_key, :city, :keyword, :intent, :domain, :name, :link, :type, :source, :now, :now)
+                    ON CONFLICT (city_key, keyword, domain) DO UPDATE SET
+                        city=excluded.city, name=excluded.name, last_seen=excluded.last_seen,
+                        intent=CASE
+                            WHEN leads.intent IS NULL THEN excluded.intent
+                            WHEN excluded.intent IS NULL OR instr(',' || leads.intent || ',', ',' || excluded.intent || ',') THEN leads.intent
+                            ELSE leads.intent || ',' || excluded.intent END,
+                        link=CASE WHEN excluded.type = :homepage AND leads.type != :homepage THEN leads.link ELSE excluded.link END,
+                        source=CASE WHEN excluded.type = :homepage AND leads.type != :homepage THEN leads.source ELSE excluded.source END,
+                        type=CASE WHEN excluded.type = :homepage AND leads.type != :homepage THEN leads.type ELSE excluded.type END""",
+                    {"city_key": city_key(city), "city": city, "keyword": keyword_key(keyword), "intent": keyword_key(intent) or None,
+                     "domain": domain, "name": data["Company Name"], "link": data["Link"], "type": data["Type"],
+                     "source": data["Source Keyword"], "now": now, "homepage": self.HOMEPAGE}
+                )
+                conn.commit()
+                self.saved += 1
+        except sqlite3.Error as e:
+            print(f"Leads store error: {e}")
+
+    #Leads matching every filter given, most recently seen first
+    #keywords is a list (any of them), text is searched in names, links and keywords,
+    #max_age drops leads not seen for that many seconds
+    #Returns (leads, total matching)
+    def find(self, city=None, keywords=None, lead_type=None, text=None, max_age=None, limit=100, offset=0):
+        where = []
+        args = []
+        if city:
+            where.append("l.city_key = ?")
+            args.append(city_key(city))
+        if keywords:
+            where.append(f"l.keyword IN ({','.join('?' * len(keywords))})")
+            args.extend(keyword_key(k) for k in keywords)
+        if lead_type:
+            where.append("l.type = ?")
+            args.append(lead_type)
+        if max_age:
+            where.append("l.last_seen >= ?")
+            args.append(time.time() - max_age)
+
+        joins = ""
+        words = (text or "").split()
+        try:
+            with self.lock:
+                conn = self.db()
+                if words and self.fts:
+                    #every word as a quoted prefix, so user input is never read as FTS syntax
+                    joins = "JOIN leads_fts f ON f.rowid = l.id"
+                    where.append("leads_fts MATCH ?")
+                    args.append(" ".join('"' + w.replace('"', '""') + '"*' for w in words))
+                elif words:
+                    for w in words:
+                        where.append("(l.name LIKE ? OR l.link LIKE ? OR l.source LIKE ?)")
+                        args.extend([f"%{w}%"] * 3)
+
+                clause = f"FROM leads l {joins} " + (f"WHERE {' AND '.join(where)}" if where else "")
+                total = conn.execute(f"SELECT COUNT(*) {clause}", args).fetchone()[0]
+                rows = conn.execute(
+                    f"""SELECT l.name, l.link, l.type, l.source, l.city, l.keyword, l.last_seen {clause}
+                    ORDER BY l.last_seen DESC LIMIT ? OFFSET ?""",
+                    args + [min(limit, LEADS_MAX_LIMIT), offset]
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Leads store error: {e}")
+            return [], 0
+
+        leads = [{
+            "Company Name": row[0],
+            "Link": row[1],
+            "Type": row[2],
+            "Source Keyword": row[3],
+            "City": row[4],
+            "Keyword": row[5],
+            "Last Seen": row[6]
+        } for row in rows]
+        return leads, total
+
+    #When each keyword was last scraped in a city - {keyword: last seen or None}
+    #plus the keywords that need a fresh scrape (never seen, or not for fresh seconds)
+    def coverage(self, city, keywords=None):
+        try:
+            with self.lock:
+                rows = self.db().execute(
+                    "SELECT keyword, MAX(last_seen) FROM leads WHERE city_key = ? GROUP BY keyword",
+                    (city_key(city),)
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Leads store error: {e}")
+            rows = []
+
+        seen = dict(rows)
+        if keywords:
+            seen = {keyword: seen.get(keyword_key(keyword)) for keyword in keywords}
+        cutoff = time.time() - self.fresh
+        stale = [keyword for keyword, last in seen.items() if last is None or last < cutoff]
+        return seen, stale
+
+    def stats(self):
+        try:
+            with self.lock:
+                entries, cities = self.db().execute(
+                    "SELECT COUNT(*), COUNT(DISTINCT city_key) FROM leads"
+                ).fetchone()
+        except sqlite3.Error:
+            entries = cities = None
+        return {
+            "saved": self.saved,
+            "entries": entries,
+            "cities": cities,
+            "full_text": bool(self.fts),
+            "fresh_seconds": self.fresh
+        }
+
+
+#The same city however it was typed ("Troy, NY" / "troy,  ny")
+def city_key(city):
+    return " ".join((city or "").lower().split())
+
+#A keyword (or intent) however it was typed ("Web Development " / "web development")
+def keyword_key(keyword):
+    return " ".join((keyword or "").lower().split())
+
+#Short fingerprint of a page body (same body -> same verdict)
+def body_hash(content):
+    return hashlib.sha1(content).hexdigest()
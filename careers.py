@@ -0,0 +1,305 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse, urljoin
+import threading
+import requests
+import gzip
+import time
+import re
+import os
+import fetcher
+import lazy
+import metrics
+import proxies
+import urls
+from cache import CareersCache
+
+#scraper imports this module - its limiters and proxy pool are looked up on first use
+scraper = lazy.module("scraper")
+
+
+#Looks for a company's careers page when its homepage has no careers link we can
+#see (eg the link is in a JS menu). Cheapest first:
+#  1. job board links (Greenhouse, Lever, Workday...) anywhere in the html (page_link)
+#  2. careers pages listed in the sitemaps from /robots.txt (or /sitemap.xml)
+#  3. HEAD requests to well-known paths like /careers and /jobs
+#2 and 3 (discover) run at the same time, with a small request budget per host,
+#after the homepage itself has been let go. Every probe waits its turn on the same
+#host / proxy limiters as page fetches and reports back to them and the proxy pool.
+#Their answers (found or not) are cached per registrable domain. The page worker
+#only waits CAREERS_WAIT seconds - a slower lookup finishes in the background and
+#its answer is there for the next search.
+
+#Set to 0 to only use the links on the page, like before
+CAREERS_DISCOVERY = os.environ.get("CAREERS_DISCOVERY", "1") == "1"
+
+#Most requests one lookup may send to a host, and how many at once
+#(SITEMAP_REQUESTS of the budget are kept for robots.txt and the sitemaps)
+CAREERS_BUDGET = int(os.environ.get("CAREERS_BUDGET", "7"))
+SITEMAP_REQUESTS = 3
+CAREERS_PARALLEL = int(os.environ.get("CAREERS_PARALLEL", "3"))
+#Probe threads shared by every lookup in this process
+CAREERS_WORKERS = int(os.environ.get("CAREERS_WORKERS", "16"))
+#Seconds per probe, for the whole lookup, and the most a page worker waits on it
+PROBE_TIMEOUT = float(os.environ.get("PROBE_TIMEOUT", "5"))
+CAREERS_DEADLINE = float(os.environ.get("CAREERS_DEADLINE", "8"))
+CAREERS_WAIT = min(float(os.environ.get("CAREERS_WAIT", "3")), CAREERS_DEADLINE)
+
+#Most bytes read from robots.txt / one sitemap, and child sitemaps read from an index
+ROBOTS_BYTES = 64 * 1024
+SITEMAP_BYTES = 1024 * 1024
+SITEMAP_CHILDREN = 2
+
+#Paths most companies use, most common first
+WELL_KNOWN_PATHS = ["/careers", "/jobs", "/join-us", "/about/careers", "/company/careers", "/work-with-us"]
+
+#Hosted job boards - a link to one of these is the careers page
+ATS_HOSTS = [
+    "boards.greenhouse.io", "job-boards.greenhouse.io", "jobs.lever.co", "myworkdayjobs.com",
+    "apply.workable.com", "jobs.ashbyhq.com", "jobs.smartrecruiters.com", "bamboohr.com/careers",
+    "recruitee.com", "breezy.hr", "applytojob.com", "jobs.jobvite.com", "icims.com"
+]
+ATS_LINK = re.compile(
+    r"""https?://[^\s"'<>\\]*?(?:%s)[^\s"'<>\\]*""" % "|".join(re.escape(h) for h in ATS_HOSTS),
+    re.IGNORECASE
+)
+
+#Sitemap urls whose path looks like a careers page
+CAREERS_PATH = re.compile(r"/(careers?|jobs|join-us|join|work-with-us|hiring|opportunities)(/|\.html?|$)", re.IGNORECASE)
+SITEMAP_LOC = re.compile(r"<loc>\s*([^<\s]+)\s*</loc>", re.IGNORECASE)
+ROBOTS_SITEMAP = re.compile(r"^\s*sitemap\s*:\s*(\S+)", re.IGNORECASE | re.MULTILINE)
+
+#Statuses that mean stop probing this host (a 403 is just a page we may not see)
+STOP_STATUS = {429, 503}
+
+CAREERS_CACHE = CareersCache()
+PROBE_POOL = ThreadPoolExecutor(max_workers=CAREERS_WORKERS)
+
+
+#Requests one lookup is still allowed to send (shared by its probes)
+#Sitemap reads and path probes each have their own share so neither starves the other
+#Nothing is sent after the deadline (seconds from now)
+class Budget:
+    def __init__(self, requests, parallel, deadline=CAREERS_DEADLINE):
+        sitemap = min(SITEMAP_REQUESTS, requests // 2)
+        self.left = {"sitemap": sitemap, "path": requests - sitemap}
+        self.slots = threading.Semaphore(parallel)
+        self.lock = threading.Lock()
+        self.until = time.monotonic() + deadline
+        #set once the host throttles us - nothing more is sent
+        self.stopped = False
+        #set when a probe was skipped for lack of time (so "none" isnt the real answer)
+        self.expired = False
+
+    def take(self, kind):
+        with self.lock:
+            if self.stopped or self.left[kind] <= 0:
+                return False
+            if self.remaining() <= 0:
+                self.expired = True
+                return False
+            self.left[kind] -= 1
+            return True
+
+    def remaining(self):
+        return self.until - time.monotonic()
+
+
+#Sends one probe the way scraper.fetch_verdict sends a page: waits its turn on the
+#host and proxy limiters, then tells them (and the proxy pool) how it went
+#send(timeout) makes the request - returns its response, or None if the wait for a
+#turn would run past the lookup deadline
+def send_probe(url, budget, proxy, send):
+    delay = scraper.fetch_delay(url, proxy)
+    if delay >= budget.remaining():
+        budget.expired = True
+        return None
+    if delay > 0:
+        time.sleep(delay)
+
+    scraper.PROXY_POOL.acquire(proxy)
+    started = time.monotonic()
+    try:
+        resp = send(min(PROBE_TIMEOUT, max(budget.remaining(), 0.1)))
+    except requests.exceptions.ProxyError:
+        scraper.PROXY_POOL.failure(proxy)
+        scraper.fetch_feedback(url, proxy, error="PROXY_ERROR")
+        raise
+    except requests.exceptions.ConnectTimeout:
+        scraper.PROXY_POOL.failure(proxy)
+        raise
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+        scraper.PROXY_POOL.failure(proxy, hard=False)
+        raise
+    except Exception:
+        scraper.PROXY_POOL.release(proxy)
+        raise
+
+    scraper.PROXY_POOL.success(proxy, time.monotonic() - started)
+    #429 / 503 / repeated 403s slow the host down for page fetches too
+    scraper.fetch_feedback(url, proxy, resp.status_code, resp.headers)
+    if resp.status_code in STOP_STATUS:
+        budget.stopped = True
+    return resp
+
+
+#First job board link in the html (scripts and JS menus included)
+def ats_link(html):
+    match = ATS_LINK.search(html or "")
+    return match.group(0).rstrip(".,;)") if match else None
+
+#Reads at most max_bytes of a small text file (robots.txt, a sitemap)
+#Returns the text or None
+def read_small(url, budget, proxy, max_bytes):
+    if not budget.take("sitemap"): return None
+    with budget.slots:
+        send = lambda timeout: fetcher.get(url, stream=True, timeout=timeout, proxies=proxies.as_requests(proxy))
+        resp = send_probe(url, budget, proxy, send)
+        if resp is None:
+            return None
+        try:
+            if resp.status_code != 200:
+                return None
+            body = bytearray()
+            for chunk in resp.iter_content(chunk_size=16 * 1024):
+                body.extend(chunk)
+                if len(body) >= max_bytes or budget.remaining() <= 0:
+                    break
+        finally:
+            resp.close()
+
+    content = bytes(body[:max_bytes])
+    if url.endswith(".gz") or content[:2] == b"\x1f\x8b":
+        try:
+            content = gzip.decompress(content)
+        except (OSError, EOFError):
+            return None
+    return fetcher.decode(content, 'utf-8')
+
+#Shortest careers-looking url on the site from its sitemaps
+def from_sitemaps(url, budget, proxy):
+    root = urljoin(url, "/")
+    robots = read_small(root + "robots.txt", budget, proxy, ROBOTS_BYTES)
+    sitemaps = ROBOTS_SITEMAP.findall(robots or "")[:SITEMAP_CHILDREN] or [root + "sitemap.xml"]
+
+    domain = urls.registrable_domain(url)
+    found = []
+    children = []
+    for sitemap in sitemaps:
+        text = read_small(sitemap, budget, proxy, SITEMAP_BYTES)
+        if not text: continue
+        #a sitemap index lists more sitemaps, not pages
+        if "<sitemapindex" in text[:1000].lower():
+            children.extend(SITEMAP_LOC.findall(text))
+            continue
+        found.extend(loc for loc in SITEMAP_LOC.findall(text)
+                     if urls.registrable_domain(loc) == domain and CAREERS_PATH.search(urlparse(loc).path))
+
+    #only a couple of child sitemaps - pages ones first, they usually list /careers
+    children.sort(key=lambda loc: "page" not in loc.lower())
+    for sitemap in children[:SITEMAP_CHILDREN]:
+        if found: break
+        text = read_small(sitemap, budget, proxy, SITEMAP_BYTES)
+        found.extend(loc for loc in SITEMAP_LOC.findall(text or "")
+                     if urls.registrable_domain(loc) == domain and CAREERS_PATH.search(urlparse(loc).path))
+
+    return min(found, key=lambda loc: (len(urlparse(loc).path.strip("/").split("/")), len(loc))) if found else None
+
+#HEAD request to one well-known path - returns the page it ends up on if it exists
+def probe_path(url, path, budget, proxy):
+    if not budget.take("path"): return None
+    target = urljoin(url, path)
+    with budget.slots:
+        kwargs = {"allow_redirects": True, "proxies": proxies.as_requests(proxy)}
+        resp = send_probe(target, budget, proxy, lambda timeout: fetcher.get_session().head(target, timeout=timeout, **kwargs))
+        #some servers dont do HEAD - a streamed GET we close straight away costs about the same
+        if resp is not None and resp.status_code in (405, 501):
+            resp = send_probe(target, budget, proxy, lambda timeout: fetcher.get(target, stream=True, timeout=timeout, **kwargs))
+            if resp is not None:
+                resp.close()
+
+    if resp is None or resp.status_code != 200:
+        return None
+    content_type = resp.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type and content_type not in fetcher.HTML_TYPES:
+        return None
+
+    #sent back to the homepage (or off to another company) means there is no such page
+    final = resp.url or target
+    if urlparse(final).path.strip("/") == "":
+        return None
+    if urls.registrable_domain(final) != urls.registrable_domain(url) and not ATS_LINK.match(final):
+        return None
+    return final
+
+#Result of a probe future, None if it failed
+def outcome(future):
+    if not future.done() or future.cancelled():
+        return None
+    try:
+        return future.result()
+    except Exception as e:
+        metrics.FETCH_ERRORS.inc(reason="careers probe", error=type(e).__name__)
+        return None
+
+#Job board link in a homepage that has no careers link (None if there is none)
+def page_link(html):
+    if not CAREERS_DISCOVERY: return None
+    link = ats_link(html)
+    if link:
+        metrics.CAREERS.inc(source="ats", cached="no")
+    return link
+
+#Finds the careers page of the company at url whose homepage had no careers link
+#proxy is the proxy the homepage came through
+#Returns the careers url or None
+def discover(url, proxy=None):
+    if not CAREERS_DISCOVERY: return None
+    #well-known paths and sitemaps there would be the host's, not this company's
+    if urls.on_shared_path(url): return None
+    domain = urls.registrable_domain(url)
+    cached = CAREERS_CACHE.get(domain) if domain else None
+    if cached is not None:
+        link, source = cached
+        metrics.CAREERS.inc(source=source, cached="yes")
+        return link
+
+    with metrics.timer("discover", url=url):
+        budget = Budget(CAREERS_BUDGET, CAREERS_PARALLEL)
+        sitemap = PROBE_POOL.submit(from_sitemaps, url, budget, proxy)
+        paths = [PROBE_POOL.submit(probe_path, url, path, budget, proxy) for path in WELL_KNOWN_PATHS]
+        futures = [sitemap] + paths
+        done, not_done = wait(futures, timeout=CAREERS_WAIT)
+        if not_done:
+            #dont hold the page worker any longer - the probes stop by the budget's
+            #deadline and the answer is cached for the next search
+            metrics.CAREERS.inc(source="background", cached="no")
+            left = [len(not_done)]
+            lock = threading.Lock()
+            def finished(future):
+                with lock:
+                    left[0] -= 1
+                    if left[0]: return
+                settle(domain, sitemap, paths, budget)
+            for future in not_done:
+                future.add_done_callback(finished)
+            return None
+
+        return settle(domain, sitemap, paths, budget)
+
+#Picks the answer once every probe is done, counts it and caches it
+def settle(domain, sitemap, paths, budget):
+    #a page the site lists itself beats a guessed path
+    link, source = outcome(sitemap), "sitemap"
+    if not link:
+        link, source = next((l for l in map(outcome, paths) if l), None), "path"
+    if not link:
+        source = "none"
+        #ran out of time - try again next time instead of remembering "none"
+        if budget.expired:
+            metrics.CAREERS.inc(source="timeout", cached="no")
+            return None
+
+    metrics.CAREERS.inc(source=source, cached="no")
+    if domain:
+        CAREERS_CACHE.put(domain, link, source)
+    return link
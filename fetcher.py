@@ -0,0 +1,216 @@
+from urllib.parse import urlparse
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
+import requests
+import threading
+import socket
+import time
+import os
+
+
+#How many hosts keep connections open, and how many connections each host
+#(or the proxy itself, for plain http targets) can have at once
+POOL_HOSTS = int(os.environ.get("POOL_HOSTS", "100"))
+POOL_PER_HOST = int(os.environ.get("POOL_PER_HOST", "10"))
+
+#Most bytes read from one page, and the most time (seconds) spent reading it
+MAX_PAGE_BYTES = int(os.environ.get("MAX_PAGE_BYTES", str(2 * 1024 * 1024)))
+PAGE_DEADLINE = float(os.environ.get("PAGE_DEADLINE", "15"))
+#What to do with pages over MAX_PAGE_BYTES - "truncate" keeps the start, "reject" drops them
+OVERSIZE_POLICY = os.environ.get("OVERSIZE_POLICY", "truncate")
+
+#Content types worth parsing (a missing header is given the benefit of the doubt)
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+
+#Browser headers sent with every page fetch
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Referer': 'https://www.google.com/'
+}
+
+
+#One shared session per process so connections (and proxy tunnels) get reused
+#between fetches, threads and requests instead of a new handshake every time
+#(page fetches and careers probes - DDGS searches go through their own http client,
+#one per proxy kept for the worker's life, see scraper.SearchClients)
+session = None
+session_pid = None
+session_lock = threading.Lock()
+
+#Requests running right now per host - used to see when pools are maxed out
+in_flight = {}
+stats = {"requests": 0, "peak_in_flight": 0, "saturated": 0}
+stats_lock = threading.Lock()
+
+
+#Returns the session for this process (a new one after gunicorn forks)
+def get_session():
+    global session, session_pid
+    with session_lock:
+        if session is None or session_pid != os.getpid():
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_PER_HOST, max_retries=0)
+            s.mount('http://', adapter)
+            s.mount('https://', adapter)
+            s.headers.update(HEADERS)
+            #dont keep cookies - every fetch looks like a fresh visitor (same as before)
+            s.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            session = s
+            session_pid = os.getpid()
+        return session
+
+#GET through the shared pool (same arguments as requests.get)
+def get(url, **kwargs):
+    parsed = urlparse(url)
+    host = parsed.netloc.lower()
+    #plain http through a proxy all shares the one pool to the proxy
+    proxy = (kwargs.get('proxies') or {}).get(parsed.scheme)
+    if proxy and parsed.scheme == 'http':
+        host = "proxy:" + urlparse(proxy).netloc
+
+    with stats_lock:
+        stats["requests"] += 1
+        in_flight[host] = in_flight.get(host, 0) + 1
+        #more requests than pooled connections - extras are opened and thrown away
+        if in_flight[host] > POOL_PER_HOST:
+            stats["saturated"] += 1
+        total = sum(in_flight.values())
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], total)
+
+    try:
+        return get_session().get(url, **kwargs)
+    finally:
+        with stats_lock:
+            in_flight[host] -= 1
+            if in_flight[host] == 0:
+                del in_flight[host]
+
+#Raised when a page takes longer than the whole-read deadline
+#(a Timeout so callers treat it like any other slow site)
+class DeadlineExceeded(requests.exceptions.Timeout):
+    pass
+
+#Ends a read that is past its deadline: shutting the socket down wakes the thread blocked
+#in recv right away, even if the server is still dripping bytes (the read timeout
+#only covers the gaps between them, so it never fires on a slow drip)
+def cut_off(resp, expired):
+    expired.set()
+    conn = getattr(resp.raw, "_connection", None) or getattr(resp.raw, "connection", None)
+    sock = getattr(conn, "sock", None)
+    if sock is None:
+        #a response that closes the connection when done has already let go of it -
+        #its socket is only left under the body file
+        try:
+            sock = resp.raw._fp.fp.raw._sock
+        except AttributeError:
+            return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+#Says why a response shouldnt be read at all (PDFs, images, downloads, huge pages)
+#from its headers alone, or None if it looks like a web page
+def skip_reason(headers, max_bytes=MAX_PAGE_BYTES, policy=OVERSIZE_POLICY):
+    content_type = headers.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type and content_type not in HTML_TYPES:
+        return f"Not a web page ({content_type})"
+
+    #Server told us up front it is too big
+    size = headers.get('Content-Length', '')
+    if policy == "reject" and size.isdigit() and int(size) > max_bytes:
+        return f"Page too large ({int(size)} bytes)"
+    return None
+
+#Bytes to text using the charset from the headers (utf-8 if there is none or it is unknown)
+def decode(content, encoding):
+    try:
+        return content.decode(encoding or 'utf-8', errors='replace')
+    except LookupError:
+        return content.decode('utf-8', errors='replace')
+
+#Streams a page with a byte budget and a wall-clock deadline for the whole read
+#Returns (response, html text, note)
+# - text is None when the page was skipped (not html, or too big with "reject")
+# - note says why it was skipped or truncated, otherwise None
+def fetch_page(url, max_bytes=MAX_PAGE_BYTES, deadline=PAGE_DEADLINE, policy=OVERSIZE_POLICY, **kwargs):
+    started = time.monotonic()
+    resp = get(url, stream=True, **kwargs)
+
+    #closes the connection under the read once the deadline passes
+    expired = threading.Event()
+    timer = threading.Timer(max(0, deadline - (time.monotonic() - started)), cut_off, (resp, expired))
+    timer.daemon = True
+    timer.start()
+    try:
+        if resp.status_code != 200:
+            return resp, None, None
+
+        #Check the headers before reading anything
+        skip = skip_reason(resp.headers, max_bytes, policy)
+        if skip:
+            return resp, None, skip
+
+        body = bytearray()
+        note = None
+        try:
+            for chunk in resp.iter_content(chunk_size=16 * 1024):
+                body.extend(chunk)
+
+                if len(body) > max_bytes:
+                    if policy == "reject":
+                        return resp, None, f"Page too large (over {max_bytes} bytes)"
+                    del body[max_bytes:]
+                    note = f"Truncated at {max_bytes} bytes"
+                    break
+
+                if expired.is_set() or time.monotonic() - started > deadline:
+                    raise DeadlineExceeded(f"Read took over {deadline}s")
+        except (requests.exceptions.RequestException, OSError) as e:
+            #the cut off shows up as a broken or short read
+            if expired.is_set() and not isinstance(e, DeadlineExceeded):
+                raise DeadlineExceeded(f"Read took over {deadline}s") from e
+            raise
+        #a body without a length just ends when the socket is shut
+        if expired.is_set():
+            raise DeadlineExceeded(f"Read took over {deadline}s")
+
+        resp._content = bytes(body)
+        return resp, decode(resp._content, resp.encoding), note
+    finally:
+        timer.cancel()
+        #hands the connection back to the pool (or drops it if we stopped early)
+        resp.close()
+
+#Connection pool numbers for this process (the session above - searches arent in them)
+def pool_stats():
+    pools = []
+    s = session
+    if s is not None and session_pid == os.getpid():
+        adapter = s.get_adapter('https://')
+        managers = [adapter.poolmanager] + list(adapter.proxy_manager.values())
+        for manager in managers:
+            for key in manager.pools.keys():
+                pool = manager.pools.get(key)
+                if pool is not None:
+                    pools.append(pool)
+
+    connections = sum(p.num_connections for p in pools)
+    pooled_requests = sum(p.num_requests for p in pools)
+    with stats_lock:
+        return {
+            "requests": stats["requests"],
+            "in_flight": sum(in_flight.values()),
+            "peak_in_flight": stats["peak_in_flight"],
+            "saturated": stats["saturated"],
+            "open_pools": len(pools),
+            #the pool queue is padded with None placeholders - only count real connections
+            "idle_connections": sum(1 for p in pools if p.pool is not None for c in list(p.pool.queue) if c is not None),
+            "connections_opened": connections,
+            #share of requests that reused an open connection
+            "reuse_rate": round(1 - connections / pooled_requests, 3) if pooled_requests else 0.0,
+            "pool_hosts": POOL_HOSTS,
+            "pool_per_host": POOL_PER_HOST
+        }
@@ -0,0 +1,15 @@
+import os
+
+
+#Read by gunicorn from the working directory: gunicorn app:app
+
+#app.py leaves warming up to post_worker_init below, so nothing is loaded on a
+#thread in the master (safe with --preload too)
+os.environ["WARM_IN_WORKER_HOOK"] = "1"
+
+
+#Runs in each worker once it has forked and loaded the app
+def post_worker_init(worker):
+    import app
+    if app.WARM_START:
+        app.warm_worker()
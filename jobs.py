@@ -0,0 +1,212 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import uuid
+import time
+import os
+import metrics
+import scraper
+
+
+#How many searches run at once in this worker, how many can wait in line,
+#and how long (seconds) finished jobs are kept around for clients to resume
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_QUEUE_DEPTH = int(os.environ.get("JOB_QUEUE_DEPTH", "20"))
+JOB_TTL = int(os.environ.get("JOB_TTL", str(15 * 60)))
+#How long (seconds) a live search keeps going after its last client drops, so the
+#client can resume it with X-Job-Id - after that it is cancelled (never more than JOB_TTL)
+ABANDON_GRACE = min(float(os.environ.get("ABANDON_GRACE", "120")), JOB_TTL)
+
+#Searches run here, off the request threads
+runner = ThreadPoolExecutor(max_workers=JOB_WORKERS)
+
+#Every job we know about by id, and the unfinished ones by search key (for coalescing)
+jobs = {}
+in_flight = {}
+jobs_lock = threading.Lock()
+
+#How many requests started a scrape and how many joined one already running
+stats = {"started": 0, "joined": 0, "rejected": 0}
+
+
+#Raised when too many searches are already waiting
+class QueueFull(Exception):
+    pass
+
+
+#Same search typed differently ("Troy, NY " / "troy, ny", domains in another order) -> same key
+def search_key(city, domains, intents, max_results=None, deadline=None):
+    return (
+        city.strip().lower(),
+        tuple(sorted({d.strip().lower() for d in domains})),
+        tuple(sorted({i.strip().lower() for i in intents})),
+        max_results or None,
+        deadline or None
+    )
+
+
+#One scrape, shared by every request that asks for the same search at the same time
+#Results are kept so late joiners and reconnecting clients can pick up from any point
+class SearchJob:
+    def __init__(self, key, city, domains, intents, max_results=None, deadline=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.city = city
+        self.domains = domains
+        self.intents = intents
+        self.max_results = max_results
+        self.deadline = deadline
+        self.results = []
+        self.status = "queued"
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        #streams reading right now - when a live-only search loses its last one it waits
+        #ABANDON_GRACE seconds for a resume, then stops
+        self.subscribers = 0
+        self.abandoned = False
+        self.abandoned_at = None
+        #set once the scrape was told to stop because of that
+        self.cancelled = False
+        #jobs created through /api/jobs keep going when clients disconnect
+        self.detached = False
+        #queries / pages done so far, for progress events
+        self.progress = metrics.Progress()
+        self.cond = threading.Condition()
+
+    #Nobody has read this live search for ABANDON_GRACE seconds
+    def given_up(self):
+        if self.detached or not self.abandoned or self.subscribers > 0:
+            return False
+        return time.monotonic() - self.abandoned_at > ABANDON_GRACE
+
+    #The scrape's stop function (asked every second and after every result):
+    #everyone left and nobody came back - stop spending proxy time on it
+    def should_stop(self):
+        with self.cond:
+            if not self.cancelled and self.given_up():
+                print(f"Nobody listening, stopping search for {self.city}")
+                self.cancelled = True
+            return self.cancelled
+
+    #Drives the scrape on a runner thread
+    def run(self):
+        self.status = "running"
+        companies = scraper.scrape(self.city, self.domains, self.intents, self.max_results, self.deadline,
+                                   self.progress, stop=self.should_stop)
+        try:
+            for company in companies:
+                with self.cond:
+                    self.results.append(company)
+                    self.cond.notify_all()
+                if self.should_stop():
+                    break
+            #a search cut off part way is not done - resuming clients have to see that
+            self.status = "cancelled" if self.cancelled else "done"
+        except Exception as e:
+            print(f"Search failed for {self.city}: {type(e).__name__}: {e}")
+            self.status = "failed"
+            self.error = type(e).__name__
+        finally:
+            companies.close()
+            with jobs_lock:
+                if in_flight.get(self.key) is self:
+                    del in_flight[self.key]
+            with self.cond:
+                self.finished_at = time.time()
+                self.cond.notify_all()
+
+    def finished(self):
+        return self.finished_at is not None
+
+    #Yields every result from cursor on (replaying what was already found) until the scrape ends
+    def stream(self, cursor=0):
+        for batch in self.batches(cursor):
+            yield from batch
+
+    #Same results as stream, a list at a time: whatever is waiting goes out at once,
+    #and after the first batch up to max_size are held back for at most max_wait seconds
+    #so a burst of companies goes out together
+    #With tick, an empty list is yielded every tick seconds nothing was found
+    def batches(self, cursor=0, max_size=1, max_wait=0, tick=None):
+        sent = cursor
+        first = True
+        with self.cond:
+            self.subscribers += 1
+            #someone came back (or joined) - keep going
+            self.abandoned = False
+        try:
+            while True:
+                with self.cond:
+                    found = self.cond.wait_for(lambda: sent < len(self.results) or self.finished(), timeout=tick)
+                    if found and not first and max_wait:
+                        until = time.monotonic() + max_wait
+                        while len(self.results) - sent < max_size and not self.finished():
+                            left = until - time.monotonic()
+                            if left <= 0: break
+                            self.cond.wait(left)
+                    batch = self.results[sent:]
+                    if not batch and self.finished():
+                        return
+                sent += len(batch)
+                if batch:
+                    first = False
+                yield batch
+        finally:
+            with self.cond:
+                self.subscribers -= 1
+                if self.subscribers == 0:
+                    self.abandoned = True
+                    self.abandoned_at = time.monotonic()
+
+    #Results after cursor, for clients that poll instead of streaming
+    #"done" only says the job stopped - status says how: done, failed, or cancelled
+    #(nobody listened for ABANDON_GRACE seconds, so the results are partial)
+    def poll(self, cursor=0):
+        with self.cond:
+            results = self.results[cursor:]
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "results": results,
+                "cursor": cursor + len(results),
+                "done": self.finished(),
+                "progress": self.progress.snapshot()[0]
+            }
+
+
+#Drops finished jobs nobody resumed within JOB_TTL
+def cleanup():
+    now = time.time()
+    with jobs_lock:
+        for job_id in [j.id for j in jobs.values() if j.finished() and now - j.finished_at > JOB_TTL]:
+            del jobs[job_id]
+
+
+#Returns the job for this search, joining an identical one if it is already running
+#detached jobs keep running after their clients disconnect
+#max_results / deadline stop the scrape early (see scraper.scrape)
+def submit(city, domains, intents, detached=False, max_results=None, deadline=None):
+    cleanup()
+    key = search_key(city, domains, intents, max_results, deadline)
+    with jobs_lock:
+        job = in_flight.get(key)
+        if job is not None:
+            print(f"Joining search already running for {city}")
+            stats["joined"] += 1
+        else:
+            queued = sum(1 for j in in_flight.values() if j.status == "queued")
+            if queued >= JOB_QUEUE_DEPTH:
+                stats["rejected"] += 1
+                raise QueueFull(f"{queued} searches already waiting")
+            job = SearchJob(key, city, domains, intents, max_results, deadline)
+            jobs[job.id] = job
+            in_flight[key] = job
+            stats["started"] += 1
+            runner.submit(job.run)
+        if detached:
+            job.detached = True
+    return job
+
+def get(job_id):
+    with jobs_lock:
+        return jobs.get(job_id)
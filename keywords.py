@@ -0,0 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import threading
+import json
+import sys
+import os
+import memory
+from cache import KeywordCache
+
+
+#Precomputed related terms (used first, so common domains need no network at all)
+SYNONYMS_FILE = os.environ.get(
+    "SYNONYMS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "synonyms.json")
+)
+
+#Set to 0 to only use the local table and the cache (no ConceptNet calls)
+CONCEPTNET_ONLINE = os.environ.get("CONCEPTNET_ONLINE", "1") != "0"
+CONCEPTNET_TIMEOUT = float(os.environ.get("CONCEPTNET_TIMEOUT", "2"))
+#How many ConceptNet lookups one request makes at the same time
+EXPAND_WORKERS = int(os.environ.get("EXPAND_WORKERS", "4"))
+
+#Most terms kept for each word (the word itself included)
+MAX_RELATED = 6
+
+#Most expansions kept in memory in front of the sqlite cache (least recently used go first)
+KEYWORD_MEMORY_SIZE = int(os.environ.get("KEYWORD_MEMORY_SIZE", "256"))
+
+KEYWORD_CACHE = KeywordCache()
+RECENT_TERMS = memory.LRU(KEYWORD_MEMORY_SIZE)
+
+#Loaded on first use, not at import
+synonyms = None
+synonyms_lock = threading.Lock()
+
+
+#The local table as {term: [related terms]} (empty if the file is missing or broken)
+def load_synonyms():
+    global synonyms
+    with synonyms_lock:
+        if synonyms is None:
+            try:
+                with open(SYNONYMS_FILE, encoding='utf-8') as f:
+                    table = json.load(f)
+                synonyms = {k.lower().strip(): v for k, v in table.items()}
+                print(f"Loaded {len(synonyms)} local synonym entries")
+            except (OSError, ValueError) as e:
+                print(f"Synonym table not loaded: {e}")
+                synonyms = {}
+        return synonyms
+
+def normalize_term(term):
+    return term.lower().strip()
+
+#The word first, then the related terms - no repeats, at most MAX_RELATED
+def limit_terms(term, related):
+    final = [term]
+    for label in related:
+        label = label.lower().strip()
+        if label and label not in final:
+            final.append(label)
+    return final[:MAX_RELATED]
+
+#This uses ConceptNet to get related terms to the given term (allows for more complex searches)
+#Returns None if ConceptNet could not be reached (so the miss is not cached)
+def ask_conceptnet(term):
+    print(f"Asking ConceptNet about '{term}'...")
+    related = []
+
+    try:
+        url = f"http://api.conceptnet.io/c/en/{term.replace(' ', '_')}?limit=20"
+        resp = requests.get(url, timeout=CONCEPTNET_TIMEOUT).json()
+    except Exception as e:
+        print(f"ConceptNet error: {e}")
+        return None
+
+    for edge in resp.get('edges', []):
+        try:
+            if edge['end']['language'] != 'en' or edge['start']['language'] != 'en': continue
+            if edge['weight'] < 1.0: continue
+
+            label = edge['end']['label']
+            if len(label.split()) <= 3: # Keep it short
+                related.append(label)
+        except: continue
+
+    return limit_terms(term, related)
+
+#Related terms for every term given, looked up together
+#local table -> recent terms in memory -> shared cache (one query) -> ConceptNet (all misses at once)
+#Returns {term: [related terms]} keyed by the normalized term
+def related_terms_many(terms):
+    terms = list(dict.fromkeys(normalize_term(t) for t in terms if t and t.strip()))
+    table = load_synonyms()
+
+    found = {t: limit_terms(t, table[t]) for t in terms if t in table}
+    for t in terms:
+        related = None if t in found else RECENT_TERMS.get(t)
+        if related is not None:
+            found[t] = related
+    missing = [t for t in terms if t not in found]
+    cached = KEYWORD_CACHE.get_many(missing)
+    for term, related in cached.items():
+        RECENT_TERMS.put(term, related)
+    found.update(cached)
+    missing = [t for t in missing if t not in found]
+
+    if missing and CONCEPTNET_ONLINE:
+        with ThreadPoolExecutor(max_workers=min(EXPAND_WORKERS, len(missing))) as pool:
+            for term, related in zip(missing, pool.map(ask_conceptnet, missing)):
+                if related is None: continue
+                KEYWORD_CACHE.put(term, related)
+                RECENT_TERMS.put(term, related)
+                found[term] = related
+
+    #anything we couldnt expand is still searched as is (and order follows the input)
+    return {term: found.get(term, [term]) for term in terms}
+
+def get_related_terms(term):
+    term = normalize_term(term)
+    return related_terms_many([term])[term]
+
+#All the terms to search for a list of domains (originals first, no repeats)
+def expand(terms):
+    related = related_terms_many(terms)
+    final = list(related)
+    for words in related.values():
+        for word in words:
+            if word not in final:
+                final.append(word)
+    return final
+
+
+#Rebuilds the local table from ConceptNet, keeping what is already in it
+#python keywords.py software marketing "graphic design"
+if __name__ == '__main__':
+    table = dict(load_synonyms())
+    for term in sys.argv[1:]:
+        term = normalize_term(term)
+        related = ask_conceptnet(term)
+        if related is None:
+            print(f"Skipped '{term}'")
+            continue
+        table[term] = related[1:]
+        print(f"{term}: {', '.join(related[1:])}")
+
+    with open(SYNONYMS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(table.items())), f, indent=2)
+        f.write("\n")
+    print(f"Wrote {len(table)} entries to {SYNONYMS_FILE}")
@@ -0,0 +1,29 @@
+import importlib
+import threading
+
+
+#A module that is only imported the first time one of its names is used
+#scraper = lazy.module("scraper") - then scraper.scrape(...) as usual
+#Keeps heavy imports (ddgs, bs4, requests, tldextract) off the path of a
+#cold worker answering its first health check
+class LazyModule:
+    def __init__(self, name):
+        self.name = name
+        self.loaded = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        if self.loaded is None:
+            with self.lock:
+                if self.loaded is None:
+                    self.loaded = importlib.import_module(self.name)
+        return self.loaded
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self.name}' ({'loaded' if self.loaded else 'not loaded'})>"
+
+def module(name):
+    return LazyModule(name)
@@ -0,0 +1,160 @@
+import threading
+import random
+import time
+import os
+
+
+#Page fetches per second to one host (start, floor, ceiling)
+HOST_RATE = float(os.environ.get("HOST_RATE", "0.5"))
+HOST_RATE_MIN = float(os.environ.get("HOST_RATE_MIN", "0.1"))
+HOST_RATE_MAX = float(os.environ.get("HOST_RATE_MAX", "1.0"))
+
+#Page fetches per second through the proxy as a whole (high enough that only
+#proxy errors make it matter - the fetch pool size is the usual limit)
+PROXY_RATE = float(os.environ.get("PROXY_RATE", "10"))
+PROXY_RATE_MIN = float(os.environ.get("PROXY_RATE_MIN", "1"))
+PROXY_RATE_MAX = float(os.environ.get("PROXY_RATE_MAX", "40"))
+
+#Searches per second to one DDGS backend, and how many can go at once after a quiet spell
+SEARCH_RATE = float(os.environ.get("SEARCH_RATE", "1"))
+SEARCH_RATE_MIN = float(os.environ.get("SEARCH_RATE_MIN", "0.05"))
+SEARCH_RATE_MAX = float(os.environ.get("SEARCH_RATE_MAX", "3"))
+SEARCH_BURST = int(os.environ.get("SEARCH_BURST", "3"))
+
+#Buckets untouched this long (seconds) are forgotten
+IDLE_TTL = 10 * 60
+
+
+#Refills `rate` tokens a second up to `burst` - every request takes one
+#Tokens can go negative: that is a queue of reservations the caller sleeps through
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        #nothing goes out before this (set after a throttling signal)
+        self.blocked_until = 0
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    #Takes a token and returns how long to wait before using it
+    def reserve(self, now):
+        self.refill(now)
+        self.tokens -= 1
+        delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        return max(delay, self.blocked_until - now)
+
+    #How long a reservation made now would wait (without making one)
+    def peek(self, now):
+        tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate) - 1
+        delay = -tokens / self.rate if tokens < 0 else 0
+        return max(delay, self.blocked_until - now)
+
+
+#One token bucket per key (a host, the proxy, a DDGS backend) whose rate adapts:
+#every healthy response adds a little, every throttling signal halves it and
+#pauses the key (additive increase, multiplicative decrease)
+class AdaptiveLimiter:
+    def __init__(self, name, rate, min_rate, max_rate, burst=1):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        #each success earns back a tenth of the starting rate
+        self.step = rate / 10
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.stats = {"ok": 0, "throttled": 0}
+
+    def bucket(self, key, now):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) > 1000:
+                self.prune(now)
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    #Drops buckets that are idle, full and back to normal speed
+    def prune(self, now):
+        for key in [k for k, b in self.buckets.items()
+                    if now - b.updated > IDLE_TTL and b.rate >= self.rate and b.blocked_until < now]:
+            del self.buckets[key]
+
+    #Reserves the next slot for this key and returns how long to wait for it
+    #(a little jitter so workers dont fire in lockstep)
+    def reserve(self, key):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.bucket(key, now).reserve(now)
+        return delay + random.uniform(0, 0.1 * delay) if delay > 0 else 0
+
+    def wait(self, key):
+        delay = self.reserve(key)
+        if delay > 0:
+            time.sleep(delay)
+
+    #How long a reservation for this key would wait right now (without making one)
+    def peek(self, key):
+        with self.lock:
+            now = time.monotonic()
+            bucket = self.buckets.get(key)
+            return bucket.peek(now) if bucket else 0
+
+    #The key (of the ones given) that could go soonest
+    def pick(self, keys):
+        with self.lock:
+            now = time.monotonic()
+            return min(keys, key=lambda k: self.bucket(k, now).peek(now))
+
+    #A healthy response - speed this key back up
+    def ok(self, key):
+        with self.lock:
+            bucket = self.bucket(key, time.monotonic())
+            bucket.rate = min(self.max_rate, bucket.rate + self.step)
+            self.stats["ok"] += 1
+
+    #429 / 503 / repeated 403s / proxy errors / empty searches - halve the rate and pause the key
+    #for Retry-After seconds if the server sent one, otherwise one slot at the new rate
+    def throttled(self, key, retry_after=None):
+        with self.lock:
+            now = time.monotonic()
+            bucket = self.bucket(key, now)
+            bucket.refill(now)
+            bucket.rate = max(self.min_rate, bucket.rate / 2)
+            pause = retry_after if retry_after is not None else 1 / bucket.rate
+            bucket.blocked_until = max(bucket.blocked_until, now + pause)
+            self.stats["throttled"] += 1
+        print(f"   Slowing down {self.name} '{key}' to {bucket.rate:.2f}/s for {pause:.1f}s")
+
+    #Forgets every key's rate and pause (benchmarks start each run from scratch)
+    def reset(self):
+        with self.lock:
+            self.buckets = {}
+            self.stats = {"ok": 0, "throttled": 0}
+
+    def snapshot(self):
+        with self.lock:
+            now = time.monotonic()
+            #the 20 slowest keys
+            slowed = sorted((b.rate, k) for k, b in self.buckets.items() if b.rate < self.rate)[:20]
+            slowed = {k: round(rate, 3) for rate, k in slowed}
+            paused = sum(1 for b in self.buckets.values() if b.blocked_until > now)
+            return {
+                "keys": len(self.buckets),
+                "rate": self.rate,
+                "slowed": slowed,
+                "paused": paused,
+                **self.stats
+            }
+
+
+#Retry-After in seconds (only the number form - dates are rare here)
+def retry_after_seconds(value):
+    try:
+        return min(max(float(value), 0), 300)
+    except (TypeError, ValueError):
+        return None
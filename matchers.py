@@ -0,0 +1,123 @@
+from urllib.parse import urlparse
+import re
+import threading
+import time
+import os
+
+
+#Where the blocklist lives and how often (seconds) we check it for changes
+BLOCKLIST_FILE = os.environ.get(
+    "BLOCKLIST_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "blocklist.txt")
+)
+BLOCKLIST_RELOAD = float(os.environ.get("BLOCKLIST_RELOAD", "30"))
+
+
+#Matches a fixed list of words against text, compiled once
+class KeywordMatcher:
+    def __init__(self, words):
+        self.words = list(words)
+        #longest word first so the regex prefers it at the same position
+        ordered = sorted(self.words, key=len, reverse=True)
+        self.pattern = re.compile("|".join(re.escape(w) for w in ordered))
+        self.longest = max(len(w) for w in self.words)
+
+    #True if any of the words is in the text
+    def any(self, text):
+        return self.pattern.search(text) is not None
+
+    #Which of the words are in the text (ignoring the ones in skip)
+    #(a handful of C substring scans beats a regex here, and overlapping
+    #words like "servicesolutions" still count as both)
+    def found(self, text, skip=()):
+        return {w for w in self.words if w not in skip and w in text}
+
+
+#Decides if a URL belongs to a blocked site, looking only at its hostname
+#so "bark" no longer blocks barkleyinc.com or a page with /bark/ in the path
+class HostBlocklist:
+    def __init__(self, path=BLOCKLIST_FILE, reload_every=BLOCKLIST_RELOAD):
+        self.path = path
+        self.reload_every = reload_every
+        self.lock = threading.Lock()
+        self.labels = set()
+        self.domains = set()
+        #one compiled alternation of the blocked names, for near()
+        self.stems = None
+        self.mtime = None
+        self.checked_at = 0
+        self.load()
+
+    #Reads the file into two sets: plain names and dotted domains
+    def load(self):
+        labels, domains = set(), set()
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    entry = line.split('#', 1)[0].strip().lower()
+                    if not entry: continue
+                    if "." in entry:
+                        domains.add(entry)
+                    else:
+                        labels.add(entry)
+        except OSError as e:
+            print(f"Blocklist error: {e}")
+            return
+
+        #the names alone (bbb.org -> bbb) for near()
+        stems = labels | {d.split('.')[0] for d in domains}
+        stems = KeywordMatcher(stems) if stems else None
+
+        with self.lock:
+            self.labels, self.domains, self.stems = labels, domains, stems
+            self.mtime = mtime
+        print(f"Loaded blocklist: {len(labels) + len(domains)} entries")
+
+    #Reloads the file if it changed (checked at most every reload_every seconds)
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self.checked_at < self.reload_every: return
+        self.checked_at = now
+        try:
+            changed = os.path.getmtime(self.path) != self.mtime
+        except OSError:
+            return
+        if changed:
+            self.load()
+
+    def blocks(self, url):
+        self.maybe_reload()
+        try:
+            host = (urlparse(url).hostname or "").lower()
+        except ValueError:
+            return True
+        labels = host.split('.')
+        labels_set, domains = self.labels, self.domains
+
+        if any(label in labels_set for label in labels):
+            return True
+        #bbb.org blocks bbb.org and www.bbb.org, checked one suffix at a time
+        for i in range(len(labels) - 1):
+            if '.'.join(labels[i:]) in domains:
+                return True
+        return False
+
+    #True if a blocked name is part of the hostname without blocking it
+    #(eg yelpreviews.net or top-indeed-jobs.com) - such sites are rarely companies
+    def near(self, url):
+        try:
+            host = (urlparse(url).hostname or "").lower()
+        except ValueError:
+            return False
+        stems = self.stems
+        return stems is not None and stems.any(host)
+
+    def __len__(self):
+        return len(self.labels) + len(self.domains)
+
+
+#Page heuristics, compiled once at import
+LISTICLE_WORDS = KeywordMatcher(["best", "top 10", "rankings", "directory"])
+SIGNALS = KeywordMatcher(["services", "clients", "about us", "contact", "products", "solutions"])
+CAREER_KEYWORDS = KeywordMatcher(["career", "job", "join", "opportunity", "work with us", "hiring"])
@@ -0,0 +1,134 @@
+from collections import OrderedDict
+import threading
+import resource
+import hashlib
+import math
+import sys
+import os
+
+
+#How a search remembers the companies it already handed out:
+#"hashed" - 8 byte fingerprints (exact), "bloom" - fixed size bit array (tiny, rare false hits)
+SEEN_FILTER = os.environ.get("SEEN_FILTER", "hashed")
+#Bloom filter sizing: how many keys it is built for and the false hit rate at that many
+BLOOM_CAPACITY = int(os.environ.get("BLOOM_CAPACITY", "100000"))
+BLOOM_ERROR_RATE = float(os.environ.get("BLOOM_ERROR_RATE", "0.001"))
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+#Dict capped at max_entries - the least recently used key goes first
+class LRU:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.data:
+                return default
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+
+#64 bit fingerprint of a string - a set of these is a fraction of the size of a set of urls
+def fingerprint(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+#Set of strings kept as fingerprints (a collision needs billions of keys)
+class HashedSet:
+    def __init__(self):
+        self.keys = set()
+
+    def add(self, key):
+        self.keys.add(fingerprint(key))
+
+    def __contains__(self, key):
+        return fingerprint(key) in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+#Fixed size set of strings that can say yes to a key it never saw (at error_rate
+#once it holds capacity keys) but never no to one it did
+class BloomFilter:
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    #bit positions for a key (two hashes combined, Kirsch-Mitzenmacher)
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], 'big')
+        b = int.from_bytes(digest[8:], 'big') | 1
+        return [(a + i * b) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for bit in self.positions(key):
+            self.bits[bit >> 3] |= 1 << (bit & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[bit >> 3] & (1 << (bit & 7)) for bit in self.positions(key))
+
+    def __len__(self):
+        return self.count
+
+def seen_set():
+    return BloomFilter() if SEEN_FILTER == "bloom" else HashedSet()
+
+
+#Resident memory of this process in bytes right now (None where /proc is missing)
+def rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+#Most resident memory this process ever had, in bytes
+def peak_rss():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on linux, bytes on macOS
+    return usage if sys.platform == "darwin" else usage * 1024
+
+#High-water mark of the process RSS while one search runs
+#(the process is shared, so concurrent searches show up in each other's numbers)
+class Watermark:
+    def __init__(self):
+        self.start = rss()
+        self.peak = self.start
+
+    def sample(self):
+        current = rss()
+        if current is not None and (self.peak is None or current > self.peak):
+            self.peak = current
+        return current
+
+    def report(self):
+        end = self.sample()
+        if self.start is None:
+            return {}
+        return {
+            "rss_start_mb": round(self.start / 1024 / 1024, 1),
+            "rss_peak_mb": round(self.peak / 1024 / 1024, 1),
+            "rss_end_mb": round(end / 1024 / 1024, 1),
+            "rss_growth_mb": round((self.peak - self.start) / 1024 / 1024, 1)
+        }
@@ -0,0 +1,314 @@
+from contextlib import contextmanager
+import contextvars
+import threading
+import bisect
+import json
+import time
+import uuid
+import sys
+import os
+import re
+import memory
+
+
+#Write one JSON trace per search into this folder (unset = no trace files)
+TRACE_DIR = os.environ.get("TRACE_DIR")
+
+#Upper bounds (seconds) of the timing histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+#Upper bounds (bytes) of the memory growth buckets
+MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+
+#Counts per label set, eg {("TIMEOUT", "ReadTimeout"): 3}
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{label_text(self.labels, key)} {value}")
+        return lines
+
+
+#Bucketed durations per label set (Prometheus histogram)
+class Histogram:
+    def __init__(self, name, help, labels, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        #label values -> [count per bucket (last one is +Inf), sum]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                #buckets are cumulative in the text format
+                running = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    running += count
+                    le = label_text(self.labels + ("le",), key + (str(bound),))
+                    lines.append(f"{self.name}_bucket{le} {running}")
+                lines.append(f"{self.name}_sum{label_text(self.labels, key)} {round(total, 6)}")
+                lines.append(f"{self.name}_count{label_text(self.labels, key)} {running}")
+        return lines
+
+
+def label_text(names, values):
+    if not names: return ""
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+#Everything /metrics exports (numbers are per worker process)
+STAGE_SECONDS = Histogram(
+    "scraper_stage_seconds",
+    "Time spent in each pipeline stage (search, throttle, fetch, parse, validate, careers, discover)",
+    ("stage",)
+)
+VERDICTS = Counter(
+    "scraper_verdicts_total",
+    "Company checks by outcome and reason",
+    ("result", "reason", "source")
+)
+FETCH_ERRORS = Counter(
+    "scraper_fetch_errors_total",
+    "Page fetches that failed, by reason and exception type",
+    ("reason", "error")
+)
+SEARCH_ERRORS = Counter(
+    "scraper_search_errors_total",
+    "DDGS searches that raised, by exception type",
+    ("error",)
+)
+SEARCHES = Counter(
+    "scraper_searches_total",
+    "Searches run, by where the results came from",
+    ("source",)
+)
+THROTTLED = Counter(
+    "scraper_throttle_signals_total",
+    "Responses that made the rate limiter slow down, by scope and signal",
+    ("scope", "signal")
+)
+CAREERS = Counter(
+    "scraper_careers_discovery_total",
+    "Careers page lookups for homepages without a careers link, by where it was found",
+    ("source", "cached")
+)
+SEARCH_RSS_GROWTH = Histogram(
+    "scraper_search_rss_growth_bytes",
+    "How far worker RSS rose above its level at the start of a search (high-water mark)",
+    (),
+    MEMORY_BUCKETS
+)
+METRICS = [STAGE_SECONDS, VERDICTS, FETCH_ERRORS, SEARCH_ERRORS, SEARCHES, THROTTLED, CAREERS, SEARCH_RSS_GROWTH]
+
+
+#The trace of the search running on this thread / task (None outside a search)
+CURRENT = contextvars.ContextVar("trace", default=None)
+
+
+#Timings of one search, written to TRACE_DIR as JSON when it ends
+class Trace:
+    def __init__(self, **info):
+        self.id = uuid.uuid4().hex[:12]
+        self.info = info
+        self.enabled = bool(TRACE_DIR)
+        self.started = time.monotonic()
+        self.started_at = time.time()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    #thread_cpu is None when the stage ran on the event loop (see timer)
+    def add(self, stage, seconds, thread_cpu, detail):
+        if not self.enabled: return
+        span = {
+            "stage": stage,
+            "at": round(time.monotonic() - self.started - seconds, 4),
+            "seconds": round(seconds, 4)
+        }
+        if thread_cpu is not None:
+            #cpu time of the thread that ran the stage - not work it handed to other threads
+            span["thread_cpu"] = round(thread_cpu, 4)
+        span.update(detail)
+        with self.lock:
+            self.spans.append(span)
+
+    #Runs fn with this trace as the current one (for thread pool workers)
+    def run(self, fn, *args):
+        token = CURRENT.set(self)
+        try:
+            return fn(*args)
+        finally:
+            CURRENT.reset(token)
+
+    #Same for a coroutine run as its own task (async_scraper.run_in carries it into its threads)
+    async def arun(self, coro):
+        CURRENT.set(self)
+        return await coro
+
+    def write(self, **summary):
+        if not self.enabled: return
+        data = {
+            "id": self.id,
+            "started_at": self.started_at,
+            "total_seconds": round(time.monotonic() - self.started, 4),
+            **self.info,
+            **summary,
+            "spans": self.spans
+        }
+        try:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+            path = os.path.join(TRACE_DIR, f"{stamp}-{self.id}.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=1)
+            print(f"Trace written to {path}")
+        except OSError as e:
+            print(f"Trace error: {e}")
+
+
+#Live counts of one search for the clients watching it (progress events, see streaming.py)
+#version goes up on every change so a stream only sends a new event when something happened
+class Progress:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.queries = 0
+        self.queries_done = 0
+        self.pages = 0
+        self.accepted = 0
+        self.rejected = {}
+        self.version = 0
+
+    def planned(self, queries):
+        with self.lock:
+            self.queries += queries
+            self.version += 1
+
+    def searched(self):
+        with self.lock:
+            self.queries_done += 1
+            self.version += 1
+
+    #One company checked (is_valid None means the fetch failed)
+    def checked(self, is_valid, reason):
+        with self.lock:
+            self.pages += 1
+            if is_valid:
+                self.accepted += 1
+            else:
+                label = reason_label(reason)
+                self.rejected[label] = self.rejected.get(label, 0) + 1
+            self.version += 1
+
+    #Returns (counts, version)
+    def snapshot(self):
+        with self.lock:
+            return {
+                "queries_done": self.queries_done,
+                "queries_total": self.queries,
+                "pages_fetched": self.pages,
+                "accepted": self.accepted,
+                "rejected": dict(self.rejected),
+                "elapsed": round(time.monotonic() - self.started, 2)
+            }, self.version
+
+
+#True when called from a coroutine (asyncio is only looked at if something loaded it)
+def on_event_loop():
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is None:
+        return False
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+#Times the block into scraper_stage_seconds and the current trace
+#with metrics.timer("fetch", url=url): ...
+#Spans on the event loop get no cpu time - every coroutine shares that thread, so
+#its cpu clock says nothing about one stage
+@contextmanager
+def timer(stage, **detail):
+    started = time.perf_counter()
+    cpu_started = None if on_event_loop() else time.thread_time()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = CURRENT.get()
+        if trace is not None:
+            thread_cpu = time.thread_time() - cpu_started if cpu_started is not None else None
+            trace.add(stage, elapsed, thread_cpu, detail)
+
+
+#"Page too large (123 bytes) (cached)" -> "Page too large" so reasons dont explode into labels
+def reason_label(reason):
+    reason = re.sub(r"\s*\(.*$", "", reason or "")
+    if reason.startswith("ERROR:"):
+        return "ERROR"
+    if reason.startswith("HTTP "):
+        return reason
+    return reason or "none"
+
+#Counts one company check
+def record_verdict(is_valid, reason, cached=False):
+    result = "accepted" if is_valid else ("failed" if is_valid is None else "rejected")
+    VERDICTS.inc(result=result, reason=reason_label(reason), source="cached" if cached else "fetched")
+
+#Memory high-water mark of one search (a memory.Watermark) - logged, exported and
+#returned for the trace
+def record_memory(watermark):
+    report = watermark.report()
+    if report:
+        SEARCH_RSS_GROWTH.observe(watermark.peak - watermark.start)
+        print(f"Memory: {report['rss_start_mb']} MB -> peak {report['rss_peak_mb']} MB (+{report['rss_growth_mb']} MB)")
+    return report
+
+#Counts one failed fetch and returns the usual (None, reason, None) verdict
+def fetch_error(reason, error):
+    FETCH_ERRORS.inc(reason=reason_label(reason), error=type(error).__name__)
+    return None, reason, None
+
+
+#Prometheus text format
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+
+    #worker memory right now and the most it ever used (gunicorn max_requests recycles on this)
+    current = memory.rss()
+    if current is not None:
+        lines += ["# HELP scraper_process_rss_bytes Resident memory of this worker",
+                  "# TYPE scraper_process_rss_bytes gauge", f"scraper_process_rss_bytes {current}"]
+    lines += ["# HELP scraper_process_peak_rss_bytes Most resident memory this worker has used",
+              "# TYPE scraper_process_peak_rss_bytes gauge", f"scraper_process_peak_rss_bytes {memory.peak_rss()}"]
+    return "\n".join(lines) + "\n"
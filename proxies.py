@@ -0,0 +1,172 @@
+import threading
+import random
+import time
+import os
+
+
+#Proxies to spread traffic over: PROXY_URLS (comma or newline separated), or one per
+#line in PROXY_FILE, or the single PROXY_URL as before
+PROXY_URLS = os.environ.get("PROXY_URLS", "")
+PROXY_FILE = os.environ.get("PROXY_FILE")
+
+#What may skip the proxies when none is healthy (or none is set):
+#"pages" - company pages only (default), "all" - searches too, "none" - nothing
+DIRECT_TARGETS = os.environ.get("DIRECT_TARGETS", "pages")
+
+#Failures in a row before a proxy is benched, and for how long (doubles each time, up to the max)
+QUARANTINE_AFTER = int(os.environ.get("QUARANTINE_AFTER", "3"))
+QUARANTINE_SECONDS = float(os.environ.get("QUARANTINE_SECONDS", "60"))
+QUARANTINE_MAX = float(os.environ.get("QUARANTINE_MAX", str(15 * 60)))
+
+#How much each new request moves the latency / error averages
+EWMA_WEIGHT = 0.2
+
+
+#Reads the configured proxy list (in order, no repeats)
+def configured_proxies():
+    entries = PROXY_URLS.replace("\n", ",").split(",")
+    if PROXY_FILE:
+        try:
+            with open(PROXY_FILE, encoding='utf-8') as f:
+                entries += [line.split('#', 1)[0] for line in f]
+        except OSError as e:
+            print(f"Proxy file error: {e}")
+    if os.environ.get("PROXY_URL"):
+        entries.append(os.environ["PROXY_URL"])
+    return list(dict.fromkeys(e.strip() for e in entries if e.strip()))
+
+
+#Health of one proxy
+class ProxyState:
+    def __init__(self, url):
+        self.url = url
+        #moving averages of seconds per request and share of failed requests
+        self.latency = 1.0
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.strikes = 0
+        self.quarantines = 0
+        self.quarantined_until = 0
+        self.in_flight = 0
+
+    #Lower is better - slow, failing and busy proxies all score worse
+    def score(self):
+        return self.latency * (1 + 4 * self.error_rate) * (1 + 0.25 * self.in_flight)
+
+
+#Picks a proxy for every request and keeps score of how each one is doing
+class ProxyPool:
+    def __init__(self, urls=None, direct=DIRECT_TARGETS):
+        if urls is None:
+            urls = configured_proxies()
+        self.proxies = {url: ProxyState(url) for url in urls}
+        self.direct = direct
+        self.direct_requests = 0
+        self.lock = threading.Lock()
+
+    def direct_allowed(self, kind):
+        return self.direct == "all" or (self.direct == "pages" and kind == "page")
+
+    #True if searches can run at all (a proxy, or direct searches allowed)
+    def can_search(self):
+        return bool(self.proxies) or self.direct_allowed("search")
+
+    #The proxy for the next request, or None to go direct
+    #kind is "page" or "search" (only pages may go direct by default)
+    #Of two random healthy proxies the better scoring one wins, so load spreads
+    #out but slow or failing proxies get less of it
+    #exclude is a proxy that just failed this request (skipped if there is another)
+    def choose(self, kind="page", exclude=None):
+        with self.lock:
+            now = time.monotonic()
+            healthy = [p for p in self.proxies.values() if p.quarantined_until <= now]
+            others = [p for p in healthy if p.url != exclude]
+            if others:
+                healthy = others
+            if not healthy:
+                if self.direct_allowed(kind) or not self.proxies:
+                    self.direct_requests += 1
+                    return None
+                #nothing healthy and no direct route - use whichever comes back first
+                healthy = [min(self.proxies.values(), key=lambda p: p.quarantined_until)]
+
+            picks = random.sample(healthy, min(2, len(healthy)))
+            proxy = min(picks, key=lambda p: p.score())
+            proxy.in_flight += 1
+            return proxy.url
+
+    #Counts one more request through a proxy picked earlier (eg follow-up requests to
+    #a site it just fetched) - report how it went with success / failure / release
+    def acquire(self, url):
+        with self.lock:
+            proxy = self.proxies.get(url)
+            if proxy is not None:
+                proxy.in_flight += 1
+
+    #The request through this proxy worked (whatever the target answered)
+    def success(self, url, seconds):
+        with self.lock:
+            proxy = self.proxies.get(url)
+            if proxy is None: return
+            proxy.in_flight = max(0, proxy.in_flight - 1)
+            proxy.requests += 1
+            proxy.latency += EWMA_WEIGHT * (seconds - proxy.latency)
+            proxy.error_rate -= EWMA_WEIGHT * proxy.error_rate
+            proxy.strikes = 0
+
+    #The request failed - hard failures (proxy refused / unreachable) count toward
+    #quarantine, soft ones (timeouts, empty searches) only toward the error rate
+    def failure(self, url, hard=True):
+        with self.lock:
+            proxy = self.proxies.get(url)
+            if proxy is None: return
+            proxy.in_flight = max(0, proxy.in_flight - 1)
+            proxy.requests += 1
+            proxy.failures += 1
+            proxy.error_rate += EWMA_WEIGHT * (1 - proxy.error_rate)
+            if not hard: return
+
+            proxy.strikes += 1
+            if proxy.strikes >= QUARANTINE_AFTER:
+                pause = min(QUARANTINE_MAX, QUARANTINE_SECONDS * 2 ** proxy.quarantines)
+                proxy.quarantined_until = time.monotonic() + pause
+                proxy.quarantines += 1
+                proxy.strikes = 0
+                print(f"Proxy {redact(url)} quarantined for {pause:.0f}s")
+
+    #The request was abandoned before we learned anything
+    def release(self, url):
+        with self.lock:
+            proxy = self.proxies.get(url)
+            if proxy is not None:
+                proxy.in_flight = max(0, proxy.in_flight - 1)
+
+    def stats(self):
+        with self.lock:
+            now = time.monotonic()
+            return {
+                "proxies": [{
+                    "proxy": redact(p.url),
+                    "latency": round(p.latency, 3),
+                    "error_rate": round(p.error_rate, 3),
+                    "requests": p.requests,
+                    "failures": p.failures,
+                    "in_flight": p.in_flight,
+                    "quarantined_for": max(0, round(p.quarantined_until - now, 1))
+                } for p in self.proxies.values()],
+                "direct_requests": self.direct_requests,
+                "direct_targets": self.direct
+            }
+
+
+#Proxy url without the password, for logs and /api/pool
+def redact(url):
+    if url and "@" in url:
+        scheme, _, rest = url.rpartition("://")
+        return f"{scheme}://***@{rest.split('@', 1)[1]}" if scheme else "***@" + url.split('@', 1)[1]
+    return url or "direct"
+
+#requests-style proxies dict for a proxy url (None = direct)
+def as_requests(url):
+    return {'http': url, 'https': url} if url else None
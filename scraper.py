@@ -1,48 +1,169 @@
 from ddgs import DDGS
+from ddgs.exceptions import RatelimitException, TimeoutException
 from urllib.parse import urlparse, urljoin
-from bs4 import BeautifulSoup
 import requests
-import json
 import re
 import time
-import random
-import csv
 import os
+import threading
+import heapq
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import careers as careers_finder
+import fetcher
+import limiter
+import memory
+import proxies
+import metrics
+import urls
+from analyzer import analyze_page
+from matchers import HostBlocklist, LISTICLE_WORDS, SIGNALS, CAREER_KEYWORDS
+from cache import SearchCache, CompanyIndex, PageCache, LeadStore, body_hash
 
 
 #These are domains that clutter results but arent actual companies.
-BLOCKLIST = [
-    #Aggregators & Directories
-    "yelp", "mapquest", "chamberofcommerce", "yellowpages", 
-    "zippia", "glassdoor", "linkedin", "indeed", "facebook", 
-    "instagram", "twitter", "opengovny", "timesunion", 
-    "zoominfo", "dnb", "manta", "bbb.org", "bizjournals", 
-    "alignable", "redshiftrecruiting", "renscochamber",
-    "simplyhired", "monster", "careerbuilder", "jobs2careers", 
-    "talroo", "upwork", "fiverr", "thumbtack", "bark",
-    #Student/Academic Sites (The "WayUp" Fix)
-    "wayup", "handshake", "chegg", "coursehero", "varsitytutors",
-    "superprof", "wyzant", "udemy", "coursera", "ratemyprofessors"
-]
+#The list itself lives in blocklist.txt and is reloaded when it changes
+BLOCKLIST = HostBlocklist()
+
+#How many pages are fetched at the same time
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", "8"))
+
+#How many search queries are sent at the same time
+SEARCH_WORKERS = int(os.environ.get("SEARCH_WORKERS", "3"))
+#How many times a failed search is retried (the limiter decides how long to wait)
+SEARCH_RETRIES = int(os.environ.get("SEARCH_RETRIES", "2"))
+#DDGS backends to spread searches over, eg "duckduckgo,bing,brave" ("auto" lets DDGS pick)
+SEARCH_BACKENDS = [b.strip() for b in os.environ.get("SEARCH_BACKENDS", "auto").split(",") if b.strip()]
+
+#Default early stop for API searches: how many companies, and how many seconds
+#(0 = no limit; a request can send its own max_results / deadline)
+MAX_RESULTS = int(os.environ.get("MAX_RESULTS", "0"))
+SEARCH_DEADLINE = float(os.environ.get("SEARCH_DEADLINE", "0"))
+#How often (seconds) a scrape asks its stop function whether to keep going
+STOP_CHECK_SECONDS = 1
+
+#Search results saved on disk so repeat searches skip DDGS and the proxy
+SEARCH_CACHE = SearchCache()
+#Verdicts for every company site we have checked before, keyed by domain
+COMPANY_INDEX = CompanyIndex()
+#ETag / Last-Modified and body hash of every page we parsed
+PAGE_CACHE = PageCache()
+#Every accepted company by city and keyword, for GET /api/leads (set SAVE_LEADS=0 to stop saving)
+LEADS = LeadStore()
+SAVE_LEADS = os.environ.get("SAVE_LEADS", "1") == "1"
+
+#Stale verdicts are re-checked here while the old one is served right away
+REFRESH_WORKERS = int(os.environ.get("REFRESH_WORKERS", "2"))
+refresh_pool = ThreadPoolExecutor(max_workers=REFRESH_WORKERS)
+refreshing = set()
+refreshing_lock = threading.Lock()
+
+#Spaces out requests to avoid IP bans - shared by every search in this worker
+#Each host, each proxy and each DDGS backend has its own budget
+#They slow down on 429 / 503 / repeated 403s / proxy errors and speed back up while things go well
+HOST_LIMITER = limiter.AdaptiveLimiter("host", limiter.HOST_RATE, limiter.HOST_RATE_MIN, limiter.HOST_RATE_MAX)
+PROXY_LIMITER = limiter.AdaptiveLimiter(
+    "proxy", limiter.PROXY_RATE, limiter.PROXY_RATE_MIN, limiter.PROXY_RATE_MAX, burst=max(1, int(limiter.PROXY_RATE))
+)
+SEARCH_LIMITER = limiter.AdaptiveLimiter(
+    "search backend", limiter.SEARCH_RATE, limiter.SEARCH_RATE_MIN, limiter.SEARCH_RATE_MAX, burst=limiter.SEARCH_BURST
+)
+
+#Every proxy we can use (from PROXY_URLS / PROXY_FILE / PROXY_URL) and how healthy each one is
+PROXY_POOL = proxies.ProxyPool()
+
+#Status codes that mean "slow down"
+THROTTLE_STATUS = {429, 503}
+#A 403 is usually just a page we may not see - a host only counts as blocking us
+#once it answers FORBIDDEN_REPEAT of them within FORBIDDEN_WINDOW seconds
+FORBIDDEN_REPEAT = 2
+FORBIDDEN_WINDOW = 60
+#host -> (403s so far, when the first came)
+forbidden = memory.LRU(1000)
+
+#Longest (seconds) a page fetch waits for a paused host - a host paused for longer
+#(a long Retry-After) is skipped by this search instead of holding a worker that long
+MAX_HOST_WAIT = float(os.environ.get("MAX_HOST_WAIT", "10"))
+
+#Search errors that mean the proxy couldnt get through (ddgs wraps the http client's
+#errors in DDGSException, so the name may only be in the message)
+NETWORK_ERROR = re.compile(r"connect|proxy|tunnel|timed? ?out|dns|reset by peer|refused|unreachable", re.IGNORECASE)
+#(403s from a search engine are bot blocks - same as a rate limit)
+RATE_LIMITED = re.compile(r"rate ?limit|\b(429|403)\b|too many requests|forbidden", re.IGNORECASE)
+
+#Splits a Source Keyword back into the domain keyword and the intent (see source_label)
+SOURCE_LABEL = re.compile(r"^(.*) \(([^()]*)\)$")
+
+#Raised (and counted) for a page skipped because its host is paused
+class HostPaused(Exception):
+    pass
+
+#True if this url's host is paused for longer than MAX_HOST_WAIT
+def host_paused(url):
+    return HOST_LIMITER.peek(urlparse(url).netloc.lower()) > MAX_HOST_WAIT
+
+#True once this 403 makes FORBIDDEN_REPEAT from the host within FORBIDDEN_WINDOW
+def repeated_forbidden(host):
+    now = time.monotonic()
+    count, since = forbidden.get(host, (0, now))
+    if now - since > FORBIDDEN_WINDOW:
+        count, since = 0, now
+    forbidden.put(host, (count + 1, since))
+    return count + 1 >= FORBIDDEN_REPEAT
+
+#How long to wait before fetching this url (its host and the proxy both have to allow it)
+def fetch_delay(url, proxy=None):
+    host = urlparse(url).netloc.lower()
+    return max(HOST_LIMITER.reserve(host), PROXY_LIMITER.reserve(proxies.redact(proxy)))
+
+#Tells the limiters how a fetch went - status / headers of the response, or the error it raised
+def fetch_feedback(url, proxy=None, status=None, headers=None, error=None):
+    host = urlparse(url).netloc.lower()
+    if error is not None:
+        #the proxy itself is struggling - slow every fetch through it down, not just this host
+        if error == "PROXY_ERROR":
+            metrics.THROTTLED.inc(scope="proxy", signal="ProxyError")
+            PROXY_LIMITER.throttled(proxies.redact(proxy))
+        return
+    if status == 403 and not repeated_forbidden(host):
+        return
+    if status in THROTTLE_STATUS or status == 403:
+        metrics.THROTTLED.inc(scope="host", signal=str(status))
+        HOST_LIMITER.throttled(host, limiter.retry_after_seconds((headers or {}).get('Retry-After')))
+        return
+    HOST_LIMITER.ok(host)
+    PROXY_LIMITER.ok(proxies.redact(proxy))
+
+#One DDGS client per proxy, made the first time a search goes through it
+#Kept for the life of the worker (new ones after gunicorn forks, like fetcher's session)
+class SearchClients:
+    def __init__(self):
+        self.clients = {}
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+
+    def get(self, proxy):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.clients = {}
+                self.pid = os.getpid()
+            if proxy not in self.clients:
+                self.clients[proxy] = DDGS(proxy=proxy)
+            return self.clients[proxy]
+
+SEARCH_CLIENTS = SearchClients()
 
 #Extracts the domain from a URL
 def get_domain_from_url(url):
     #Input: https://www.website.com/careers
     #Output: website
-    try:
-        parsed = urlparse(url)
+    #(also https://jobs.website.co.uk -> website, the old first-label split gave "jobs")
+    return urls.domain_name(url)
 
-        #get domain
-        domain = parsed.netloc
-        #remove www. if present
-        if domain.startswith("www."):
-            domain = domain[4:]
-        #remove extension
-        if "." in domain:
-            domain = domain.split('.')[0]
-        return domain.lower()
-    except:
-        return ""
+#Normalizes a URL to the site it belongs to (used as the company index key)
+def normalize_domain(url):
+    #Input: https://Careers.Website.co.uk:443/jobs
+    #Output: website.co.uk
+    return urls.registrable_domain(url)
 
 #Breaks title into a list of significant words
 def clean_title_words(title):
@@ -56,18 +177,100 @@ def clean_title_words(title):
     stop_words = {'home', 'welcome', 'inc', 'llc', 'company', 'corporation', 'about', 'contact', 'profile'}
     return [w for w in words if w not in stop_words and len(w) > 2]
 
+#Guesses how likely a search result is a company site, before fetching it
+#Higher is better - only used to decide what gets fetched first
+def score_candidate(url, title):
+    score = 0
+
+    #a title word in the domain (Gavant Software -> gavant.com) - the old scraper's filter
+    domain = get_domain_from_url(url)
+    if domain and any(word in domain for word in clean_title_words(title)):
+        score += 3
+
+    #homepages and /about beat deep pages (blog posts, articles, search pages)
+    try:
+        parsed = urlparse(url)
+        depth = len([part for part in parsed.path.split('/') if part])
+        if parsed.query:
+            depth += 1
+    except ValueError:
+        return -10
+    score += 2 - depth
+
+    #looks like a blocked site, or a "best 10 agencies" list
+    if BLOCKLIST.near(url):
+        score -= 3
+    if LISTICLE_WORDS.any(title.lower()):
+        score -= 3
+    return score
+
+#Search results waiting to be fetched, best score first, one per company
+#A company seen again (another page, scheme, subdomain or country domain) is
+#dropped, unless it is still waiting and the new url scores higher
+#Companies already handed out are only kept as fingerprints (see memory.py)
+class CandidateQueue:
+    def __init__(self):
+        self.heap = []
+        #registrable domain -> heap entry still waiting
+        self.waiting = {}
+        #registrable domains already handed out
+        self.taken = memory.seen_set()
+        #fingerprint of (domain name, normalized title) -> fingerprint of its registrable domain
+        self.names = {}
+        self.order = 0
+        self.duplicates = 0
+
+    #Returns True if the url was queued (as it was found - it is fetched as is)
+    def push(self, url, title, source):
+        domain, name = urls.company_keys(url, title)
+        domain_key = memory.fingerprint(domain)
+        name = memory.fingerprint("\t".join(name)) if name else None
+
+        if domain in self.taken or (name and self.names.get(name, domain_key) != domain_key):
+            self.duplicates += 1
+            return False
+
+        score = score_candidate(url, title)
+        current = self.waiting.get(domain)
+        if current is not None:
+            self.duplicates += 1
+            if -current[0] >= score:
+                return False
+            #leave the old entry in the heap but mark it dead
+            current[5] = None
+
+        self.order += 1
+        entry = [-score, self.order, url, title, source, domain]
+        heapq.heappush(self.heap, entry)
+        self.waiting[domain] = entry
+        if name:
+            self.names[name] = domain_key
+        return True
+
+    #Best waiting (url, title, source), or None if there is nothing left
+    def pop(self):
+        while self.heap:
+            _, _, url, title, source, domain = heapq.heappop(self.heap)
+            if domain is None: continue
+            del self.waiting[domain]
+            self.taken.add(domain)
+            return url, title, source
+        return None
+
+    def __len__(self):
+        return len(self.waiting)
+
 #Validates a url to be a company page or not (removes listicles)
 def validate_page_content(url, soup):
     try:
         #block "Top 10" Listicles
         title = soup.title.string.lower() if soup.title else ""
-        if any(x in title for x in ["best", "top 10", "rankings", "directory"]):
+        if LISTICLE_WORDS.any(title):
             return False, "Likely a listicle"
 
         #content Check (Must have business words)
         text = soup.get_text().lower()
-        signals = ["services", "clients", "about us", "contact", "products", "solutions"]
-        if sum(1 for s in signals if s in text) < 2:
+        if len(SIGNALS.found(text)) < 2:
             return False, "Not enough business content"
 
         #link Density Check (Aggregators have too many external links)
@@ -81,172 +284,457 @@ def validate_page_content(url, soup):
 #finds the career/jon posting page of the website
 def find_careers_link(url, soup):
     try:
-        #keywords
-        keywords = ["career", "job", "join", "opportunity", "work with us", "hiring"]
-
         #check all links on the page
         for link in soup.find_all('a', href = True):
             text = link.get_text().lower()
             href = link['href']
 
-            #if any link contains a keyword - get that link
-            if any(keyword in text for keyword in keywords):
+            #if any link contains a keyword (CAREER_KEYWORDS) - get that link
+            if CAREER_KEYWORDS.any(text):
                 return urljoin(url, href)
             
         return None
     except:
         return None
 
+#Turns a fetched page into (is_valid, reason, careers link), reusing the
+#last verdict for this url when the server says (or the bytes show) nothing changed
+#final_url is where redirects ended up - links on the page are relative to it
+def judge_page(url, previous, status, headers, content, html, note, final_url=None):
+    #Not modified - the last verdict still holds
+    if status == 304 and previous:
+        PAGE_CACHE.not_modified += 1
+        return previous["valid"], previous["reason"], previous["careers"]
+
+    if status != 200:
+        return None, f"HTTP {status}", None
+
+    #PDFs, images and oversized pages are never company homepages
+    if html is None:
+        return False, note, None
+    if note:
+        print(f"   {note}: {url}")
+
+    #Same bytes as last time - skip parsing
+    page_hash = body_hash(content)
+    if previous and previous["body_hash"] == page_hash:
+        PAGE_CACHE.unchanged += 1
+        is_valid, reason, careers = previous["valid"], previous["reason"], previous["careers"]
+    else:
+        PAGE_CACHE.changed += 1
+
+        #Validate Content and find the careers link in one pass
+        #(same answers as validate_page_content + find_careers_link on a soup)
+        is_valid, reason, careers = analyze_page(final_url or url, html)
+        if is_valid:
+            reason = "ACCEPTED"
+            #no careers link to click - maybe a job board link in a script
+            careers = careers or careers_finder.page_link(html)
+
+    PAGE_CACHE.put(
+        url, headers.get('ETag'), headers.get('Last-Modified'),
+        page_hash, is_valid, reason, careers
+    )
+    return is_valid, reason, careers
+
+#Fetches a page and decides if it is a company page
+#Returns (is_valid, reason, careers link) - is_valid is None when the page couldnt be checked
+#A proxy that refuses the request gets one retry through another proxy
+def fetch_verdict(url):
+    #if we have seen this page before ask the server if it changed
+    previous = PAGE_CACHE.get(url)
+    headers = PAGE_CACHE.conditional_headers(previous)
+
+    #the host asked us to stay away for a while - skip it (not indexed, so the next search tries again)
+    if host_paused(url):
+        return metrics.fetch_error("HOST_PAUSED", HostPaused(url))
+
+    proxy = None
+    for attempt in range(2):
+        proxy = PROXY_POOL.choose("page", exclude=proxy)
+
+        #wait for our turn on this host (and the proxy)
+        with metrics.timer("throttle"):
+            delay = fetch_delay(url, proxy)
+            if delay > 0:
+                time.sleep(delay)
+
+        started = time.monotonic()
+        try:
+            #streams the page - gives up on slow or huge pages and skips non-html
+            with metrics.timer("fetch", url=url, proxy=proxies.redact(proxy)):
+                resp, html, note = fetcher.fetch_page(
+                    url, timeout=10, proxies=proxies.as_requests(proxy), headers=headers
+                )
+        except requests.exceptions.ProxyError as e:
+            PROXY_POOL.failure(proxy)
+            fetch_feedback(url, proxy, error="PROXY_ERROR")
+            if attempt == 0 and proxy:
+                print(f"   Proxy {proxies.redact(proxy)} failed for {url}, trying another")
+                continue
+            return metrics.fetch_error("PROXY_ERROR", e)
+        except requests.exceptions.ConnectTimeout as e:
+            #couldnt even reach the proxy
+            PROXY_POOL.failure(proxy)
+            return metrics.fetch_error("TIMEOUT", e)
+        except requests.exceptions.Timeout as e:
+            #slow site or slow proxy - only counts against the proxy's error rate
+            PROXY_POOL.failure(proxy, hard=False)
+            return metrics.fetch_error("TIMEOUT", e)
+        except requests.exceptions.ConnectionError as e:
+            PROXY_POOL.failure(proxy, hard=False)
+            return metrics.fetch_error("CONNECTION_ERROR", e)
+        except Exception as e:
+            PROXY_POOL.release(proxy)
+            return metrics.fetch_error(f"ERROR: {type(e).__name__}", e)
+
+        PROXY_POOL.success(proxy, time.monotonic() - started)
+        fetch_feedback(url, proxy, resp.status_code, resp.headers)
+        try:
+            final_url = resp.url or url
+            is_valid, reason, careers = judge_page(
+                url, previous, resp.status_code, resp.headers, resp.content, html, note, final_url
+            )
+        except Exception as e:
+            return metrics.fetch_error(f"ERROR: {type(e).__name__}", e)
+
+        #let the page go before waiting on careers probes
+        del resp, html
+        if is_valid and not careers:
+            careers = careers_finder.discover(final_url, proxy)
+        return is_valid, reason, careers
+
+#Where a verdict goes in the company index: accepted pages and rejected homepages
+#stand for the whole company (its domain), any other rejected page only for itself
+#(a listicle or a dead deep link says nothing about the rest of the site)
+def index_key(domain, url, is_valid):
+    if is_valid or (urls.is_homepage(url) and urls.hostname(url) == domain):
+        return domain
+    return urls.canonical_url(url)
+
+#What the company index knows about url - returns (entry, state, key it is under)
+#The company's verdict if there is one, otherwise this page's own rejection
+def indexed(domain, url):
+    entry, state = COMPANY_INDEX.get(domain)
+    #(older indexes also kept deep page rejections under the domain - skip those)
+    if state and index_key(domain, entry["url"], entry["valid"]) == domain:
+        return entry, state, domain
+    key = urls.canonical_url(url)
+    entry, state = COMPANY_INDEX.get(key)
+    return entry, state, key
+
+#Fetches a page and saves its verdict to the company index (under index_key, or
+#under key when refreshing an entry that is already there)
+#Failed fetches (timeouts, proxy errors) are not saved so they get retried next time
+def check_and_index(domain, url, title, key=None):
+    is_valid, reason, careers = fetch_verdict(url)
+    if is_valid is not None and domain:
+        COMPANY_INDEX.put(key or index_key(domain, url, is_valid), url, title, is_valid, reason, careers)
+    return is_valid, reason, careers
+
+#Re-checks a stale index entry in the background (once at a time per key)
+def schedule_refresh(domain, key, url, title):
+    with refreshing_lock:
+        if key in refreshing: return
+        refreshing.add(key)
+
+    def refresh():
+        try:
+            check_and_index(domain, url, title, key)
+        finally:
+            with refreshing_lock:
+                refreshing.discard(key)
+
+    refresh_pool.submit(refresh)
+
+#Decides if one search hit is a company page, using the company index when we can
+#Returns (company data or None, reason)
+def check_company(url, title, source, city=None):
+    domain = normalize_domain(url)
+    entry, state, key = indexed(domain, url) if domain else (None, None, None)
+
+    if state:
+        #serve what we know now, refresh it later if it is getting old
+        if state == "stale":
+            schedule_refresh(domain, key, entry["url"], entry["title"])
+        is_valid, reason, careers = entry["valid"], entry["reason"], entry["careers"]
+        url = entry["url"]
+        reason = f"{reason} (cached)"
+    else:
+        is_valid, reason, careers = check_and_index(domain, url, title)
+
+    metrics.record_verdict(is_valid, reason, cached=bool(state))
+    if not is_valid:
+        return None, reason
+    data = company_data(title, url, careers, source)
+    save_lead(city, domain, data)
+    return data, reason
+
+#Saves an accepted company to the leads store (only for searches that give a city)
+def save_lead(city, domain, data):
+    if not SAVE_LEADS or not city or not domain: return
+    keyword, intent = split_source(data["Source Keyword"])
+    LEADS.put(city, keyword, intent, domain, data)
+
+#What gets sent to the frontend for one accepted company
+def company_data(title, url, careers, source):
+    return {
+        "Company Name": title,
+        "Link": careers if careers else url,
+        "Type": "Direct Career Page" if careers else "Homepage",
+        "Source Keyword": source
+    }
+
+#Reads max_results / deadline from a search request (falling back to the defaults above)
+#Returns (max_results, deadline) with None meaning no limit
+def search_limits(data):
+    try:
+        max_results = int(data.get('max_results') or MAX_RESULTS)
+    except (TypeError, ValueError):
+        max_results = MAX_RESULTS
+    try:
+        deadline = float(data.get('deadline') or SEARCH_DEADLINE)
+    except (TypeError, ValueError):
+        deadline = SEARCH_DEADLINE
+    return (max_results if max_results > 0 else None), (deadline if deadline > 0 else None)
+
+#Builds the whole domain x intent query grid up front
+#Returns a list of (query, source keyword)
+def plan_queries(city, domains, intents):
+    plan = []
+    #loop 1: the domain - eg "Machine Learning"
+    for domain in domains:
+        #loop 2: the intent - eg "Internship"
+        for intent in intents:
+            #Build query based off of these keyword(s)
+            #query = f'"{domain} {intent}" "{city}" site:.com -site:linkedin.com -site:indeed.com'
+            query = f'"{domain} {intent}" near "{city}"'
+            plan.append((query, source_label(domain, intent)))
+    return plan
+
+#The Source Keyword shown for a company: "software (company)"
+def source_label(domain, intent):
+    return f"{domain} ({intent})"
+
+#"software (company)" -> ("software", "company")
+def split_source(source):
+    match = SOURCE_LABEL.match(source or "")
+    return (match.group(1), match.group(2)) if match else (source, None)
+
+#Runs one search (from the cache if we ran it recently), retrying with backoff if it fails
+#Every try goes through the healthiest proxy (clients is a SearchClients)
+def run_search(clients, query, region="us-en", timelimit=None, retries=SEARCH_RETRIES):
+    cached = cached_search(query, region, timelimit)
+    if cached is not None:
+        return cached
+
+    for attempt in range(retries + 1):
+        #the backend that can take a search soonest (every failure slows its backend down)
+        backend = SEARCH_LIMITER.pick(SEARCH_BACKENDS)
+        with metrics.timer("throttle"):
+            SEARCH_LIMITER.wait(backend)
+        results = search_once(clients, query, backend, region, timelimit, attempt, retries)
+        if results is not None:
+            return results
+    return []
+
+#The cached results for this search, or None
+def cached_search(query, region="us-en", timelimit=None):
+    cached = SEARCH_CACHE.get(query, region, timelimit)
+    if cached is not None:
+        print(f"   → Cache hit for '{query}'")
+        metrics.SEARCHES.inc(source="cache")
+    return cached
+
+#One try of a search on the backend given (its limiter slot already waited for)
+#Returns the results, or None if it failed and is worth another try
+def search_once(clients, query, backend, region="us-en", timelimit=None, attempt=0, retries=SEARCH_RETRIES):
+    #text(
+    #query: str (text search query)
+    #region: str = "us-en" (default is us-en, could be uk-en, ru-ru, etc.)
+    #safesearch: str = on, moderate, off (default is moderate)
+    #timelimit: str (d, w, m, y. Default is None)
+    #max_results: int (max number of results. default is 10)
+    #page: int (page of results. default is 1)
+    #backend: str = "auto" (single or comma-delimited backends. default to auto)
+    #) --> list[dict[str, str]]
+    proxy = PROXY_POOL.choose("search")
+    started = time.monotonic()
+    try:
+        #Returns a list of dictionaries with the search results
+        with metrics.timer("search", query=query, attempt=attempt + 1, backend=backend, proxy=proxies.redact(proxy)):
+            results = clients.get(proxy).text(query, region=region, timelimit=timelimit, max_results=25, backend=backend)
+        metrics.SEARCHES.inc(source="ddgs")
+        #empty results are usually bot detection - dont remember those
+        if results:
+            SEARCH_CACHE.put(query, results, region, timelimit)
+            SEARCH_LIMITER.ok(backend)
+            PROXY_POOL.success(proxy, time.monotonic() - started)
+        else:
+            metrics.THROTTLED.inc(scope="search", signal="empty")
+            SEARCH_LIMITER.throttled(backend)
+            #this proxy's ip is probably flagged - send the next searches elsewhere
+            PROXY_POOL.failure(proxy, hard=False)
+        return results
+    except Exception as e:
+        print(f"Search error for '{query}' (try {attempt + 1}/{retries + 1}): {e}")
+        metrics.SEARCH_ERRORS.inc(error=type(e).__name__)
+        metrics.THROTTLED.inc(scope="search", signal=type(e).__name__)
+        SEARCH_LIMITER.throttled(backend)
+        kind = search_failure(e)
+        if kind is None:
+            PROXY_POOL.release(proxy)
+        else:
+            PROXY_POOL.failure(proxy, hard=kind == "hard")
+        return None
+
+#How a failed search counts against the proxy it went through:
+#"hard" (connection / proxy / timeout errors), "soft" (rate limited) or None (anything
+#else - no results, a parse error - says nothing about the proxy)
+def search_failure(error):
+    if isinstance(error, RatelimitException):
+        return "soft"
+    if isinstance(error, (TimeoutException, requests.exceptions.RequestException, ConnectionError, TimeoutError)):
+        return "hard"
+    cause = error.__cause__ or error.__context__
+    text = f"{type(error).__name__}: {error} {type(cause).__name__ if cause else ''}"
+    if RATE_LIMITED.search(text):
+        return "soft"
+    if NETWORK_ERROR.search(text):
+        return "hard"
+    return None
+
 #Does a search for each keyword given and combines the results
-def scrape(city, domains, intents):
+#Search results are fetched best-scored first (see score_candidate)
+#Stops after max_results companies or deadline seconds if either is given
+#progress (a metrics.Progress) is kept up to date for anyone watching the search
+#stop (optional) returns True once the rest of the search isnt wanted - it is checked
+#every STOP_CHECK_SECONDS even while nothing is found
+def scrape(city, domains, intents, max_results=None, deadline=None, progress=None, stop=None):
     #Gets company urls with one keyword and a city given
     print(f"Searching for overlaps in {city}...")
+    started = time.monotonic()
 
-    #To prevent duplicates between keyword searches
-    seen_urls = set()
-
-    #Proxy used from webshare
-    PROXY = os.environ.get("PROXY_URL")
-
-    if not PROXY:
-        print("ERROR: PROXY_URL not found in environment variables!")
+    #Proxies from webshare (see proxies.py)
+    if not PROXY_POOL.can_search():
+        print("ERROR: no proxies found (set PROXY_URLS, PROXY_FILE or PROXY_URL)!")
         yield {}
         return
 
-    print(f"Connecting via proxy: {PROXY}")
+    print(f"Connecting via {len(PROXY_POOL.proxies)} proxies")
 
-    #For requests search
-    proxies = {
-        'http': PROXY,
-        'https': PROXY
-    }
+    #Stage timings for this search (written to TRACE_DIR if that is set)
+    trace = metrics.Trace(city=city, domains=domains, intents=intents)
+    #worker memory high-water mark while this search runs
+    watermark = memory.Watermark()
 
+    #Searches and page fetches run on their own thread pools
+    #Every search feeds its urls into the one fetch pool as soon as it returns
+    search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS)
+    fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
 
-    #Creates the search agent and automatically closes when it is done
-    with DDGS(proxy=PROXY) as ddgs:
-        #loop 1: the domain - eg "Machine Learning"
-        for domain in domains:
-            #loop 2: the intent - eg "Internship"
-            for intent in intents:
-                print(f"Checking keyword: '{domain} {intent}'")
-
-                #Build query based off of these keyword(s)
-                #query = f'"{domain} {intent}" "{city}" site:.com -site:linkedin.com -site:indeed.com'
-                query = f'"{domain} {intent}" near "{city}"'
-                #This only searches for company homepages and excludes linkedin/indeed postings
-
-                #text(
-                #query: str (text search query)
-                #region: str = "us-en" (default is us-en, could be uk-en, ru-ru, etc.)
-                #safesearch: str = on, moderate, off (default is moderate)
-                #timelimit: str (d, w, m, y. Default is None)
-                #max_results: int (max number of results. default is 10)
-                #page: int (page of results. default is 1)
-                #backend: str = "auto" (single or comma-delimited backends. default to auto)
-                #) --> list[dict[str, str]]
-
-                #Returns a list of dictionaries with the search results
-                try:
-                    results = ddgs.text(query, max_results=25)
-                    print(f"   → Got {len(results)} raw results")
-    
-                    if results:
-                        print(f"   → First result: {results[0].get('title', 'NO TITLE')[:50]}")
-                    else:
-                        print(f"   → DEBUG: Empty results - might be bot detection")
-
-                except Exception as e:
-                    print(f"Search error: {e}")
-                    import traceback
-                    traceback.print_exc()
+    #future -> (kind, label, source keyword)
+    pending = {}
+    fetching = 0
+    #urls waiting to be fetched - also prevents duplicates between keyword searches
+    candidates = CandidateQueue()
+    accepted = 0
+    progress = progress or metrics.Progress()
+
+    try:
+        #Send off every query at once (the pool limits how many run together)
+        plan = plan_queries(city, domains, intents)
+        progress.planned(len(plan))
+        for query, source in plan:
+            print(f"Checking keyword: '{query}'")
+            future = search_pool.submit(trace.run, run_search, SEARCH_CLIENTS, query)
+            pending[future] = ("search", query, source)
+
+        while pending or candidates:
+            #Only keep the fetch pool busy, so a better url found later can still go first
+            while candidates and fetching < FETCH_WORKERS:
+                url, title, source = candidates.pop()
+                fetch = fetch_pool.submit(trace.run, check_company, url, title, source, city)
+                pending[fetch] = ("fetch", title, source)
+                fetching += 1
+
+            timeout = None
+            if deadline is not None:
+                timeout = deadline - (time.monotonic() - started)
+                if timeout <= 0:
+                    print(f"Deadline of {deadline}s reached, stopping with {accepted} companies")
+                    return
+            if stop is not None:
+                if stop():
+                    print(f"Search no longer wanted, stopping with {accepted} companies")
+                    return
+                timeout = STOP_CHECK_SECONDS if timeout is None else min(timeout, STOP_CHECK_SECONDS)
+
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            watermark.sample()
+
+            for future in done:
+                kind, label, source = pending.pop(future)
+
+                #A page finished - hand the company back right away
+                if kind == "fetch":
+                    fetching -= 1
+                    data, reason = future.result()
+                    print(f"   Fetched: {label[:30]}... {reason}")
+                    progress.checked(bool(data), reason)
+                    if data:
+                        yield data
+                        accepted += 1
+                        if max_results and accepted >= max_results:
+                            print(f"Got {accepted} companies, stopping early")
+                            return
                     continue
 
+                #A search finished - queue up its urls
+                results = future.result()
+                progress.searched()
+                print(f"   → Got {len(results)} raw results for '{label}'")
+
                 if not results:
-                    print(f"   → No results for this query, trying next...")
+                    print(f"   → DEBUG: Empty results - might be bot detection")
                     continue
 
+                print(f"   → First result: {results[0].get('title', 'NO TITLE')[:50]}")
+
                 #Clean the data - right now its a list of dic's
                 #We just want URL (href) and name (title)
                 for result in results:
                     url = result['href']
                     title = result['title']
-                    
-                    if any(b in url for b in BLOCKLIST): continue
-                    if url in seen_urls: continue
-                    seen_urls.add(url)
-
-                    try:
-                        # 1. Fetch Page FIRST
-                        print(f"   Fetching: {title[:30]}...", end="", flush=True)
-                        resp = requests.get(
-                            url, 
-                            timeout=10,
-                            proxies=proxies,  # ← Use the proxy
-                            headers={
-                                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                                'Accept-Language': 'en-US,en;q=0.9',
-                                'Referer': 'https://www.google.com/'
-                            }
-                        )
-                        if resp.status_code != 200:
-                            print(f" [HTTP {resp.status_code}]")
-                            continue
-                        soup = BeautifulSoup(resp.text, 'html.parser')
-                        
-                        # 2. Validate Content
-                        is_valid, reason = validate_page_content(url, soup)
-                        
-                        if is_valid:
-                            careers = find_careers_link(url, soup)
-                            data = {
-                                "Company Name": title,
-                                "Link": careers if careers else url,
-                                "Type": "Direct Career Page" if careers else "Homepage",
-                                "Source Keyword": f"{domain} ({intent})"
-                            }
-                            print("ACCEPTED")
-                            yield data
-                        else:
-                            print(f"({reason})")
-
-                    except requests.exceptions.Timeout:
-                        print(" TIMEOUT")
-                    except requests.exceptions.ProxyError:
-                        print(" PROXY_ERROR")
-                    except requests.exceptions.ConnectionError:
-                        print(" CONNECTION_ERROR")
-                    except Exception as e:
-                        print(f" ERROR: {type(e).__name__}")
-
-                    #sleep to avoid IP ban
-                    time.sleep(random.uniform(1.5, 3.0))
-
-
-
-
-#Testing purposes
-'''
-testCity = "Troy, NY"
-#The what (technial field or industry)
-search_domains = ["software", "web development"]
-#The type (what are you looking for?)
-search_intents = ["company", "agency", "firm"]
-#Running function
-companies = scrape(testCity, search_domains, search_intents)
-
-#Save to CSV file
-if companies:
-    filename = "internship_leads.csv"
-    print(f"\nFound {len(companies)} companies! Saving to '{filename}'...")
-
-    with open(filename, 'w', newline='', encoding='utf-8') as f:
-        #get headers from first result
-        writer = csv.DictWriter(f, fieldnames=companies[0].keys())
-        writer.writeheader()
-        writer.writerows(companies)
-
-    print("Done.")
-else:
-    print("\nNo results found.")
-'''
+
+                    if BLOCKLIST.blocks(url): continue
+                    candidates.push(url, title, source)
+    finally:
+        print(f"Skipped {candidates.duplicates} results for companies already queued")
+        trace.write(accepted=accepted, duplicates=candidates.duplicates, **metrics.record_memory(watermark))
+        #stop any queued work if the client goes away early (or we have enough)
+        search_pool.shutdown(wait=False, cancel_futures=True)
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+
+
+
+
+#Does a worker's slow first-time work before its first search: the suffix list, the
+#sqlite connections, the HTTP session and a search client for the first few proxies
+#Run again after a fork - everything tied to a process is made anew for the child
+def warm():
+    started = time.monotonic()
+    urls.registrable_domain("https://www.example.co.uk/")
+    for store in (SEARCH_CACHE, COMPANY_INDEX, PAGE_CACHE, LEADS, careers_finder.CAREERS_CACHE):
+        with store.lock:
+            store.db()
+    fetcher.get_session()
+    search_proxies = list(PROXY_POOL.proxies)[:SEARCH_WORKERS]
+    if not search_proxies and PROXY_POOL.direct_allowed("search"):
+        search_proxies = [None]
+    for proxy in search_proxies:
+        SEARCH_CLIENTS.get(proxy)
+    print(f"Worker {os.getpid()} warmed up in {time.monotonic() - started:.2f}s")
+
+#Batch runs (many cities written to CSV / JSONL / Parquet) live in batch.py
+#python batch.py cities.txt --domains software,"web development" --out internship_leads.csv
@@ -0,0 +1,156 @@
+import json
+import zlib
+import os
+import lazy
+
+keywords = lazy.module("keywords")
+
+
+#How search results go over the wire (NDJSON, one JSON object per line):
+#  - companies found close together are sent in one flush (STREAM_BATCH_SIZE / STREAM_BATCH_MS),
+#    the first one always right away
+#  - the stream is gzip / brotli compressed when the client accepts it, flushed after
+#    every batch so nothing sits in the compressor
+#  - a client that asks for events ("events": true) also gets lines with an "event" key:
+#      {"event": "cached", "companies": [...]}    leads we already had for this search, first
+#      {"event": "progress", "queries_done": 2, "queries_total": 4, "pages_fetched": 17,
+#       "accepted": 6, "rejected": {"HTTP 404": 3, ...}, "elapsed": 4.2}
+#      {"event": "done", "status": "done", ...same counts}
+#    (without it every line is a company, like before)
+
+#Most companies in one flush, and the longest a found company waits for others (ms)
+STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE", "8"))
+STREAM_BATCH_MS = float(os.environ.get("STREAM_BATCH_MS", "150"))
+#Encodings we compress with, preferred first (set to "" to never compress)
+STREAM_ENCODINGS = [e.strip() for e in os.environ.get("STREAM_ENCODINGS", "br,gzip").split(",") if e.strip()]
+#Seconds between progress events while no company is found
+PROGRESS_SECONDS = float(os.environ.get("PROGRESS_SECONDS", "1"))
+#Most stored leads sent in the cached burst
+CACHED_BURST = int(os.environ.get("CACHED_BURST", "50"))
+#Set to 1 to widen each domain with related terms before searching
+#(local table first, then the shared cache, then ConceptNet for all misses at once)
+EXPAND_KEYWORDS = os.environ.get("EXPAND_KEYWORDS", "0") == "1"
+
+#brotli is optional - without it only gzip is offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+#The domains a search request asks for, expanded if that is turned on
+#(app.py and asgi.py both read requests with this)
+def get_search_terms(data):
+    raw_domains = data.get('domains', ["software"])
+    if not EXPAND_KEYWORDS:
+        return raw_domains
+    return keywords.expand(raw_domains)
+
+#Picks the encoding to send from an Accept-Encoding header (None = uncompressed)
+def negotiate(accept_encoding):
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in STREAM_ENCODINGS:
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+#Whether a search request asked for event lines (body field or ?events=1)
+def wants_events(data, args):
+    return bool(data.get('events')) or args.get('events') in ("1", "true")
+
+
+#Turns lines of text into the bytes to send, compressing if the client accepts it
+#Every chunk is flushed, so the client can decode it as soon as it arrives
+class Encoder:
+    def __init__(self, encoding=None):
+        self.encoding = encoding
+        self.compressor = None
+        if encoding == "gzip":
+            self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self.compressor = brotli.Compressor(quality=5)
+        #bytes before and after compression
+        self.raw = 0
+        self.sent = 0
+
+    def encode(self, text):
+        data = text.encode('utf-8')
+        self.raw += len(data)
+        if self.encoding == "gzip":
+            data = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        elif self.encoding == "br":
+            data = self.compressor.process(data) + self.compressor.flush()
+        self.sent += len(data)
+        return data
+
+    #The end of the compressed stream
+    def finish(self):
+        if self.encoding == "gzip":
+            data = self.compressor.flush()
+        elif self.encoding == "br":
+            data = self.compressor.finish()
+        else:
+            data = b""
+        self.sent += len(data)
+        return data
+
+    #Headers that go with the encoded body
+    def headers(self):
+        if not self.encoding:
+            return {}
+        return {"Content-Encoding": self.encoding, "Vary": "Accept-Encoding"}
+
+
+#One NDJSON line per object
+def lines(objects):
+    return "".join(json.dumps(o) + "\n" for o in objects)
+
+def event(kind, **fields):
+    return dict(event=kind, **fields)
+
+#The leads store's companies for this search, for the cached burst
+#(the same companies can come again from the live search - clients match them on Link)
+def cached_companies(leads, city, domains):
+    found, _ = leads.find(city=city, keywords=list(domains), limit=CACHED_BURST)
+    for company in found:
+        for extra in ("City", "Keyword", "Last Seen"):
+            company.pop(extra, None)
+    return found
+
+#Encoded NDJSON body for a jobs.SearchJob from cursor on
+#With events the stream opens with the cached companies (if any) and carries progress
+#events, and a done event at the end
+def job_body(job, encoder, cursor=0, events=False, cached=None):
+    if events and cached:
+        yield encoder.encode(lines([event("cached", companies=cached)]))
+
+    version = None
+    tick = PROGRESS_SECONDS if events else None
+    for batch in job.batches(cursor, STREAM_BATCH_SIZE, STREAM_BATCH_MS / 1000, tick):
+        out = list(batch)
+        if events:
+            counts, latest = job.progress.snapshot()
+            if latest != version:
+                version = latest
+                out.append(event("progress", **counts))
+        if out:
+            yield encoder.encode(lines(out))
+
+    if events:
+        counts, _ = job.progress.snapshot()
+        yield encoder.encode(lines([event("done", status=job.status, **counts)]))
+    tail = encoder.finish()
+    if tail:
+        yield tail
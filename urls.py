@@ -0,0 +1,148 @@
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+import tldextract
+import re
+
+
+#Public suffix list bundled with tldextract (no download, nothing written to disk)
+#Private suffixes are on so foo.github.io and bar.wixsite.com count as their own sites
+EXTRACT = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None, include_psl_private_domains=True)
+
+#Site builders and blog hosts that give every customer a site under their own domain,
+#where the registrable domain would fold thousands of companies into one
+#(github.io, wixsite.com, blogspot.com, netlify.app, herokuapp.com, webflow.io and
+#friends are on the private suffix list already - these arent)
+#One site per subdomain: acme.wordpress.com
+SUBDOMAIN_TENANTS = {
+    'wordpress.com', 'squarespace.com', 'weebly.com', 'tumblr.com', 'substack.com', 'medium.com',
+    'godaddysites.com', 'business.site', 'strikingly.com', 'mystrikingly.com', 'jimdosite.com',
+    'site123.me', 'ueniweb.com', 'ghost.io', 'hs-sites.com', 'hubspotpagebuilder.com',
+    'mailchimpsites.com', 'wpengine.com', 'wpcomstaging.com'
+}
+#One site per path - host: how many path segments name the site
+#sites.google.com/view/acme, medium.com/@acme, linktr.ee/acme
+PATH_TENANTS = {'sites.google.com': 2, 'medium.com': 1, 'linktr.ee': 1}
+
+#Query parameters that only track where a click came from
+#(not 'ref' - some sites pick the page or branch with it)
+TRACKING_PARAMS = {'gclid', 'fbclid', 'msclkid', 'dclid', 'yclid', 'mc_cid', 'mc_eid', 'ref_src', '_ga', '_gl', 'srsltid'}
+
+#Paths a site's front page is served under
+HOME_PATHS = {'', 'index.html', 'index.htm', 'index.php', 'home'}
+
+#Words that say nothing about which company a title belongs to
+TITLE_STOP_WORDS = {'home', 'welcome', 'inc', 'llc', 'ltd', 'company', 'corporation', 'corp', 'about', 'contact', 'profile', 'the', 'official', 'site', 'website', 'page'}
+
+
+#Hostname without www. and the port (lowercase) - "" if the url is broken
+def hostname(url):
+    try:
+        host = (urlparse(url).hostname or "").lower()
+    except ValueError:
+        return ""
+    if host.startswith("www."):
+        host = host[4:]
+    return host
+
+#The part of the hostname a company actually registers
+#Input: https://careers.acme.co.uk/jobs
+#Output: acme.co.uk
+#(hosts with no public suffix, like localhost or an IP, are returned whole)
+#On a multi-tenant host it is the customer's own site instead:
+#  https://blog.acme.wordpress.com/x -> acme.wordpress.com
+#  https://sites.google.com/view/acme/about -> sites.google.com/view/acme
+def registrable_domain(url):
+    host = hostname(url)
+    if not host: return ""
+    tenant = path_tenant(url, host)
+    if tenant: return tenant
+    parts = EXTRACT(host)
+    if not parts.suffix or not parts.domain:
+        return host
+    domain = f"{parts.domain}.{parts.suffix}"
+    if domain in SUBDOMAIN_TENANTS and parts.subdomain:
+        return f"{parts.subdomain.split('.')[-1]}.{domain}"
+    return domain
+
+#"host/segments" naming a site on a PATH_TENANTS host, None anywhere else
+#(or for the host's own pages, which have too few segments)
+def path_tenant(url, host):
+    count = PATH_TENANTS.get(host)
+    if not count: return None
+    try:
+        segments = [s for s in urlparse(url).path.lower().split('/') if s]
+    except ValueError:
+        return None
+    if len(segments) < count: return None
+    return "/".join([host] + segments[:count])
+
+#True for a site that lives under a path of a shared host (sites.google.com/view/acme)
+#- it has no robots.txt, sitemap or /careers of its own
+def on_shared_path(url):
+    return path_tenant(url, hostname(url)) is not None
+
+#The company's name as it appears in its domain
+#Input: https://careers.acme.co.uk/jobs
+#Output: acme
+#(the customer's name on a multi-tenant host: acme.wordpress.com, medium.com/@acme -> acme)
+def domain_name(url):
+    host = hostname(url)
+    if not host: return ""
+    tenant = path_tenant(url, host)
+    if tenant:
+        return tenant.rsplit('/', 1)[-1].lstrip('@')
+    parts = EXTRACT(host)
+    if not parts.suffix or not parts.domain:
+        return host.split('.')[0]
+    if f"{parts.domain}.{parts.suffix}" in SUBDOMAIN_TENANTS and parts.subdomain:
+        return parts.subdomain.split('.')[-1]
+    return parts.domain
+
+#True for the front page of a site (any path in HOME_PATHS, no query)
+#Input: https://www.acme.com/index.html -> True, https://acme.com/blog/top-10 -> False
+def is_homepage(url):
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return False
+    return parsed.path.strip('/').lower() in HOME_PATHS and not parsed.query
+
+#One spelling for every way of writing the same page - a key to look pages up by,
+#the page itself is still fetched at the url it was found at
+#lowercase host, no default port, no #fragment, no tracking parameters, sorted query
+#(the trailing slash stays: /about and /about/ can be different pages)
+#Input: HTTPS://WWW.Acme.com:443/about/?utm_source=x&b=2&a=1#team
+#Output: https://www.acme.com/about/?a=1&b=2
+def canonical_url(url):
+    try:
+        parsed = urlparse(url.strip())
+        host = (parsed.hostname or "").lower()
+        port = parsed.port
+    except ValueError:
+        return url
+
+    scheme = parsed.scheme.lower()
+    #ipv6 addresses keep their brackets
+    netloc = f"[{host}]" if ':' in host else host
+    if port and not (scheme == 'http' and port == 80) and not (scheme == 'https' and port == 443):
+        netloc = f"{netloc}:{port}"
+
+    path = re.sub(r'/{2,}', '/', parsed.path)
+
+    query = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+             if not k.lower().startswith('utm_') and k.lower() not in TRACKING_PARAMS]
+    return urlunparse((scheme, netloc, path or '/', parsed.params, urlencode(sorted(query)), ''))
+
+#Title reduced to the words that name the company
+#Input: "Welcome to ACME Software, Inc. | Home"
+#Output: "acme software to"
+def normalize_title(title):
+    words = re.sub(r'[^a-z0-9\s]', ' ', (title or "").lower()).split()
+    return " ".join(sorted({w for w in words if w not in TITLE_STOP_WORDS and len(w) > 1}))
+
+#Identity of the company behind a search result: (registrable domain, (domain name, title))
+#The first catches the same site under any page, scheme or subdomain,
+#the second the same company on another country domain (acme.com / acme.co.uk)
+def company_keys(url, title):
+    domain = registrable_domain(url)
+    name = normalize_title(title)
+    return domain, ((domain_name(url), name) if name else None)